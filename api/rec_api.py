@@ -2,6 +2,9 @@ import os
 import gradio as gr
 import openai
 from scripts.db import MovieDB
+from scripts.hedging import HedgePolicy
+from scripts.llm_metrics import LLMMetrics
+from scripts.rate_limiter import RateLimiter, shared_limiter
 from typing import List, Dict, Any
 import logging
 
@@ -10,9 +13,17 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class VectorSearchApp:
-    def __init__(self):
+    def __init__(self, limiter: RateLimiter = None, hedging: HedgePolicy = None, metrics: LLMMetrics = None):
         """Initialize the Vector Search application."""
-        self.openai_client = openai.OpenAI()
+        # Retries and pacing are left to the limiter shared with the rest of the process
+        self.limiter = limiter or shared_limiter()
+        # Hedging duplicates slow calls, so it costs extra and is off unless a policy is passed
+        # or OPENAI_HEDGE_MODEL names the model the duplicates go to
+        hedge_model = os.getenv("OPENAI_HEDGE_MODEL")
+        self.hedging = hedging or (HedgePolicy(hedge_model=hedge_model) if hedge_model else None)
+        # Latency, tokens and cost of the OpenAI calls
+        self.metrics = metrics or LLMMetrics()
+        self.openai_client = openai.OpenAI(max_retries=0)
         self.db = MovieDB(
             dbname=os.getenv("PG_DB"),
             user=os.getenv("PG_USER"),
@@ -24,13 +35,23 @@ class VectorSearchApp:
     
     def generate_tags(self, text: str) -> List[str]:
         """Generate tags for the given text."""
-        return self.openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a movie critic that watched and analysed thousands of movies."},
-                {"role": "user", "content": text}
-            ]
-        )
+        messages = [
+            {"role": "system", "content": "You are a movie critic that watched and analysed thousands of movies."},
+            {"role": "user", "content": text}
+        ]
+        def request(model: str):
+            return self.limiter.call(
+                self.metrics.track("query_tagging", model,
+                                   lambda: self.openai_client.chat.completions.create(model=model, messages=messages)),
+                messages
+            )
+        try:
+            if self.hedging is None:
+                return request("gpt-4o")
+            return self.hedging.call(request, "gpt-4o", valid=lambda response: bool(response.choices[0].message.content))
+        except Exception:
+            self.metrics.failed("query_tagging")
+            raise
     
     def search_by_tags(self, tags: List[str], limit: int = 5) -> List[Dict[str, Any]]:
         """Search for movies by tags."""
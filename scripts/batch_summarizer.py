@@ -0,0 +1,206 @@
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+from openai import OpenAI
+
+from scripts.schemas import get_schema
+from scripts.summarizer import MovieSummarizer, summary_messages
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+# Jobs in these states will not produce any more output
+FINISHED_STATUSES = {"completed", "expired", "cancelled", "failed"}
+# Rows written to the output file at a time
+WRITE_CHUNK_ROWS = 1000
+
+
+class BatchJobSummarizer:
+    """
+    Summarizes a dataset through the OpenAI Batch API instead of live requests.
+
+    Every movie becomes one line of a JSONL request file that is uploaded and submitted as a
+    single job. The job id is saved to state_path straight away, so a restarted run polls the
+    job it already paid for instead of submitting a new one. Polling backs off exponentially;
+    once the job finishes its output file is streamed into the dataset output. Movies without
+    a valid answer (failed requests, answers that need the refinement call, jobs that expired
+    part way) are summarized with live requests by MovieSummarizer. If any of those still fail,
+    SummarizationError is raised and the job id is kept, so the next run picks up from there.
+    """
+
+    def __init__(self, model: str = 'gpt-4.1-nano', state_path: str = './data/processed/batch_job.json',
+                 cache_path: Optional[str] = None, poll_interval: float = 30.0,
+                 max_poll_interval: float = 600.0, concurrency: int = 100):
+        """
+        Args:
+            model: Chat model used for every request in the job
+            state_path: JSON file holding the submitted job id; removed once the output is written
+            cache_path: SQLite cache of finished summaries shared with MovieSummarizer. Cached
+                movies are left out of the job and new summaries are added to it
+            poll_interval: Seconds before the first status check
+            max_poll_interval: Upper bound for the doubling delay between status checks
+            concurrency: Live requests in flight while summarizing the leftovers
+        """
+        self.model = model
+        self.state_path = state_path
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.client = OpenAI()
+        self.fallback = MovieSummarizer(model=model, concurrency=concurrency, cache_path=cache_path)
+
+    def request_line(self, index: int, movie: Dict) -> str:
+        return json.dumps({
+            "custom_id": str(index),
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {"model": self.model, "messages": summary_messages(movie)},
+        })
+
+    def submit(self, movies: List[Dict], data_path: str) -> Dict:
+        """Upload a request per movie that is not cached yet and start the job"""
+        cache = self.fallback.cache
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False) as f:
+            requests_path = f.name
+            count = 0
+            for i, movie in enumerate(movies):
+                if cache is None or cache.get(movie) is None:
+                    f.write(self.request_line(i, movie) + "\n")
+                    count += 1
+        try:
+            if count == 0:
+                return {"batch_id": None, "data_path": data_path, "model": self.model, "requests": 0}
+            with open(requests_path, 'rb') as f:
+                input_file = self.client.files.create(file=f, purpose="batch")
+        finally:
+            os.remove(requests_path)
+
+        batch = self.client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT,
+                                           completion_window=COMPLETION_WINDOW)
+        state = {"batch_id": batch.id, "data_path": data_path, "model": self.model, "requests": count}
+        self._save_state(state)
+        logger.info(f"Submitted batch job {batch.id} with {count} requests")
+        return state
+
+    def wait(self, batch_id: str):
+        """Poll the job with exponential backoff until it stops changing"""
+        delay = self.poll_interval
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            if batch.status in FINISHED_STATUSES:
+                logger.info(f"Batch job {batch_id} is {batch.status}")
+                return batch
+            logger.info(f"Batch job {batch_id} is {batch.status}, checking again in {delay:.0f}s")
+            time.sleep(delay * random.uniform(0.9, 1.1))
+            delay = min(delay * 2, self.max_poll_interval)
+
+    def results(self, batch) -> Dict[int, str]:
+        """Valid summaries from the job's output file, by row index"""
+        summaries = {}
+        if batch.output_file_id is None:
+            return summaries
+        with self.client.files.with_streaming_response.content(batch.output_file_id) as response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                result = json.loads(line)
+                # Requests that failed inside the job come back with "response": null and an error
+                result_response = result.get("response") or {}
+                response_body = result_response.get("body") or {}
+                if result_response.get("status_code") != 200 or not response_body.get("choices"):
+                    continue
+                summary = self.fallback._normalized(response_body["choices"][0]["message"]["content"])
+                if summary is not None:
+                    summaries[int(result["custom_id"])] = summary
+        return summaries
+
+    def summarize_dataset(self, data_path: str, output_path: str = './data/processed/enhanced.json'):
+        """Summarize the dataset through a batch job, resuming the saved job if there is one"""
+        logger.info(f"Loading dataset from {data_path}")
+        df = pd.read_csv(data_path, **get_schema('top_rated_weighted').read_csv_options())
+        movies = df.to_dict('records')
+
+        state = self._load_state(data_path)
+        if state is None:
+            state = self.submit(movies, data_path)
+        else:
+            logger.info(f"Resuming batch job {state['batch_id']}")
+
+        summaries = {}
+        if state["batch_id"] is not None:
+            batch = self.wait(state["batch_id"])
+            if batch.status == "failed":
+                self._clear_state()
+                errors = [error.message for error in (batch.errors.data if batch.errors else None) or []]
+                raise RuntimeError(f"Batch job {batch.id} failed: {'; '.join(errors) or 'no details'}")
+            summaries = self.results(batch)
+            logger.info(f"Batch job answered {len(summaries)}/{state['requests']} movies")
+
+        # Rows are written in chunks as they are matched; the leftovers follow at the end
+        temporary_path = output_path + '.tmp'
+        leftovers = []
+        with open(temporary_path, 'w') as f:
+            chunk = {}
+            for i, movie in enumerate(movies):
+                summary = summaries.get(i)
+                if summary is not None:
+                    self.fallback._remember(movie, summary)
+                else:
+                    summary = self.fallback._cached(movie)
+                if summary is None:
+                    leftovers.append(i)
+                    continue
+                chunk[i] = summary
+                if len(chunk) >= WRITE_CHUNK_ROWS:
+                    self._write_rows(f, df, chunk)
+                    chunk = {}
+            self._write_rows(f, df, chunk)
+
+            if leftovers:
+                logger.info(f"Summarizing {len(leftovers)} movies without a batch answer with live requests")
+                live = self.fallback.summarize_concurrently([movies[i] for i in leftovers])
+                self._write_rows(f, df, dict(zip(leftovers, live)))
+        os.replace(temporary_path, output_path)
+        self._clear_state()
+        logger.info(f"Saved results to {output_path}")
+
+    @staticmethod
+    def _write_rows(f, df: pd.DataFrame, summaries: Dict[int, str]):
+        if summaries:
+            df.iloc[list(summaries)].assign(summary=list(summaries.values())).to_json(
+                f, orient='records', lines=True)
+
+    def _load_state(self, data_path: str) -> Optional[Dict]:
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path) as f:
+            state = json.load(f)
+        if state.get("data_path") != data_path or state.get("model") != self.model:
+            logger.warning(f"Ignoring saved batch job {state.get('batch_id')} for another dataset or model")
+            return None
+        return state
+
+    def _save_state(self, state: Dict):
+        directory = os.path.dirname(self.state_path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False) as f:
+            json.dump(state, f)
+        os.replace(f.name, self.state_path)
+
+    def _clear_state(self):
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+
+def summarize_dataset_batch(data_path: str, output_path: str = './data/processed/enhanced.json',
+                            state_path: Optional[str] = None, cache_path: Optional[str] = None):
+    """Summarize a dataset with a Batch API job"""
+    if state_path is None:
+        state_path = os.path.join(os.path.dirname(output_path), "batch_job.json")
+    BatchJobSummarizer(state_path=state_path, cache_path=cache_path).summarize_dataset(data_path, output_path)
@@ -0,0 +1,226 @@
+import os
+import gzip
+import json
+import shutil
+import platform
+import tempfile
+import threading
+import subprocess
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+from typing import Dict, List, Optional
+
+from scripts.loader import DatasetLoader
+from scripts.schemas import NULL_SENTINEL
+
+GENERATOR_BLOCK_ROWS = 100_000
+
+# Rough shares of title.basics as published by IMDB
+TITLE_TYPES = ['tvEpisode', 'short', 'movie', 'video', 'tvSeries', 'tvMovie', 'tvMiniSeries', 'tvSpecial',
+               'videoGame', 'tvShort']
+TITLE_TYPE_WEIGHTS = [0.72, 0.09, 0.07, 0.03, 0.025, 0.015, 0.006, 0.005, 0.004, 0.01]
+GENRES = ['Drama', 'Comedy', 'Documentary', 'Short', 'Talk-Show', 'Romance', 'Family', 'News', 'Animation',
+          'Reality-TV', 'Music', 'Crime', 'Action', 'Adventure', 'Game-Show', 'Thriller', 'Horror', 'Fantasy']
+
+
+def generate_title_basics(path: str, rows: int, seed: int = 0):
+    """Write a gzipped title.basics-shaped TSV with realistic type, year and null distributions."""
+    rng = np.random.default_rng(seed)
+    weights = np.array(TITLE_TYPE_WEIGHTS) / sum(TITLE_TYPE_WEIGHTS)
+
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        f.write("tconst\ttitleType\tprimaryTitle\toriginalTitle\tisAdult\tstartYear\tendYear\truntimeMinutes\tgenres\n")
+        for start in range(0, rows, GENERATOR_BLOCK_ROWS):
+            n = min(GENERATOR_BLOCK_ROWS, rows - start)
+            types = rng.choice(len(TITLE_TYPES), size=n, p=weights)
+            years = np.clip(2025 - rng.exponential(25, size=n).astype(int), 1874, 2031)
+            year_missing = rng.random(n) < 0.12
+            runtimes = rng.integers(1, 240, size=n)
+            runtime_missing = rng.random(n) < 0.65
+            adult = rng.random(n) < 0.02
+            genre_counts = rng.integers(0, 4, size=n)
+            genre_picks = rng.integers(0, len(GENRES), size=(n, 3))
+
+            lines = []
+            for j in range(n):
+                i = start + j + 1
+                title_type = TITLE_TYPES[types[j]]
+                title = f"Episode #1.{i % 500}" if title_type == 'tvEpisode' else f"Generated Title {i}"
+                year = NULL_SENTINEL if year_missing[j] else str(years[j])
+                end_year = str(years[j] + 3) if title_type == 'tvSeries' and not year_missing[j] else NULL_SENTINEL
+                runtime = NULL_SENTINEL if runtime_missing[j] else str(runtimes[j])
+                genres = ",".join(sorted({GENRES[g] for g in genre_picks[j, :genre_counts[j]]})) or NULL_SENTINEL
+                lines.append(f"tt{i:07d}\t{title_type}\t{title}\t{title}\t{int(adult[j])}\t{year}\t{end_year}\t"
+                             f"{runtime}\t{genres}\n")
+            f.write("".join(lines))
+
+
+def generate_title_ratings(path: str, rows: int, seed: int = 0):
+    """Write a gzipped title.ratings-shaped TSV with a heavy-tailed vote distribution."""
+    rng = np.random.default_rng(seed)
+
+    with gzip.open(path, 'wt', encoding='utf-8', newline='') as f:
+        f.write("tconst\taverageRating\tnumVotes\n")
+        for start in range(0, rows, GENERATOR_BLOCK_ROWS):
+            n = min(GENERATOR_BLOCK_ROWS, rows - start)
+            ratings = np.clip(rng.normal(6.9, 1.4, size=n), 1.0, 10.0).round(1)
+            votes = rng.lognormal(3.5, 1.8, size=n).astype(np.int64) + 5
+            f.write("".join(
+                f"tt{start + j + 1:07d}\t{ratings[j]:.1f}\t{votes[j]}\n" for j in range(n)
+            ))
+
+
+BENCHMARK_DATASETS = {
+    'title.basics': (generate_title_basics, ['tconst', 'titleType', 'primaryTitle', 'startYear', 'genres']),
+    'title.ratings': (generate_title_ratings, ['tconst', 'averageRating', 'numVotes']),
+}
+
+
+class DatasetServer:
+    """Serves a directory over HTTP on localhost as a stand-in for datasets.imdbws.com."""
+
+    def __init__(self, directory: str):
+        handler = partial(_QuietHandler, directory=directory)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, filename: str) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/{filename}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def run_benchmarks(row_counts: List[int], output_path: str, modes: tuple = ('extract', 'stream'),
+                   datasets: Optional[List[str]] = None, work_dir: Optional[str] = None,
+                   isolated: bool = True, **loader_options) -> Dict:
+    """
+    Benchmark DatasetLoader on generated data and save the results as JSON.
+
+    Args:
+        row_counts: Rows to generate per dataset, one benchmark round per count
+        output_path: JSON file to write the results to
+        modes: 'extract' runs download → extract → process, 'stream' the single-pass mode
+        datasets: Names from BENCHMARK_DATASETS; defaults to all of them
+        work_dir: Where to put generated and output files; a temporary directory by default
+        isolated: Run each loader in a fresh process so peak RSS is per run
+        loader_options: Extra DatasetLoader keyword arguments, e.g. memory_budget
+    """
+    datasets = datasets or list(BENCHMARK_DATASETS)
+    own_work_dir = work_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix='loader_bench_')
+    serve_dir = os.path.join(work_dir, 'serve')
+    os.makedirs(serve_dir, exist_ok=True)
+
+    runs = []
+    try:
+        with DatasetServer(serve_dir) as server:
+            for rows in row_counts:
+                for name in datasets:
+                    generate, columns = BENCHMARK_DATASETS[name]
+                    # Keep the IMDB file name so the loader picks up the table's schema
+                    filename = f"{rows}/{name}.tsv.gz"
+                    source = os.path.join(serve_dir, filename)
+                    if not os.path.exists(source):
+                        os.makedirs(os.path.dirname(source), exist_ok=True)
+                        print(f"Generating {rows:,} rows of {name}...")
+                        generate(source, rows)
+                    compressed_bytes = os.path.getsize(source)
+                    uncompressed_bytes = _uncompressed_size(source)
+
+                    for mode in modes:
+                        print(f"Benchmarking {name} ({rows:,} rows, {mode})...")
+                        output_file = os.path.join(work_dir, f"{name}.{rows}.{mode}.csv")
+                        args = (server.url(filename), columns, output_file, mode, work_dir, loader_options)
+                        stages = _run_isolated(*args) if isolated else _run_loader(*args)
+                        runs.append({
+                            'dataset': name,
+                            'rows': rows,
+                            'mode': mode,
+                            'compressed_bytes': compressed_bytes,
+                            'uncompressed_bytes': uncompressed_bytes,
+                            'output_bytes': os.path.getsize(output_file),
+                            'total_seconds': sum(stage['seconds'] for stage in stages.values()),
+                            'stages': _with_rates(stages, rows, compressed_bytes, uncompressed_bytes),
+                        })
+                        os.remove(output_file)
+    finally:
+        if own_work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'cpu_count': os.cpu_count(),
+        'runs': runs,
+    }
+    with open(output_path, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved benchmark results to {output_path}")
+    return results
+
+
+def _run_isolated(*args) -> Dict:
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+        return executor.submit(_run_loader, *args).result()
+
+
+def _run_loader(url: str, columns: list, output_file: str, mode: str, work_dir: str,
+                loader_options: dict) -> Dict:
+    scratch_dir = tempfile.mkdtemp(prefix='scratch_', dir=work_dir)
+    try:
+        loader = DatasetLoader(url, columns, output_file, streaming=(mode == 'stream'),
+                               scratch_dir=scratch_dir, **loader_options)
+        loader.process()
+        return loader.stats
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+
+
+def _with_rates(stages: Dict, rows: int, compressed_bytes: int, uncompressed_bytes: int) -> Dict:
+    """Add rows/s and MB/s to each stage; MB are of the stage's input (compressed for download)."""
+    input_bytes = {'download': compressed_bytes, 'extract': compressed_bytes}
+    result = {}
+    for name, stage in stages.items():
+        seconds = max(stage['seconds'], 1e-9)
+        result[name] = dict(
+            stage,
+            rows_per_second=rows / seconds,
+            mb_per_second=input_bytes.get(name, uncompressed_bytes) / 1024 ** 2 / seconds,
+        )
+    return result
+
+
+def _uncompressed_size(path: str) -> int:
+    size = 0
+    with gzip.open(path, 'rb') as f:
+        while True:
+            block = f.read(1024 * 1024)
+            if not block:
+                return size
+            size += len(block)
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
@@ -1,6 +1,8 @@
+import os
 import typer
 import sys
 from pathlib import Path
+from typing import List, Optional
 
 # Add project root to Python path for clean absolute imports
 project_root = Path(__file__).parent.parent
@@ -8,16 +10,34 @@ sys.path.insert(0, str(project_root))
 
 from scripts.loader import load_all_datasets
 from scripts.gc_uploader import upload_all_datasets
+from scripts.hedging import HedgePolicy
 from scripts.summarizer import summarize_dataset
+from scripts.batch_summarizer import summarize_dataset_batch
+from scripts.benchmark import run_benchmarks
 
 app = typer.Typer(help="ML Coursework Data Loading CLI")
 
 @app.command()
-def load(data_path: str = typer.Option("data", help="Directory to save the processed datasets")):
+def load(data_path: str = typer.Option("data", help="Directory to save the processed datasets"),
+         stream: bool = typer.Option(False, help="Download, decompress and project in one pass without temp files"),
+         cache_dir: Optional[str] = typer.Option(None, help="Keep downloads here and skip datasets unchanged upstream"),
+         workers: int = typer.Option(1, help="Number of datasets to load in parallel worker processes"),
+         output_format: str = typer.Option("csv", "--format", help="Output format for processed datasets: csv or parquet"),
+         memory_budget_mb: Optional[int] = typer.Option(None, help="Size parse chunks to roughly this many MB of decoded data"),
+         parse_workers: int = typer.Option(1, help="Parse each extracted file in this many processes (ignored with --stream)"),
+         raw: bool = typer.Option(False, help="Keep every row instead of applying the pipeline's title type and vote filters"),
+         title_types: Optional[List[str]] = typer.Option(None, "--title-type", help="Title types to keep (default: movie)"),
+         votes_threshold: Optional[int] = typer.Option(None, help="Keep ratings with more votes than this (default: 10000)"),
+         upload_bucket: Optional[str] = typer.Option(None, help="Also upload each dataset to this GCS bucket while it is written"),
+         keep_local: bool = typer.Option(True, help="Keep the processed datasets in --data-path (use --no-keep-local with --upload-bucket)")):
     """Load and process all IMDB datasets."""
     typer.echo(f"Loading datasets to: {data_path}")
     try:
-        load_all_datasets(data_path)
+        load_all_datasets(data_path, streaming=stream, cache_dir=cache_dir, workers=workers,
+                          output_format=output_format,
+                          memory_budget=memory_budget_mb * 1024 ** 2 if memory_budget_mb else None,
+                          parse_workers=parse_workers, raw=raw, title_types=title_types,
+                          votes_threshold=votes_threshold, upload_bucket=upload_bucket, keep_local=keep_local)
         typer.echo("All datasets loaded successfully!")
     except Exception as e:
         typer.echo(f"Error loading datasets: {e}")
@@ -27,16 +47,41 @@ def load(data_path: str = typer.Option("data", help="Directory to save the proce
 def upload(
     bucket_name: str = typer.Option(..., help="GCS bucket name to upload to"),
     data_path: str = typer.Option("data", help="Local directory containing the datasets"),
+    workers: int = typer.Option(1, help="Upload this many files concurrently"),
+    composite_threshold_mb: Optional[int] = typer.Option(
+        None, help="Upload files above this size as parallel parts composed server-side"),
+    skip_unchanged: bool = typer.Option(
+        True, "--skip-unchanged/--force", help="Skip files whose checksums match the object already in the bucket"),
+    compression: Optional[str] = typer.Option(
+        None, help="Compress while uploading: gzip or zstd (stored with a matching Content-Encoding)"),
+    compression_level: Optional[int] = typer.Option(None, help="Compression level (default: 6 for gzip, 3 for zstd)"),
 ):
     """Upload processed IMDB datasets to Google Cloud Storage bucket."""
     typer.echo(f"Uploading datasets from {data_path} to gs://{bucket_name}")
     try:
-        upload_all_datasets(bucket_name, data_path)
+        upload_all_datasets(bucket_name, data_path, workers=workers,
+                            composite_threshold=composite_threshold_mb * 1024 * 1024
+                            if composite_threshold_mb else None,
+                            skip_unchanged=skip_unchanged, compression=compression,
+                            compression_level=compression_level)
         typer.echo("All datasets uploaded successfully!")
     except Exception as e:
         typer.echo(f"Error uploading datasets: {e}")
         raise typer.Exit(1)
 
+@app.command()
+def benchmark(rows: List[int] = typer.Option([1_000_000], help="Rows to generate per dataset; repeat for several sizes"),
+              output_path: str = typer.Option("bench_results.json", help="JSON file to save the results to"),
+              mode: List[str] = typer.Option(["extract", "stream"], help="Loader modes to benchmark"),
+              memory_budget_mb: Optional[int] = typer.Option(None, help="Size parse chunks to roughly this many MB")):
+    """Benchmark dataset loading on generated IMDB-shaped data served locally."""
+    try:
+        options = {'memory_budget': memory_budget_mb * 1024 ** 2} if memory_budget_mb else {}
+        run_benchmarks(rows, output_path, modes=tuple(mode), **options)
+    except Exception as e:
+        typer.echo(f"Error running benchmark: {e}")
+        raise typer.Exit(1)
+
 @app.command()
 def version():
     """Show version information."""
@@ -44,10 +89,37 @@ def version():
 
 @app.command()
 def summarize(data_path: str = typer.Option("data/processed/top_rated_weighted.csv", help="Path to the dataset"),
-              output_path: str = typer.Option("data/processed/enhanced.json", help="Path to the output file")):
+              output_path: str = typer.Option("data/processed/enhanced.json", help="Path to the output file"),
+              concurrency: int = typer.Option(100, help="Maximum number of LLM requests in flight"),
+              cache_path: Optional[str] = typer.Option(
+                  None, help="SQLite cache of finished summaries (default: summary_cache.sqlite next to the output)"),
+              cache: bool = typer.Option(True, help="Reuse and save summaries in the cache so reruns only pay for misses"),
+              batch_size: int = typer.Option(1, help="Movies per LLM request; above 1 uses multi-movie JSON prompts"),
+              mode: str = typer.Option("async", help="'async' for live requests, 'batch' for an offline Batch API job"),
+              state_path: Optional[str] = typer.Option(
+                  None, help="Saved batch job id for --mode batch (default: batch_job.json next to the output)"),
+              hedge: bool = typer.Option(False, help="Send a duplicate of calls slower than the p95 latency"),
+              hedge_model: Optional[str] = typer.Option(
+                  None, help="Model for the duplicate calls, e.g. a faster one (default: the same model)"),
+              metrics_path: Optional[str] = typer.Option(
+                  None, help="JSON report of API latency, tokens and cost, plus a .prom file "
+                             "(default: summarize_metrics.json next to the output)")):
     typer.echo(f"Getting summaries for {data_path}")
     try:
-        summarize_dataset(data_path, output_path)
+        if cache and cache_path is None:
+            cache_path = os.path.join(os.path.dirname(output_path), "summary_cache.sqlite")
+        if metrics_path is None:
+            metrics_path = os.path.join(os.path.dirname(output_path), "summarize_metrics.json")
+        if mode == "batch":
+            summarize_dataset_batch(data_path, output_path, state_path=state_path,
+                                    cache_path=cache_path if cache else None)
+        elif mode == "async":
+            summarize_dataset(data_path, output_path, concurrency=concurrency,
+                              cache_path=cache_path if cache else None, batch_size=batch_size,
+                              hedging=HedgePolicy(hedge_model=hedge_model) if hedge else None,
+                              metrics_path=metrics_path)
+        else:
+            raise ValueError(f"Unknown mode '{mode}', expected 'async' or 'batch'")
         typer.echo("Dataset summarized successfully!")
     except Exception as e:
         typer.echo(f"Error summarizing datasets: {e}")
@@ -1,6 +1,37 @@
+import csv
 import psycopg2
-from typing import List
-from dictionary import to_bitmask
+from typing import Iterable, List, Tuple
+from dictionary import DICTIONARY, to_bitmask
+
+# One bit per dictionary word, as to_bitmask renders them
+TAG_MASK_BITS = len(DICTIONARY)
+
+
+class CsvStream:
+    """Read-only file over rows rendered as CSV on demand, so COPY never needs them all in memory."""
+
+    def __init__(self, rows: Iterable[Tuple]):
+        self.rows = iter(rows)
+        self.pending = []
+        self.size = 0
+        self.writer = csv.writer(self, lineterminator="\n")
+
+    def write(self, text: str):
+        # Called by the csv writer with each rendered line
+        self.pending.append(text)
+        self.size += len(text)
+
+    def read(self, size: int = -1) -> str:
+        while size < 0 or self.size < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+        data = "".join(self.pending)
+        cut = len(data) if size < 0 else size
+        self.pending = [data[cut:]] if cut < len(data) else []
+        self.size = len(data) - cut
+        return data[:cut]
 
 
 class MovieDB:
@@ -14,13 +45,13 @@ class MovieDB:
 
     def _init_schema(self):
         with self.conn.cursor() as cur:
-            cur.execute("""
+            cur.execute(f"""
             CREATE TABLE IF NOT EXISTS movies (
                 id SERIAL PRIMARY KEY,
                 title TEXT NOT NULL,
                 year INTEGER NOT NULL,
                 rating DECIMAL(4, 3) NOT NULL,
-                tag_mask BIT(50) NOT NULL,
+                tag_mask BIT({TAG_MASK_BITS}) NOT NULL,
                 UNIQUE(title, year)
             );
             """)
@@ -35,13 +66,52 @@ class MovieDB:
                 (title, year, rating, bitmask)
             )
 
+    def upsert_movies(self, movies: Iterable[Tuple[str, int, float, List[str]]]) -> int:
+        """
+        Load (title, year, rating, tags) rows in one transaction and return how many were inserted or changed.
+
+        Rows are streamed with COPY into a temporary staging table and merged into movies with
+        a single INSERT ... ON CONFLICT. Existing movies are only rewritten when their rating
+        or tags differ; when a title and year appear more than once, the last row wins.
+        """
+        rows = ((title, year, rating, to_bitmask(tags)) for title, year, rating, tags in movies)
+        self.conn.autocommit = False
+        try:
+            with self.conn, self.conn.cursor() as cur:
+                cur.execute(f"""
+                CREATE TEMP TABLE movies_staging (
+                    line BIGSERIAL,
+                    title TEXT NOT NULL,
+                    year INTEGER NOT NULL,
+                    rating DECIMAL(4, 3) NOT NULL,
+                    tag_mask BIT({TAG_MASK_BITS}) NOT NULL
+                ) ON COMMIT DROP;
+                """)
+                cur.copy_expert(
+                    "COPY movies_staging (title, year, rating, tag_mask) FROM STDIN WITH (FORMAT csv)",
+                    CsvStream(rows)
+                )
+                cur.execute("""
+                INSERT INTO movies (title, year, rating, tag_mask)
+                SELECT DISTINCT ON (title, year) title, year, rating, tag_mask
+                FROM movies_staging
+                ORDER BY title, year, line DESC
+                ON CONFLICT (title, year) DO UPDATE
+                SET rating = EXCLUDED.rating, tag_mask = EXCLUDED.tag_mask
+                WHERE movies.rating IS DISTINCT FROM EXCLUDED.rating
+                   OR movies.tag_mask IS DISTINCT FROM EXCLUDED.tag_mask;
+                """)
+                return cur.rowcount
+        finally:
+            self.conn.autocommit = True
+
     def search_by_tags(self, tags: List[str], limit: int = 5):
         bitmask = to_bitmask(tags)
         print(bitmask)
         with self.conn.cursor() as cur:
             cur.execute(f"""
             WITH input(mask) AS (
-                SELECT B'{bitmask}'::BIT(50)
+                SELECT B'{bitmask}'::BIT({TAG_MASK_BITS})
             )
             SELECT
               m.title,
@@ -1,6 +1,7 @@
 import os
 import pandas as pd
 from db import MovieDB
+from schemas import get_schema
 
 def upload_to_db(data_path: str):
     db = MovieDB(
@@ -12,9 +13,18 @@ def upload_to_db(data_path: str):
     )
 
     df = pd.read_json(data_path, lines=True)
-    for _, row in df.iterrows():
-        tags = [tag.strip() for tag in row['summary'].split(",")]
-        db.add_movie(row['primaryTitle'], row['startYear'], tags, row['weighted_rating'])
+    df = df.astype(get_schema('enhanced').pandas_dtypes(df.columns))
+    # year and rating are NOT NULL in the movies table, so rows missing either cannot be stored
+    missing = df['startYear'].isna() | df['weightedRating'].isna()
+    if missing.any():
+        print(f"Skipping {int(missing.sum())} movies without a start year or rating")
+    movies = df[~missing]
+    changed = db.upsert_movies(
+        (title, int(year), float(rating), [tag.strip() for tag in summary.split(",")])
+        for title, year, rating, summary in zip(
+            movies['primaryTitle'], movies['startYear'], movies['weightedRating'], movies['summary'])
+    )
+    print(f"Loaded {len(movies)} movies, {changed} new or changed")
 
     db.close()
 
@@ -0,0 +1,144 @@
+import os
+import json
+import fcntl
+import requests
+from contextlib import contextmanager
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+
+class DownloadCache:
+    """Local cache of downloaded dataset files with an HTTP validator manifest."""
+
+    MANIFEST_NAME = "manifest.json"
+    PARTIAL_SUFFIX = ".part"
+
+    def __init__(self, cache_dir: str, chunk_size: int = 1024 * 1024):
+        """
+        Args:
+            cache_dir: Directory holding cached files and the manifest
+            chunk_size: Bytes read per iteration while streaming a response to disk
+        """
+        self.cache_dir = cache_dir
+        self.chunk_size = chunk_size
+        self.manifest_path = os.path.join(cache_dir, self.MANIFEST_NAME)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest = self._load_manifest()
+
+    def path_for(self, url: str) -> str:
+        """Local path of the cached copy of url."""
+        return os.path.join(self.cache_dir, os.path.basename(urlparse(url).path))
+
+    def fetch(self, url: str) -> Tuple[str, bool]:
+        """
+        Make sure an up-to-date copy of url is in the cache.
+
+        Complete files are revalidated with If-None-Match/If-Modified-Since;
+        interrupted transfers are resumed with Range/If-Range.
+
+        Returns:
+            (local path, True if the file was (re)downloaded in this call)
+        """
+        path = self.path_for(url)
+        partial_path = path + self.PARTIAL_SUFFIX
+        entry = self.manifest.get(url)
+
+        headers = {}
+        offset = 0
+        if entry and entry.get("complete") and self._has_complete_copy(path, entry):
+            headers.update(self._conditional_headers(entry))
+        elif entry and not entry.get("complete") and os.path.exists(partial_path):
+            validator = entry.get("etag") or entry.get("last_modified")
+            if validator:
+                offset = os.path.getsize(partial_path)
+                headers["Range"] = f"bytes={offset}-"
+                headers["If-Range"] = validator
+
+        with requests.get(url, headers=headers, stream=True) as r:
+            if r.status_code == 304:
+                print(f"Not modified since last download: {url}")
+                return path, False
+
+            resumed = r.status_code == 206 and r.headers.get("Content-Range", "").startswith(f"bytes {offset}-")
+            if offset and (r.status_code == 416 or (r.status_code == 206 and not resumed)):
+                # Our partial copy no longer lines up with the remote file; start over
+                os.remove(partial_path)
+                self._forget(url)
+                return self.fetch(url)
+
+            r.raise_for_status()
+
+            if resumed:
+                print(f"Resuming {url} from byte {offset}...")
+                mode = "ab"
+            else:
+                print(f"Downloading {url} → {path}...")
+                mode = "wb"
+                self._write_entry(url, {
+                    "etag": r.headers.get("ETag"),
+                    "last_modified": r.headers.get("Last-Modified"),
+                    "size": None,
+                    "complete": False,
+                })
+
+            with open(partial_path, mode) as f:
+                for chunk in r.iter_content(chunk_size=self.chunk_size):
+                    f.write(chunk)
+
+        os.replace(partial_path, path)
+        self._write_entry(url, dict(self.manifest[url], size=os.path.getsize(path), complete=True))
+        print(f"Download complete: {path}")
+        return path, True
+
+    @staticmethod
+    def _has_complete_copy(path: str, entry: Dict) -> bool:
+        return os.path.exists(path) and os.path.getsize(path) == entry.get("size")
+
+    @staticmethod
+    def _conditional_headers(entry: Dict) -> Dict[str, str]:
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def _forget(self, url: str):
+        self._write_entry(url, None)
+
+    @contextmanager
+    def _locked(self):
+        # Several loader processes may share one cache directory
+        with open(self.manifest_path + ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _write_entry(self, url: str, entry: Optional[Dict]):
+        """Update one URL's entry, merging with whatever other processes have written."""
+        with self._locked():
+            manifest = self._load_manifest()
+            if entry is None:
+                manifest.pop(url, None)
+            else:
+                manifest[url] = entry
+            self._save_manifest(manifest)
+        self.manifest = manifest
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: ignoring unreadable cache manifest {self.manifest_path}: {e}")
+            return {}
+
+    def _save_manifest(self, manifest: Dict[str, Dict]):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
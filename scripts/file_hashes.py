@@ -0,0 +1,70 @@
+import os
+import json
+import base64
+import hashlib
+import threading
+import google_crc32c
+from typing import Dict
+
+
+class FileHashCache:
+    """MD5 and CRC32C of local files, cached on disk by path, size and mtime."""
+
+    def __init__(self, manifest_path: str, chunk_size: int = 1024 * 1024):
+        """
+        Args:
+            manifest_path: JSON file the hashes are kept in between runs
+            chunk_size: Bytes read per iteration while hashing
+        """
+        self.manifest_path = manifest_path
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        self.manifest = self._load_manifest()
+
+    def hashes(self, path: str) -> Dict[str, str]:
+        """
+        Base64 MD5 and CRC32C of path, in the format GCS reports them in blob metadata.
+
+        The file is only read when its size or mtime changed since it was last hashed.
+        """
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            entry = self.manifest.get(key)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return {"md5": entry["md5"], "crc32c": entry["crc32c"]}
+
+        md5 = hashlib.md5()
+        crc32c = google_crc32c.Checksum()
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(self.chunk_size)
+                if not block:
+                    break
+                md5.update(block)
+                crc32c.update(block)
+
+        result = {
+            "md5": base64.b64encode(md5.digest()).decode("ascii"),
+            "crc32c": base64.b64encode(crc32c.digest()).decode("ascii"),
+        }
+        with self.lock:
+            self.manifest[key] = dict(result, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+            self._save_manifest()
+        return result
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: ignoring unreadable hash manifest {self.manifest_path}: {e}")
+            return {}
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
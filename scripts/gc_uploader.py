@@ -1,50 +1,140 @@
 import os
+import time
+import random
+import uuid
+import zlib
+import threading
 import typer
+import pyarrow as pa
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import List, Optional
+from requests.adapters import HTTPAdapter
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud import storage
 from google.cloud.exceptions import GoogleCloudError
 
+from scripts.file_hashes import FileHashCache
+from scripts.sinks import GCSBlobSink, SinkStream
+
+DATASET_EXTENSIONS = [".csv", ".parquet"]
+
+# GCS composes at most 32 source objects per request
+MAX_COMPOSE_SOURCES = 32
+
+HASH_MANIFEST_NAME = ".upload_hashes.json"
+
+# Default level per codec: zlib's own default and the zstd CLI's
+COMPRESSION_LEVELS = {"gzip": 6, "zstd": 3}
+COMPRESS_BLOCK_SIZE = 4 * 1024 * 1024
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
 
 def upload_all_datasets(
     bucket_name: str = typer.Option(..., help="GCS bucket name to upload to"),
     data_path: str = typer.Option("data", help="Local directory containing the datasets"),
+    workers: int = 1,
+    composite_threshold: Optional[int] = None,
+    skip_unchanged: bool = True,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
 ):
     """Upload all processed IMDB datasets to Google Cloud Storage bucket."""
-    dataset_files = [
-        # "directors.csv",
-        # "crew.csv", 
-        "basic_titles.csv",
-        "ratings.csv"
+    dataset_names = [
+        # "directors",
+        # "crew", 
+        "basic_titles",
+        "ratings"
     ]
     
-    uploader = GCSUploader(bucket_name)
+    hash_cache_path = os.path.join(data_path, HASH_MANIFEST_NAME) if skip_unchanged else None
+    uploader = GCSUploader(bucket_name, max_workers=workers, composite_threshold=composite_threshold,
+                           hash_cache_path=hash_cache_path, compression=compression,
+                           compression_level=compression_level)
+    file_mappings = []
+    
+    for name in dataset_names:
+        found = False
+        for extension in DATASET_EXTENSIONS:
+            filename = f"{name}{extension}"
+            local_path = os.path.join(data_path, filename)
+            if os.path.exists(local_path):
+                file_mappings.append((local_path, filename))
+                found = True
+        if not found:
+            print(f"Warning: {os.path.join(data_path, name)}.* not found, skipping...")
     
-    for filename in dataset_files:
-        local_path = os.path.join(data_path, filename)
-        if os.path.exists(local_path):
+    if workers > 1:
+        uploaded = uploader.upload_multiple_files(file_mappings, concurrent=True)
+        if len(uploaded) < len(file_mappings):
+            raise GoogleCloudError(f"{len(file_mappings) - len(uploaded)} of {len(file_mappings)} uploads failed")
+    else:
+        for local_path, filename in file_mappings:
             uploader.upload_file(local_path, filename)
-        else:
-            print(f"Warning: {local_path} not found, skipping...")
+    
+    if skip_unchanged:
+        print(f"Skipped {uploader.skipped['files']} unchanged files, "
+              f"avoided sending {uploader._format_size(uploader.skipped['bytes'])}")
+    if compression:
+        stats = uploader.compression_stats
+        print(f"Compressed {uploader._format_size(stats['source_bytes'])} → "
+              f"{uploader._format_size(stats['sent_bytes'])} ({uploader.compression_ratio():.1f}x) "
+              f"with {compression} level {uploader.compression_level}, {stats['cpu_seconds']:.2f}s CPU")
 
 
 class GCSUploader:
     """Handle uploading files to Google Cloud Storage."""
     
-    def __init__(self, bucket_name: str):
+    def __init__(self, bucket_name: str, max_workers: int = 8, max_retries: int = 3,
+                 backoff_seconds: float = 1.0, composite_threshold: Optional[int] = None,
+                 part_size: int = 128 * 1024 * 1024, hash_cache_path: Optional[str] = None,
+                 compression: Optional[str] = None, compression_level: Optional[int] = None):
         """
         Args:
             bucket_name: Name of the GCS bucket
-            prefix: Optional prefix/folder path in the bucket
+            max_workers: Upload threads used by concurrent and composite uploads
+            max_retries: Attempts per file for concurrent uploads, and per part for composite uploads;
+                a composite upload is not retried as a whole on top of its parts
+            backoff_seconds: Base delay before a retry; doubles with every attempt
+            composite_threshold: Files larger than this many bytes are uploaded as parallel
+                parts and composed server-side; None always uploads in a single stream
+            part_size: Bytes per part of a composite upload
+            hash_cache_path: Hash manifest file; when set, files whose MD5/CRC32C match the
+                existing remote object are skipped instead of uploaded again
+            compression: 'gzip' or 'zstd' to compress files while uploading. Objects keep their
+                name and content type and get a matching Content-Encoding; GCS serves gzip
+                objects decompressed to clients that do not accept gzip, zstd objects as stored.
+                Compressed files are always sent as a single stream, never as composite parts
+            compression_level: Codec level; defaults to 6 for gzip and 3 for zstd
+        
+        Raises:
+            ValueError: If compression names an unsupported codec
         """
+        if compression is not None and compression not in COMPRESSION_LEVELS:
+            raise ValueError(f"Unsupported compression: {compression} (use one of {', '.join(COMPRESSION_LEVELS)})")
         self.bucket_name = bucket_name
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.composite_threshold = composite_threshold
+        self.part_size = part_size
+        self.hash_cache = FileHashCache(hash_cache_path) if hash_cache_path else None
+        self.compression = compression
+        self.compression_level = compression_level if compression_level is not None \
+            else COMPRESSION_LEVELS.get(compression)
+        self.skipped = {'files': 0, 'bytes': 0}
+        self.compression_stats = {'source_bytes': 0, 'sent_bytes': 0, 'cpu_seconds': 0.0}
+        self.stats_lock = threading.Lock()
         self.client = None
         self.bucket = None
+        self.last_report = None
         
     def _init_client(self):
         """Initialize GCS client and bucket (lazy loading)."""
         if self.client is None:
             try:
-                self.client = storage.Client()
+                credentials, _ = google.auth.default(scopes=storage.Client.SCOPE)
+                self.client = storage.Client(credentials=credentials, _http=self._authorized_session(credentials))
                 self.bucket = self.client.bucket(self.bucket_name)
                 print(f"Connected to GCS bucket: {self.bucket_name}")
             except Exception as e:
@@ -77,30 +167,201 @@ class GCSUploader:
         blob = self.bucket.blob(blob_name)
         
         file_size = os.path.getsize(local_file_path)
+        gcs_path = f"gs://{self.bucket_name}/{blob_name}"
+        
+        if self.hash_cache is not None and self._matches_remote(local_file_path, blob_name):
+            print(f"Unchanged, skipping: {local_file_path} = {gcs_path}")
+            with self.stats_lock:
+                self.skipped['files'] += 1
+                self.skipped['bytes'] += file_size
+            return gcs_path
         
         try:
             print(f"Uploading {local_file_path} → gs://{self.bucket_name}/{blob_name}")
             print(f"   File size: {self._format_size(file_size)}")
             
-            blob.upload_from_filename(local_file_path)
+            if self.compression is not None:
+                self._compressed_upload(local_file_path, blob_name, file_size)
+            elif self._is_composite(file_size):
+                self._composite_upload(local_file_path, blob, file_size)
+            else:
+                blob.upload_from_filename(local_file_path)
             
-            gcs_path = f"gs://{self.bucket_name}/{blob_name}"
             print(f"Upload complete: {gcs_path}")
             return gcs_path
             
         except Exception as e:
             raise GoogleCloudError(f"Failed to upload {local_file_path}: {e}")
     
-    def upload_multiple_files(self, file_mappings: List[tuple]) -> List[str]:
+    def _is_composite(self, file_size: int) -> bool:
+        return self.compression is None and self.composite_threshold is not None \
+            and file_size > self.composite_threshold
+    
+    def _matches_remote(self, local_file_path: str, blob_name: str) -> bool:
+        """Whether the remote object has the same content, encoded the way this run would upload it."""
+        try:
+            remote = self.bucket.get_blob(blob_name)
+        except Exception as e:
+            print(f"Warning: could not read metadata of {blob_name}, uploading: {e}")
+            return False
+        if remote is None:
+            return False
+        if not remote.content_encoding and remote.md5_hash is None and remote.crc32c is None:
+            return False
+        # Same source bytes under another encoding or level still need uploading to apply this run's setting
+        if (remote.content_encoding or None) != self.compression:
+            return False
+        if self.compression and (remote.metadata or {}).get('compression-level') != str(self.compression_level):
+            return False
+        
+        local = self.hash_cache.hashes(local_file_path)
+        if remote.content_encoding:
+            # The stored bytes are compressed; compare the hashes of the source recorded at upload
+            metadata = remote.metadata or {}
+            return (metadata.get('source-md5') == local['md5']
+                    and metadata.get('source-crc32c') == local['crc32c'])
+        # Composite objects carry only a CRC32C
+        if remote.md5_hash is not None and remote.md5_hash != local['md5']:
+            return False
+        return remote.crc32c is None or remote.crc32c == local['crc32c']
+    
+    def _compressed_upload(self, local_file_path: str, blob_name: str, file_size: int):
+        """Compress the file block by block straight into a resumable upload."""
+        metadata = None
+        if self.hash_cache is not None:
+            local = self.hash_cache.hashes(local_file_path)
+            metadata = {'source-md5': local['md5'], 'source-crc32c': local['crc32c'],
+                        'compression-level': str(self.compression_level)}
+        sink = GCSBlobSink(self.bucket_name, blob_name, content_encoding=self.compression, metadata=metadata,
+                           client=self.client)
+        compress, flush = self._compressor()
+        cpu_seconds = 0.0
+        
+        output = SinkStream([sink])
+        try:
+            with open(local_file_path, 'rb') as f:
+                for block in iter(lambda: f.read(COMPRESS_BLOCK_SIZE), b''):
+                    started = time.thread_time()
+                    data = compress(block)
+                    cpu_seconds += time.thread_time() - started
+                    output.write(data)
+            started = time.thread_time()
+            data = flush()
+            cpu_seconds += time.thread_time() - started
+            output.write(data)
+        except BaseException:
+            output.abort()
+            raise
+        finally:
+            output.close()
+        
+        sent_bytes = output.bytes_written
+        with self.stats_lock:
+            self.compression_stats['source_bytes'] += file_size
+            self.compression_stats['sent_bytes'] += sent_bytes
+            self.compression_stats['cpu_seconds'] += cpu_seconds
+        print(f"   Sent {self._format_size(sent_bytes)} {self.compression} level {self.compression_level} "
+              f"({file_size / max(sent_bytes, 1):.1f}x), {cpu_seconds:.2f}s CPU")
+    
+    def _compressor(self):
+        """(compress, flush) functions of a streaming compressor for self.compression."""
+        if self.compression == 'gzip':
+            compressor = zlib.compressobj(self.compression_level, zlib.DEFLATED, GZIP_WBITS)
+            return compressor.compress, compressor.flush
+        # One zstd frame per block; concatenated frames decode as a single stream
+        codec = pa.Codec('zstd', compression_level=self.compression_level)
+        return (lambda block: codec.compress(block, asbytes=True)), (lambda: b'')
+    
+    def compression_ratio(self) -> float:
+        """Source bytes per byte sent, over all compressed uploads so far."""
+        return self.compression_stats['source_bytes'] / max(self.compression_stats['sent_bytes'], 1)
+    
+    def _composite_upload(self, local_file_path: str, blob, file_size: int):
+        """Upload byte ranges of the file as temporary objects in parallel, then compose them into blob."""
+        upload_id = uuid.uuid4().hex[:12]
+        prefix = f"{blob.name}.parts-{upload_id}/"
+        ranges = [(start, min(self.part_size, file_size - start)) for start in range(0, file_size, self.part_size)]
+        temporary = []
+        print(f"   Composite upload in {len(ranges)} parts of up to {self._format_size(self.part_size)}")
+        
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = []
+                for i, (start, length) in enumerate(ranges):
+                    part = self.bucket.blob(f"{prefix}{i:05d}")
+                    temporary.append(part)
+                    futures.append(executor.submit(
+                        self._retry, lambda part=part, start=start, length=length:
+                        self._upload_part(local_file_path, part, start, length),
+                        f"part {part.name}"))
+                for future in futures:
+                    future.result()
+            
+            sources = list(temporary)
+            level = 0
+            # Compose in rounds until the sources fit in a single request
+            while len(sources) > MAX_COMPOSE_SOURCES:
+                level += 1
+                intermediates = []
+                for i in range(0, len(sources), MAX_COMPOSE_SOURCES):
+                    intermediate = self.bucket.blob(f"{prefix}compose-{level}-{i // MAX_COMPOSE_SOURCES:05d}")
+                    temporary.append(intermediate)
+                    self._retry(lambda intermediate=intermediate, batch=sources[i:i + MAX_COMPOSE_SOURCES]:
+                                intermediate.compose(batch), f"compose {intermediate.name}")
+                    intermediates.append(intermediate)
+                sources = intermediates
+            self._retry(lambda: blob.compose(sources), f"compose {blob.name}")
+        finally:
+            for part in temporary:
+                try:
+                    part.delete()
+                except Exception as e:
+                    print(f"Warning: could not delete temporary part {part.name}: {e}")
+    
+    @staticmethod
+    def _upload_part(local_file_path: str, part, start: int, length: int):
+        with open(local_file_path, 'rb') as f:
+            f.seek(start)
+            part.upload_from_file(f, size=length)
+    
+    def _retry(self, action, description: str):
+        """Run action, retrying GoogleCloudError and other upload failures with jittered exponential backoff."""
+        for attempt in range(1, self.max_retries + 1):
+            try:
+                return action()
+            except FileNotFoundError:
+                raise
+            except Exception as e:
+                if attempt == self.max_retries:
+                    if isinstance(e, GoogleCloudError):
+                        raise
+                    raise GoogleCloudError(f"Failed to upload {description}: {e}")
+                delay = self.backoff_seconds * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                print(f"Upload of {description} failed (attempt {attempt}/{self.max_retries}), "
+                      f"retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+    
+    def _authorized_session(self, credentials) -> AuthorizedSession:
+        """HTTP session for the client with a connection per upload thread; requests keeps 10 by default."""
+        session = AuthorizedSession(credentials)
+        pool_size = max(10, self.max_workers)
+        session.mount("https://", HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+        return session
+    
+    def upload_multiple_files(self, file_mappings: List[tuple], concurrent: bool = False) -> List[str]:
         """
         Upload multiple files to GCS bucket.
         
         Args:
             file_mappings: List of (local_path, remote_filename) tuples
+            concurrent: Upload on a pool of max_workers threads, retrying each file with backoff
             
         Returns:
-            List of GCS paths for uploaded files
+            List of GCS paths for uploaded files, in the order of file_mappings
         """
+        if concurrent:
+            return self._upload_concurrently(file_mappings)
+        
         uploaded_paths = []
         
         for local_path, remote_filename in file_mappings:
@@ -113,6 +374,54 @@ class GCSUploader:
         
         return uploaded_paths
     
+    def _upload_concurrently(self, file_mappings: List[tuple]) -> List[str]:
+        self._init_client()
+        started = time.monotonic()
+        results = [None] * len(file_mappings)
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._upload_with_retry, local_path, remote_filename): i
+                for i, (local_path, remote_filename) in enumerate(file_mappings)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except (FileNotFoundError, GoogleCloudError) as e:
+                    print(f"Failed to upload {file_mappings[i][0]}: {e}")
+        
+        elapsed = max(time.monotonic() - started, 1e-9)
+        uploaded_bytes = sum(
+            os.path.getsize(local_path)
+            for (local_path, _), result in zip(file_mappings, results) if result is not None
+        )
+        uploaded_paths = [result for result in results if result is not None]
+        self.last_report = {
+            'files': len(uploaded_paths),
+            'failed': len(file_mappings) - len(uploaded_paths),
+            'bytes': uploaded_bytes,
+            'seconds': elapsed,
+            'bytes_per_second': uploaded_bytes / elapsed,
+            'skipped_files': self.skipped['files'],
+            'skipped_bytes': self.skipped['bytes'],
+        }
+        if self.compression is not None:
+            self.last_report.update(
+                compression_ratio=self.compression_ratio(),
+                compressed_bytes=self.compression_stats['sent_bytes'],
+                compression_cpu_seconds=self.compression_stats['cpu_seconds'],
+            )
+        print(f"Uploaded {len(uploaded_paths)}/{len(file_mappings)} files, {self._format_size(uploaded_bytes)} "
+              f"in {elapsed:.1f}s ({self._format_size(uploaded_bytes / elapsed)}/s)")
+        return uploaded_paths
+    
+    def _upload_with_retry(self, local_file_path: str, remote_filename: Optional[str] = None) -> str:
+        # Composite uploads retry each part themselves; retrying the whole file would multiply the attempts
+        if os.path.exists(local_file_path) and self._is_composite(os.path.getsize(local_file_path)):
+            return self.upload_file(local_file_path, remote_filename)
+        return self._retry(lambda: self.upload_file(local_file_path, remote_filename), local_file_path)
+    
     def delete_file(self, remote_filename: str) -> bool:
         """
         Delete a file from GCS bucket.
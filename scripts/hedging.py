@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class HedgePolicy:
+    """
+    Sends a duplicate of a slow request and keeps whichever answer arrives first.
+
+    Once min_samples latencies have been seen, a request still running after the quantile
+    (p95 by default) of the recent latencies gets a hedge: the same request again, sent to
+    hedge_model when one is given. The first valid answer wins; an error or an invalid answer
+    waits for the other attempt. Hedges are capped at max_hedge_rate of all requests, so a
+    slow API is not hit with twice the load. stats counts requests, hedges fired and hedges
+    whose answer was used.
+
+    Threads and asyncio callers go through call() and call_async(). Async losers are
+    cancelled; a losing thread request cannot be interrupted and finishes in the background.
+    """
+
+    def __init__(self, quantile: float = 0.95, max_hedge_rate: float = 0.1, hedge_model: Optional[str] = None,
+                 min_samples: int = 20, window: int = 500, max_workers: int = 32):
+        """
+        Args:
+            quantile: Latency quantile after which a request is hedged
+            max_hedge_rate: Largest share of requests that may be hedged
+            hedge_model: Model for the duplicate, e.g. a cheaper or faster one; the
+                request's own model when omitted
+            min_samples: Latencies to observe before the first hedge
+            window: Recent latencies the quantile is taken over
+            max_workers: Threads running the attempts of call()
+        """
+        self.quantile = quantile
+        self.max_hedge_rate = max_hedge_rate
+        self.hedge_model = hedge_model
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self.stats = {'requests': 0, 'hedges_fired': 0, 'hedges_won': 0}
+
+    def delay(self) -> Optional[float]:
+        """Seconds after which a request is hedged, or None while there are too few samples"""
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        return ordered[max(0, math.ceil(self.quantile * len(ordered)) - 1)]
+
+    def record(self, latency: float):
+        with self.lock:
+            self.latencies.append(latency)
+
+    def call(self, request: Callable[[str], Any], model: str, valid: Optional[Callable[[Any], bool]] = None):
+        """Return request(model), hedged with request(hedge model) if it is slow"""
+        delay = self._start()
+        primary = self.executor.submit(request, model)
+        self._time(primary)
+        if delay is None:
+            return primary.result()
+        wait([primary], timeout=delay)
+        if primary.done() or not self._may_hedge():
+            return primary.result()
+
+        hedge = self.executor.submit(request, self.hedge_model or model)
+        fallback = None
+        for future in as_completed([primary, hedge]):
+            if future.exception() is not None:
+                continue
+            if valid is None or valid(future.result()):
+                return self._finished(future is hedge, future.result())
+            fallback = fallback or future
+        if fallback is not None:
+            return self._finished(fallback is hedge, fallback.result())
+        # Both attempts failed: report the original request's error
+        return primary.result()
+
+    async def call_async(self, request: Callable[[str], Any], model: str,
+                         valid: Optional[Callable[[Any], bool]] = None):
+        """call() for coroutine functions; the losing attempt is cancelled"""
+        async def attempt(chosen_model: str, is_hedge: bool):
+            return is_hedge, await request(chosen_model)
+
+        delay = self._start()
+        primary = asyncio.ensure_future(attempt(model, False))
+        self._time(primary)
+        hedge = None
+        try:
+            if delay is not None:
+                await asyncio.wait([primary], timeout=delay)
+            if delay is None or primary.done() or not self._may_hedge():
+                return (await primary)[1]
+
+            hedge = asyncio.ensure_future(attempt(self.hedge_model or model, True))
+            fallback = None
+            for next_done in asyncio.as_completed([primary, hedge]):
+                try:
+                    is_hedge, result = await next_done
+                except Exception:
+                    continue
+                if valid is None or valid(result):
+                    return self._finished(is_hedge, result)
+                fallback = fallback or (is_hedge, result)
+            if fallback is not None:
+                return self._finished(*fallback)
+            # Both attempts failed: report the original request's error
+            return (await primary)[1]
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def _time(self, future):
+        """Record the original attempt's latency once it is done; a cancelled one took at least that long"""
+        started = time.monotonic()
+
+        def done(future):
+            if future.cancelled() or future.exception() is None:
+                self.record(time.monotonic() - started)
+
+        future.add_done_callback(done)
+
+    def _start(self) -> Optional[float]:
+        delay = self.delay()
+        with self.lock:
+            self.stats['requests'] += 1
+        return delay
+
+    def _may_hedge(self) -> bool:
+        with self.lock:
+            if self.stats['hedges_fired'] + 1 > self.max_hedge_rate * self.stats['requests']:
+                return False
+            self.stats['hedges_fired'] += 1
+        logger.info(f"Request is slower than the p{round(self.quantile * 100)} latency, sending a hedge")
+        return True
+
+    def _finished(self, hedge_won: bool, result):
+        if hedge_won:
+            with self.lock:
+                self.stats['hedges_won'] += 1
+        return result
@@ -0,0 +1,72 @@
+import json
+import math
+import os
+import time
+from typing import Any, Dict
+
+import pandas as pd
+
+
+def json_value(value: Any) -> Any:
+    """value as plain JSON: pandas NA and float NaN become null, numpy scalars become Python ones."""
+    if value is pd.NA or value is None:
+        return None
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class JsonlWriter:
+    """
+    Appends records to a JSON Lines file as they are produced.
+
+    Every line is flushed as soon as it is written, so another process tailing the file only
+    ever sees whole lines. fsync is batched: the file is synced every fsync_every lines or
+    fsync_interval seconds, whichever comes first, and once more on close.
+    """
+
+    def __init__(self, path: str, fsync_every: int = 100, fsync_interval: float = 1.0):
+        """
+        Args:
+            path: Output file; truncated when opened
+            fsync_every: Lines written between two fsyncs
+            fsync_interval: Longest time in seconds a written line may wait for an fsync
+        """
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.lines = 0
+        self.unsynced = 0
+        self.file = open(path, 'w', encoding='utf-8')
+        self.last_sync = time.monotonic()
+
+    def write(self, record: Dict[str, Any]):
+        line = json.dumps({key: json_value(value) for key, value in record.items()}, ensure_ascii=False)
+        self.file.write(line + "\n")
+        self.file.flush()
+        self.lines += 1
+        self.unsynced += 1
+        if self.unsynced >= self.fsync_every or time.monotonic() - self.last_sync >= self.fsync_interval:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        if self.file.closed:
+            return
+        try:
+            self.sync()
+        finally:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
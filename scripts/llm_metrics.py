@@ -0,0 +1,232 @@
+import json
+import math
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, math.inf)
+
+# USD per million (prompt, completion) tokens of live requests
+MODEL_PRICES = {
+    'gpt-4.1-nano': (0.10, 0.40),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4.1': (2.00, 8.00),
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+}
+
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Price of one call in USD; models missing from MODEL_PRICES cost 0"""
+    prompt_price, completion_price = MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+
+
+class LatencyHistogram:
+    """Latencies counted into LATENCY_BUCKETS, with quantiles interpolated inside a bucket."""
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        for i, bound in enumerate(self.bounds):
+            if seconds <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen, lower = 0, 0.0
+        for bound, count in zip(self.bounds, self.counts):
+            if count and seen + count >= rank:
+                upper = min(bound, self.max)
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = bound
+        return self.max
+
+    def cumulative(self):
+        """(upper bound, observations at or below it) pairs, as Prometheus buckets count them"""
+        total = 0
+        for bound, count in zip(self.bounds, self.counts):
+            total += count
+            yield bound, total
+
+
+class CallStats:
+    """Counters of one call type."""
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.calls = 0
+        self.retries = 0
+        self.errors = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+
+    def report(self) -> Dict:
+        return {
+            'calls': self.calls,
+            'retries': self.retries,
+            'errors': self.errors,
+            'failures': self.failures,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cost_usd': round(self.cost, 6),
+            'latency_seconds': {
+                'count': self.latency.count,
+                'mean': self.latency.sum / self.latency.count if self.latency.count else None,
+                'p50': self.latency.quantile(0.5),
+                'p95': self.latency.quantile(0.95),
+                'p99': self.latency.quantile(0.99),
+                'max': self.latency.max,
+            },
+        }
+
+
+class LLMMetrics:
+    """
+    Per call type accounting of OpenAI calls: latency, tokens, cost, retries and failures.
+
+    Each attempt the rate limiter makes goes through track() or track_async(), which time it
+    and read its usage; every attempt after the first of a call counts as a retry and every
+    attempt that raised as an error. failed() marks a call that gave up for good. The counts
+    can be exported as a JSON run report or as Prometheus text metrics.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats: Dict[str, CallStats] = {}
+        self.started = time.time()
+
+    def track(self, call_type: str, model: str, request: Callable) -> Callable:
+        """request wrapped to record every attempt of one call"""
+        attempts = 0
+
+        def attempt():
+            nonlocal attempts
+            attempts += 1
+            self._attempted(call_type, attempts)
+            started = time.monotonic()
+            try:
+                response = request()
+            except Exception:
+                self._errored(call_type)
+                raise
+            self._succeeded(call_type, model, time.monotonic() - started, response)
+            return response
+
+        return attempt
+
+    def track_async(self, call_type: str, model: str, request: Callable) -> Callable:
+        """track() for coroutine functions"""
+        attempts = 0
+
+        async def attempt():
+            nonlocal attempts
+            attempts += 1
+            self._attempted(call_type, attempts)
+            started = time.monotonic()
+            try:
+                response = await request()
+            except Exception:
+                self._errored(call_type)
+                raise
+            self._succeeded(call_type, model, time.monotonic() - started, response)
+            return response
+
+        return attempt
+
+    def failed(self, call_type: str):
+        with self.lock:
+            self._stats(call_type).failures += 1
+
+    def report(self) -> Dict:
+        """Run report: counters and latency summary per call type and in total"""
+        with self.lock:
+            by_type = {call_type: stats.report() for call_type, stats in sorted(self.stats.items())}
+        totals = {key: sum(report[key] for report in by_type.values())
+                  for key in ('calls', 'retries', 'errors', 'failures', 'prompt_tokens', 'completion_tokens')}
+        totals['cost_usd'] = round(sum(report['cost_usd'] for report in by_type.values()), 6)
+        return {'started': self.started, 'duration_seconds': time.time() - self.started,
+                'total': totals, 'call_types': by_type}
+
+    def write_report(self, path: str):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def prometheus(self) -> str:
+        """The counters in the Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            stats = sorted(self.stats.items())
+            counters = [
+                ('llm_calls_total', 'LLM calls started', lambda s: s.calls),
+                ('llm_retries_total', 'LLM call attempts after the first', lambda s: s.retries),
+                ('llm_errors_total', 'LLM call attempts that raised', lambda s: s.errors),
+                ('llm_failures_total', 'LLM calls that failed after every retry', lambda s: s.failures),
+                ('llm_cost_usd_total', 'Estimated LLM spend in USD', lambda s: s.cost),
+            ]
+            for name, help_text, value in counters:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                lines += [f'{name}{{call_type="{call_type}"}} {value(s)}' for call_type, s in stats]
+
+            lines += ["# HELP llm_tokens_total LLM tokens used", "# TYPE llm_tokens_total counter"]
+            for call_type, s in stats:
+                lines.append(f'llm_tokens_total{{call_type="{call_type}",kind="prompt"}} {s.prompt_tokens}')
+                lines.append(f'llm_tokens_total{{call_type="{call_type}",kind="completion"}} {s.completion_tokens}')
+
+            name = 'llm_request_duration_seconds'
+            lines += [f"# HELP {name} Latency of successful LLM call attempts", f"# TYPE {name} histogram"]
+            for call_type, s in stats:
+                for bound, count in s.latency.cumulative():
+                    le = "+Inf" if bound == math.inf else f"{bound:g}"
+                    lines.append(f'{name}_bucket{{call_type="{call_type}",le="{le}"}} {count}')
+                lines.append(f'{name}_sum{{call_type="{call_type}"}} {s.latency.sum}')
+                lines.append(f'{name}_count{{call_type="{call_type}"}} {s.latency.count}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        with open(path, 'w') as f:
+            f.write(self.prometheus())
+
+    def _stats(self, call_type: str) -> CallStats:
+        if call_type not in self.stats:
+            self.stats[call_type] = CallStats()
+        return self.stats[call_type]
+
+    def _attempted(self, call_type: str, attempt: int):
+        with self.lock:
+            stats = self._stats(call_type)
+            if attempt == 1:
+                stats.calls += 1
+            else:
+                stats.retries += 1
+
+    def _errored(self, call_type: str):
+        with self.lock:
+            self._stats(call_type).errors += 1
+
+    def _succeeded(self, call_type: str, model: str, seconds: float, response):
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        with self.lock:
+            stats = self._stats(call_type)
+            stats.latency.observe(seconds)
+            if isinstance(prompt_tokens, int) and isinstance(completion_tokens, int):
+                stats.prompt_tokens += prompt_tokens
+                stats.completion_tokens += completion_tokens
+                stats.cost += call_cost(model, prompt_tokens, completion_tokens)
@@ -0,0 +1,179 @@
+import operator
+import numpy as np
+import pandas as pd
+from typing import Any, Iterable, Set
+
+
+class Predicate:
+    """Declarative row filter that evaluates to a boolean mask over a whole chunk."""
+
+    def columns(self) -> Set[str]:
+        """Names of the columns the predicate needs to read."""
+        raise NotImplementedError
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        """Boolean array with one entry per row of df."""
+        raise NotImplementedError
+
+    def __and__(self, other: "Predicate") -> "Predicate":
+        return And(self, other)
+
+    def __or__(self, other: "Predicate") -> "Predicate":
+        return Or(self, other)
+
+    def __invert__(self) -> "Predicate":
+        return Not(self)
+
+
+class Compare(Predicate):
+    OPERATORS = {
+        '==': operator.eq,
+        '!=': operator.ne,
+        '<': operator.lt,
+        '<=': operator.le,
+        '>': operator.gt,
+        '>=': operator.ge,
+    }
+
+    def __init__(self, column: str, op: str, value: Any):
+        if op not in self.OPERATORS:
+            raise ValueError(f"Unsupported comparison operator: {op}")
+        self.column = column
+        self.op = op
+        self.value = value
+
+    def columns(self) -> Set[str]:
+        return {self.column}
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        values = _comparable(df[self.column], self.value)
+        return self.OPERATORS[self.op](values, self.value).to_numpy(dtype=bool, na_value=False)
+
+    def __repr__(self):
+        return f"Compare({self.column!r} {self.op} {self.value!r})"
+
+
+class IsIn(Predicate):
+    def __init__(self, column: str, values: Iterable[Any]):
+        self.column = column
+        self.values = list(values)
+
+    def columns(self) -> Set[str]:
+        return {self.column}
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        return df[self.column].isin(self.values).to_numpy(dtype=bool)
+
+    def __repr__(self):
+        return f"IsIn({self.column!r}, {self.values!r})"
+
+
+class Between(Predicate):
+    def __init__(self, column: str, low: Any, high: Any, inclusive: str = 'both'):
+        self.column = column
+        self.low = low
+        self.high = high
+        self.inclusive = inclusive
+
+    def columns(self) -> Set[str]:
+        return {self.column}
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        values = _comparable(df[self.column], self.low)
+        return values.between(self.low, self.high, inclusive=self.inclusive).to_numpy(dtype=bool, na_value=False)
+
+    def __repr__(self):
+        return f"Between({self.column!r}, {self.low!r}, {self.high!r}, inclusive={self.inclusive!r})"
+
+
+class And(Predicate):
+    def __init__(self, *predicates: Predicate):
+        self.predicates = predicates
+
+    def columns(self) -> Set[str]:
+        return set().union(*(p.columns() for p in self.predicates))
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        result = np.ones(len(df), dtype=bool)
+        for predicate in self.predicates:
+            result &= predicate.mask(df)
+        return result
+
+    def __repr__(self):
+        return f"And{self.predicates!r}"
+
+
+class Or(Predicate):
+    def __init__(self, *predicates: Predicate):
+        self.predicates = predicates
+
+    def columns(self) -> Set[str]:
+        return set().union(*(p.columns() for p in self.predicates))
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        result = np.zeros(len(df), dtype=bool)
+        for predicate in self.predicates:
+            result |= predicate.mask(df)
+        return result
+
+    def __repr__(self):
+        return f"Or{self.predicates!r}"
+
+
+class Not(Predicate):
+    def __init__(self, predicate: Predicate):
+        self.predicate = predicate
+
+    def columns(self) -> Set[str]:
+        return self.predicate.columns()
+
+    def mask(self, df: pd.DataFrame) -> np.ndarray:
+        return ~self.predicate.mask(df)
+
+    def __repr__(self):
+        return f"Not({self.predicate!r})"
+
+
+class Column:
+    """Builder for predicates on one column, e.g. ``col('numVotes') > 10000``."""
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __eq__(self, value) -> Predicate:
+        return Compare(self.name, '==', value)
+
+    def __ne__(self, value) -> Predicate:
+        return Compare(self.name, '!=', value)
+
+    def __lt__(self, value) -> Predicate:
+        return Compare(self.name, '<', value)
+
+    def __le__(self, value) -> Predicate:
+        return Compare(self.name, '<=', value)
+
+    def __gt__(self, value) -> Predicate:
+        return Compare(self.name, '>', value)
+
+    def __ge__(self, value) -> Predicate:
+        return Compare(self.name, '>=', value)
+
+    def isin(self, values: Iterable[Any]) -> Predicate:
+        return IsIn(self.name, values)
+
+    def between(self, low: Any, high: Any, inclusive: str = 'both') -> Predicate:
+        return Between(self.name, low, high, inclusive)
+
+    __hash__ = None
+
+
+def col(name: str) -> Column:
+    return Column(name)
+
+
+def _comparable(values: pd.Series, value: Any) -> pd.Series:
+    """Coerce text columns to numbers when compared against a number; unparseable cells become NaN."""
+    is_number = isinstance(value, (int, float, np.number)) and not isinstance(value, bool)
+    if is_number and not pd.api.types.is_numeric_dtype(values):
+        return pd.to_numeric(values, errors='coerce')
+    return values
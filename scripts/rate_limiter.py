@@ -0,0 +1,230 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import openai
+
+logger = logging.getLogger(__name__)
+
+# Rough size of a chat answer, added to the prompt estimate before the usage is known
+DEFAULT_COMPLETION_TOKENS = 64
+# Shortest pause between two concurrency cuts, so one burst of 429s only halves the limit once
+DECREASE_COOLDOWN = 1.0
+# How often a caller waiting for a free slot checks again
+SLOT_POLL_INTERVAL = 0.01
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError)
+
+
+def estimate_tokens(messages: List[Dict], completion_tokens: int = DEFAULT_COMPLETION_TOKENS) -> int:
+    """Tokens a request will use: about four characters per prompt token plus the expected answer."""
+    return sum(len(message.get("content") or "") for message in messages) // 4 + completion_tokens
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds the API asked us to wait in the retry-after(-ms) header, if any."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if headers.get("retry-after-ms") is not None:
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after") is not None:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None
+    return None
+
+
+class TokenBucket:
+    """Allows capacity units per minute, refilled continuously and at most capacity at a time."""
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.rate = capacity / 60.0
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount units are available; 0 means they were taken."""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # A request larger than the whole bucket still goes through once the bucket is full
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def refund(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def charge(self, amount: float):
+        """Take amount units that were already used; the bucket may go into debt."""
+        self.tokens -= amount
+
+
+class RateLimiter:
+    """
+    Paces OpenAI calls to stay within the account's request and token limits.
+
+    Every call takes one request from the RPM bucket and its estimated tokens from the TPM
+    bucket before it is sent, and the estimate is corrected with the reported usage afterwards.
+    Concurrency follows AIMD: each success raises the limit by about one request per round
+    trip, each rate-limit response halves it. 429s, connection errors and 5xx responses are
+    retried with jittered exponential backoff, waiting at least as long as retry-after asks;
+    other errors are raised straight away.
+
+    Thread and asyncio callers can share one limiter through call() and call_async().
+    """
+
+    def __init__(self, rpm: int = 500, tpm: int = 200_000, max_concurrency: int = 256,
+                 min_concurrency: int = 1, max_retries: int = 8, backoff_seconds: float = 1.0,
+                 max_backoff_seconds: float = 60.0):
+        """
+        Args:
+            rpm: Requests per minute allowed
+            tpm: Tokens per minute allowed
+            max_concurrency: Upper bound and starting point of the adaptive concurrency limit
+            min_concurrency: Lower bound of the adaptive concurrency limit
+            max_retries: Attempts per call before a retryable error is raised; at least 1
+            backoff_seconds: Base delay before a retry; doubles with every attempt
+            max_backoff_seconds: Upper bound for the delay between attempts
+        """
+        if max_retries < 1:
+            raise ValueError(f"max_retries must be at least 1, got {max_retries}")
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.concurrency = float(max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.stats = {'calls': 0, 'retries': 0, 'rate_limited': 0, 'failed': 0}
+
+    def call(self, request: Callable, messages: List[Dict],
+             completion_tokens: int = DEFAULT_COMPLETION_TOKENS):
+        """Run request() within the limits, retrying transient failures; returns its result."""
+        estimate = estimate_tokens(messages, completion_tokens)
+        for attempt in range(1, self.max_retries + 1):
+            while True:
+                delay = self._admit(estimate)
+                if delay == 0:
+                    break
+                time.sleep(delay)
+            try:
+                response = request()
+            except Exception as e:
+                time.sleep(self._failed(e, attempt))
+                continue
+            except BaseException:
+                # KeyboardInterrupt and friends: give the slot back before propagating
+                self._release()
+                raise
+            self._succeeded(response, estimate)
+            return response
+
+    async def call_async(self, request: Callable, messages: List[Dict],
+                         completion_tokens: int = DEFAULT_COMPLETION_TOKENS):
+        """call() for coroutine functions: awaits request() and sleeps without blocking the loop."""
+        estimate = estimate_tokens(messages, completion_tokens)
+        for attempt in range(1, self.max_retries + 1):
+            while True:
+                delay = self._admit(estimate)
+                if delay == 0:
+                    break
+                await asyncio.sleep(delay)
+            try:
+                response = await request()
+            except Exception as e:
+                await asyncio.sleep(self._failed(e, attempt))
+                continue
+            except BaseException:
+                # Cancellation: give the slot back before propagating
+                self._release()
+                raise
+            self._succeeded(response, estimate)
+            return response
+
+    def _admit(self, estimate: int) -> float:
+        """Take a slot and the budget for one request, or return how long to wait before trying again."""
+        with self.lock:
+            now = time.monotonic()
+            if now < self.paused_until:
+                return self.paused_until - now
+            if self.in_flight >= int(self.concurrency):
+                return SLOT_POLL_INTERVAL
+            delay = self.requests.wait_time(1, now)
+            if delay:
+                return delay
+            delay = self.tokens.wait_time(estimate, now)
+            if delay:
+                self.requests.refund(1)
+                return delay
+            self.in_flight += 1
+            self.stats['calls'] += 1
+            return 0.0
+
+    def _release(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def _succeeded(self, response, estimate: int):
+        usage = getattr(response, "usage", None)
+        with self.lock:
+            self.in_flight -= 1
+            if self.concurrency < self.max_concurrency:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+            total = getattr(usage, "total_tokens", None)
+            if isinstance(total, int):
+                # Settle the estimate against what the call really used
+                if total < estimate:
+                    self.tokens.refund(estimate - total)
+                elif total > estimate:
+                    self.tokens.charge(total - estimate)
+
+    def _failed(self, error: Exception, attempt: int) -> float:
+        """Record a failed attempt and return the delay before the next one; raises if it is final."""
+        retryable = isinstance(error, RETRYABLE_ERRORS)
+        delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+        with self.lock:
+            self.in_flight -= 1
+            if isinstance(error, openai.RateLimitError):
+                self.stats['rate_limited'] += 1
+                delay = max(delay, retry_after(error) or 0.0)
+                now = time.monotonic()
+                # Everyone waits out the retry-after, not just the call that was told to
+                self.paused_until = max(self.paused_until, now + delay)
+                if now - self.last_decrease > DECREASE_COOLDOWN:
+                    self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+                    self.last_decrease = now
+            if not retryable or attempt == self.max_retries:
+                self.stats['failed'] += 1
+                raise error
+            self.stats['retries'] += 1
+        logger.info(f"OpenAI call failed (attempt {attempt}/{self.max_retries}), retrying in {delay:.1f}s: {error}")
+        return delay
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter() -> RateLimiter:
+    """Process-wide limiter for the account, sized by OPENAI_RPM_LIMIT and OPENAI_TPM_LIMIT."""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter(rpm=int(os.getenv("OPENAI_RPM_LIMIT", "500")),
+                                          tpm=int(os.getenv("OPENAI_TPM_LIMIT", "200000")))
+        return _shared_limiter
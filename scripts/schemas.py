@@ -0,0 +1,137 @@
+import csv
+import os
+import pyarrow as pa
+from typing import Dict, Iterable, Optional
+from urllib.parse import urlparse
+
+# IMDB marks missing values with a literal \N
+NULL_SENTINEL = '\\N'
+
+ARROW_TYPES = {
+    'string': pa.string(),
+    'category': pa.dictionary(pa.int32(), pa.string()),
+    'Int8': pa.int8(),
+    'Int16': pa.int16(),
+    'Int32': pa.int32(),
+    'float32': pa.float32(),
+    'float64': pa.float64(),
+}
+
+
+class TableSchema:
+    """Column dtypes and null handling for one dataset, shared by every reader of that dataset."""
+
+    def __init__(self, name: str, dtypes: Dict[str, str], null_values: Iterable[str] = (NULL_SENTINEL, ''),
+                 quoted: bool = False):
+        """
+        Args:
+            name: Dataset name, e.g. 'title.basics'
+            dtypes: pandas dtype per column; low-cardinality text is 'category', text is
+                'string' and integers use nullable extension types such as 'Int16'
+            null_values: Cell values to read as missing
+            quoted: Whether fields may be quoted; IMDB TSVs never are
+        """
+        self.name = name
+        self.dtypes = dtypes
+        self.null_values = list(null_values)
+        self.quoted = quoted
+
+    def pandas_dtypes(self, columns: Optional[Iterable[str]] = None) -> Dict[str, str]:
+        columns = self.dtypes if columns is None else columns
+        return {column: _pandas_dtype(self.dtypes[column]) for column in columns if column in self.dtypes}
+
+    def read_csv_options(self, columns: Optional[Iterable[str]] = None) -> dict:
+        """Keyword arguments for pd.read_csv that apply this schema."""
+        return {
+            'dtype': self.pandas_dtypes(columns),
+            'na_values': self.null_values,
+            # Keep titles such as "NA" or "None" as text; only the declared sentinels are null
+            'keep_default_na': False,
+            'quoting': csv.QUOTE_MINIMAL if self.quoted else csv.QUOTE_NONE,
+        }
+
+    def arrow_type(self, column: str) -> pa.DataType:
+        return arrow_type(column, self)
+
+
+def _pandas_dtype(dtype: str) -> str:
+    # Arrow-backed strings take a fraction of the memory of Python str objects
+    return 'string[pyarrow]' if dtype == 'string' else dtype
+
+
+SCHEMAS = {
+    schema.name: schema for schema in [
+        TableSchema('title.basics', {
+            'tconst': 'string',
+            'titleType': 'category',
+            'primaryTitle': 'string',
+            'originalTitle': 'string',
+            'isAdult': 'Int8',
+            'startYear': 'Int16',
+            'endYear': 'Int16',
+            'runtimeMinutes': 'Int32',
+            'genres': 'category',
+        }),
+        TableSchema('title.ratings', {
+            'tconst': 'string',
+            'averageRating': 'float32',
+            'numVotes': 'Int32',
+        }),
+        TableSchema('title.crew', {
+            'tconst': 'string',
+            'directors': 'string',
+            'writers': 'string',
+        }),
+        TableSchema('title.principals', {
+            'tconst': 'string',
+            'ordering': 'Int16',
+            'nconst': 'string',
+            'category': 'category',
+            'job': 'string',
+            'characters': 'string',
+        }),
+        # Output of spark/aggregate_datasets.py, read by the summarizer
+        TableSchema('top_rated_weighted', {
+            'tconst': 'string',
+            'titleType': 'category',
+            'primaryTitle': 'string',
+            'startYear': 'Int16',
+            'genres': 'category',
+            'averageRating': 'float32',
+            'numVotes': 'Int32',
+            'weightedRating': 'float64',
+        }, null_values=('',), quoted=True),
+        # Output of the summarizer, read by db_uploader
+        TableSchema('enhanced', {
+            'tconst': 'string',
+            'primaryTitle': 'string',
+            'startYear': 'Int16',
+            'weightedRating': 'float64',
+            'summary': 'string',
+        }, null_values=('',), quoted=True),
+    ]
+}
+
+# Every column name means the same thing in every IMDB table, so types can be looked up by name alone
+COLUMN_DTYPES = {column: dtype for schema in SCHEMAS.values() for column, dtype in schema.dtypes.items()}
+
+
+def get_schema(name: str) -> TableSchema:
+    if name not in SCHEMAS:
+        raise KeyError(f"No schema registered for dataset: {name}")
+    return SCHEMAS[name]
+
+
+def schema_for_url(url: str) -> Optional[TableSchema]:
+    """Schema of an IMDB dump such as https://datasets.imdbws.com/title.basics.tsv.gz, if known."""
+    name = os.path.basename(urlparse(url).path)
+    for suffix in ('.gz', '.tsv', '.csv'):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return SCHEMAS.get(name)
+
+
+def arrow_type(column: str, schema: Optional[TableSchema] = None) -> pa.DataType:
+    """Arrow type for column; columns without a registered dtype are plain strings."""
+    dtype = schema.dtypes.get(column) if schema is not None else None
+    return ARROW_TYPES.get(dtype or COLUMN_DTYPES.get(column, 'string'), pa.string())
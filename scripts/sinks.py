@@ -0,0 +1,150 @@
+import io
+import os
+from typing import BinaryIO, Dict, List, Optional
+from google.cloud import storage
+
+# Resumable uploads are sent in multiples of 256 KB
+GCS_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+CONTENT_TYPES = {
+    '.csv': 'text/csv',
+    '.parquet': 'application/vnd.apache.parquet',
+}
+
+
+def content_type_for(name: str) -> str:
+    return CONTENT_TYPES.get(os.path.splitext(name)[1], 'application/octet-stream')
+
+
+class LocalFileSink:
+    """Output destination on local disk."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def open(self) -> BinaryIO:
+        return open(self.path, 'wb')
+
+    def commit(self, handle: BinaryIO):
+        handle.close()
+
+    def abort(self, handle: BinaryIO):
+        handle.close()
+
+    def __repr__(self):
+        return self.path
+
+
+class GCSBlobSink:
+    """
+    Output destination in a GCS bucket, uploaded while it is being written.
+
+    Bytes go out as a resumable upload in chunk_size pieces; the object only appears in the
+    bucket once the output is committed, so a failed load never replaces a good object.
+    """
+
+    def __init__(self, bucket_name: str, blob_name: str, chunk_size: int = GCS_UPLOAD_CHUNK_SIZE,
+                 content_type: Optional[str] = None, content_encoding: Optional[str] = None,
+                 metadata: Optional[Dict[str, str]] = None, client: Optional[storage.Client] = None):
+        """
+        Args:
+            bucket_name: Name of the GCS bucket
+            blob_name: Object to write
+            chunk_size: Bytes buffered before each upload request
+            content_type: Object content type; derived from the blob name's extension when omitted
+            content_encoding: Content-Encoding of the written bytes, e.g. 'gzip'
+            metadata: Custom metadata to store on the object
+            client: Client to upload with; a new one is created when omitted
+        """
+        self.bucket_name = bucket_name
+        self.blob_name = blob_name
+        self.chunk_size = chunk_size
+        self.content_type = content_type or content_type_for(blob_name)
+        self.content_encoding = content_encoding
+        self.metadata = metadata
+        self.client = client
+
+    def open(self) -> BinaryIO:
+        blob = (self.client or storage.Client()).bucket(self.bucket_name).blob(self.blob_name)
+        blob.content_encoding = self.content_encoding
+        if self.metadata:
+            blob.metadata = self.metadata
+        return blob.open('wb', chunk_size=self.chunk_size, ignore_flush=True, content_type=self.content_type)
+
+    def commit(self, handle: BinaryIO):
+        # Closing the writer sends the last chunk and finalizes the object
+        handle.close()
+
+    def abort(self, handle: BinaryIO):
+        # Cancel the resumable session; a plain close() would finalize the partial object.
+        # Best effort: a failure here must not hide the error that made us abort.
+        try:
+            handle.terminate()
+        except Exception as e:
+            print(f"Could not cancel the upload to {self}: {e}")
+
+    def __repr__(self):
+        return f"gs://{self.bucket_name}/{self.blob_name}"
+
+
+class SinkStream(io.RawIOBase):
+    """Binary stream that writes every byte to all of its sinks."""
+
+    def __init__(self, sinks: List):
+        if not sinks:
+            raise ValueError("At least one output sink is required")
+        self.sinks = sinks
+        self.handles = []
+        self.bytes_written = 0
+        self.aborted = False
+        try:
+            for sink in sinks:
+                self.handles.append(sink.open())
+        except BaseException:
+            self.abort()
+            raise
+
+    def writable(self):
+        return True
+
+    def write(self, b) -> int:
+        if self.aborted:
+            return len(b)
+        for handle in self.handles:
+            handle.write(b)
+        n = len(b)
+        self.bytes_written += n
+        return n
+
+    def tell(self) -> int:
+        return self.bytes_written
+
+    def abort(self):
+        """Give up on the output: no sink commits what was written so far."""
+        if self.aborted or self.closed:
+            return
+        self.aborted = True
+        self._abort_handles(list(zip(self.sinks, self.handles)))
+
+    def close(self):
+        """Commit every sink; if one fails, the sinks not yet committed are aborted and the error raised."""
+        if self.closed:
+            return
+        pending = [] if self.aborted else list(zip(self.sinks, self.handles))
+        try:
+            while pending:
+                sink, handle = pending[0]
+                sink.commit(handle)
+                pending.pop(0)
+        finally:
+            self._abort_handles(pending)
+            super().close()
+
+    @staticmethod
+    def _abort_handles(pending: List):
+        # Every handle gets aborted even if another one fails to
+        for sink, handle in pending:
+            try:
+                sink.abort(handle)
+            except Exception as e:
+                print(f"Could not abort the output to {sink}: {e}")
@@ -1,8 +1,19 @@
 import pandas as pd
+import asyncio
+import json
 import logging
+import os
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from typing import List, Dict
-from openai import OpenAI
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+from openai import AsyncOpenAI, OpenAI
+from scripts.hedging import HedgePolicy
+from scripts.jsonl_writer import JsonlWriter
+from scripts.llm_metrics import LLMMetrics
+from scripts.rate_limiter import DEFAULT_COMPLETION_TOKENS, RateLimiter, shared_limiter
+from scripts.schemas import get_schema
+from scripts.summary_cache import SummaryCache, prompt_version
+from scripts.tags import TagNormalizer
 
 
 # Simple logging setup
@@ -53,73 +64,482 @@ Original input:
 Return only a single comma-separated line. No extra text.
 """
 
+BATCH_USER_PROMPT = """Summarise each movie below using only the dictionary provided in the system prompt.
+For every movie choose between 5 and 10 words from the dictionary.
+Return only a JSON object that maps each movie id to a single comma-separated line of words. No extra text.
+
+{movies}"""
+
+PROMPT_VERSION = prompt_version(SYSTEM_MSG, USER_PROMPT, REFINEMENT_SYSTEM_PROMPT, REFINEMENT_USER_PROMPT,
+                                BATCH_USER_PROMPT)
+
+# Rows read from the input CSV at a time by summarize_dataset
+READ_CHUNK_ROWS = 1000
+
+
+class SummarizationError(RuntimeError):
+    """Raised when some movies are still without a summary after every retry and re-queue pass."""
+
+
+def summary_messages(movie: Dict) -> List[Dict]:
+    return [
+        {"role": "system", "content": SYSTEM_MSG},
+        {"role": "user", "content": USER_PROMPT.format(
+            title=movie['primaryTitle'], 
+            year=movie['startYear']
+        )}
+    ]
+
+
+def refinement_messages(summary: str) -> List[Dict]:
+    return [
+        {"role": "system", "content": REFINEMENT_SYSTEM_PROMPT},
+        {"role": "user", "content": REFINEMENT_USER_PROMPT.format(input=summary)}
+    ]
+
+
+def batch_messages(batch: List[Tuple[int, Dict]]) -> List[Dict]:
+    movies = "\n".join(f'{i}: "{movie["primaryTitle"]}" ({movie["startYear"]})' for i, movie in batch)
+    return [
+        {"role": "system", "content": SYSTEM_MSG},
+        {"role": "user", "content": BATCH_USER_PROMPT.format(movies=movies)}
+    ]
+
+
+def read_rows(data_path: str, chunk_rows: int = READ_CHUNK_ROWS) -> Iterator[Dict]:
+    """Rows of a top_rated_weighted CSV as dicts, read chunk_rows at a time"""
+    options = get_schema('top_rated_weighted').read_csv_options()
+    with pd.read_csv(data_path, chunksize=chunk_rows, **options) as reader:
+        for chunk in reader:
+            yield from chunk.to_dict('records')
+
+
+async def gather_cancellable(coroutines: List) -> List:
+    """asyncio.gather that cancels and awaits every task when it is cancelled itself"""
+    tasks = [asyncio.create_task(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
 
 class MovieSummarizer:
-    def __init__(self, model: str = 'gpt-4.1-nano', max_workers: int = 5):
+    def __init__(self, model: str = 'gpt-4.1-nano', max_workers: int = 5, concurrency: int = 100,
+                 cache_path: Optional[str] = None, batch_size: int = 1, batch_attempts: int = 2,
+                 limiter: Optional[RateLimiter] = None, requeue_attempts: int = 1,
+                 hedging: Optional[HedgePolicy] = None, metrics: Optional[LLMMetrics] = None):
+        """
+        Args:
+            model: Chat model used for both the summary and the refinement call
+            max_workers: Threads used by summarize_in_parallel
+            concurrency: Requests in flight at once on the async engine (summarize_async)
+            cache_path: SQLite file of finished summaries. Movies found there are not sent to
+                the API again and every new summary is saved as soon as it arrives
+            batch_size: Movies per request on the async engine. Above 1, movies are sent in
+                batches with JSON answers keyed by id, sharing one system prompt per request
+            batch_attempts: Batch rounds; each round re-sends only the movies whose answer was
+                missing or invalid. Movies still failing go through the single-movie path
+            limiter: Rate limiter every API call goes through; the process-wide shared_limiter()
+                when omitted. It retries rate limits and transient errors itself, so the OpenAI
+                clients are created with their own retries turned off
+            requeue_attempts: Extra passes over the movies whose calls still failed after the
+                limiter's retries. Movies failing all of them raise SummarizationError instead
+                of leaving a placeholder in the output; finished summaries stay in the cache
+            hedging: Hedge policy for single-movie and refinement calls. A call still running
+                after the policy's latency quantile is sent again, possibly to a cheaper model,
+                and the first answer that normalizes to valid tags is kept. Off when omitted
+            metrics: Latency, token, cost, retry and failure accounting of every API call, by
+                call type (summary, refinement, batch); a fresh LLMMetrics when omitted
+        """
         self.model = model
         self.max_workers = max_workers
-        self.client = OpenAI()
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.batch_attempts = batch_attempts
+        self.cache = SummaryCache(cache_path, model, PROMPT_VERSION) if cache_path else None
+        self.cache_hits = 0
+        self.normalizer = TagNormalizer()
+        self.refinement_calls = 0
+        self.requeue_attempts = requeue_attempts
+        self.limiter = limiter or shared_limiter()
+        self.hedging = hedging
+        self.metrics = metrics or LLMMetrics()
+        self.client = OpenAI(max_retries=0)
+        # Bound to the running event loop, so created per summarize_async call
+        self.async_client = None
     
     def _summarize_single_movie(self, movie: Dict) -> str:
-        """Summarize a single movie"""
+        """Summarize a single movie; API errors the limiter could not retry away are raised"""
+        return self._answer(movie)[0]
+    
+    def _answer(self, movie: Dict) -> Tuple[str, str]:
+        """The summary of a movie and the model it came from, which differs from self.model when a hedge won"""
+        answer, model = self._complete(summary_messages(movie), 'summary')
+        summary = self._normalized(answer)
+        if summary is not None:
+            return summary, model
+        
+        self.refinement_calls += 1
+        refined, refined_model = self._complete(refinement_messages(answer), 'refinement')
+        return self._normalized(refined) or refined, model if model != self.model else refined_model
+    
+    def _complete(self, messages: List[Dict], call_type: str) -> Tuple[str, str]:
+        """Answer to one chat call and the model that gave it, through the limiter and metrics, hedged when a policy is set"""
+        def request(model: str):
+            return model, self.limiter.call(self.metrics.track(
+                call_type, model, lambda: self.client.chat.completions.create(model=model, messages=messages)),
+                messages)
+        
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": SYSTEM_MSG},
-                    {"role": "user", "content": USER_PROMPT.format(
-                        title=movie['primaryTitle'], 
-                        year=movie['startYear']
-                    )}
-                ]
-            )
-            refined_response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": REFINEMENT_SYSTEM_PROMPT},
-                    {"role": "user", "content": REFINEMENT_USER_PROMPT.format(input=response.choices[0].message.content)}
-                ]
-            )
-            return refined_response.choices[0].message.content
+            if self.hedging is None:
+                model, response = request(self.model)
+            else:
+                model, response = self.hedging.call(request, self.model, valid=self._valid_response)
+        except Exception:
+            self.metrics.failed(call_type)
+            raise
+        return response.choices[0].message.content, model
+    
+    def _valid_response(self, answer: Tuple[str, object]) -> bool:
+        _, response = answer
+        return self._normalized(response.choices[0].message.content) is not None
+    
+    def _normalized(self, answer: str) -> Optional[str]:
+        """The answer as 5-10 dictionary tags, or None when it needs the refinement call"""
+        tags = self.normalizer.normalize(answer)
+        return ", ".join(tags) if self.normalizer.is_valid(tags) else None
+    
+    def _cached(self, movie: Dict) -> Optional[str]:
+        if self.cache is None:
+            return None
+        summary = self.cache.get(movie)
+        if summary is not None:
+            self.cache_hits += 1
+        return summary
+    
+    def _remember(self, movie: Dict, summary: str, model: Optional[str] = None):
+        """Cache a summary under the model that produced it; answers that are not valid tags are not kept"""
+        if self.cache is not None and self._normalized(summary) is not None:
+            self.cache.put(movie, summary, model)
+    
+    def _summarize_with_cache(self, movie: Dict) -> str:
+        summary = self._cached(movie)
+        if summary is None:
+            summary, model = self._answer(movie)
+            self._remember(movie, summary, model)
+        return summary
+    
+    async def _summarize_single_movie_async(self, movie: Dict) -> str:
+        """Summarize a single movie on the async client; API errors are raised like in the thread engine"""
+        return (await self._answer_async(movie))[0]
+    
+    async def _answer_async(self, movie: Dict) -> Tuple[str, str]:
+        """_answer on the async client"""
+        answer, model = await self._complete_async(summary_messages(movie), 'summary')
+        summary = self._normalized(answer)
+        if summary is not None:
+            return summary, model
+        
+        self.refinement_calls += 1
+        refined, refined_model = await self._complete_async(refinement_messages(answer), 'refinement')
+        return self._normalized(refined) or refined, model if model != self.model else refined_model
+    
+    async def _complete_async(self, messages: List[Dict], call_type: str) -> Tuple[str, str]:
+        """_complete on the async client"""
+        async def request(model: str):
+            return model, await self.limiter.call_async(self.metrics.track_async(
+                call_type, model, lambda: self.async_client.chat.completions.create(model=model, messages=messages)),
+                messages)
+        
+        try:
+            if self.hedging is None:
+                model, response = await request(self.model)
+            else:
+                model, response = await self.hedging.call_async(request, self.model, valid=self._valid_response)
+        except Exception:
+            self.metrics.failed(call_type)
+            raise
+        return response.choices[0].message.content, model
+    
+    async def _summarize_batch_async(self, batch: List[Tuple[int, Dict]]) -> Dict[int, str]:
+        """Valid summaries from one multi-movie request, by movie index; failed entries are left out"""
+        messages = batch_messages(batch)
+        try:
+            response = await self.limiter.call_async(self.metrics.track_async(
+                'batch', self.model, lambda: self.async_client.chat.completions.create(
+                    model=self.model, messages=messages, response_format={"type": "json_object"})),
+                messages, completion_tokens=DEFAULT_COMPLETION_TOKENS * len(batch))
+        except Exception as e:
+            self.metrics.failed('batch')
+            logger.warning(f"Failed to summarize a batch of {len(batch)} movies: {e}")
+            return {}
+        try:
+            answers = json.loads(response.choices[0].message.content)
         except Exception as e:
-            logger.warning(f"Failed to summarize {movie['primaryTitle']}: {e}")
-            return "Summary unavailable"
+            logger.warning(f"Failed to summarize a batch of {len(batch)} movies: {e}")
+            return {}
+        if not isinstance(answers, dict):
+            logger.warning(f"Batch answer is not a JSON object: {answers!r}")
+            return {}
+        
+        summaries = {}
+        for i, _ in batch:
+            answer = answers.get(str(i))
+            if isinstance(answer, list):
+                answer = ", ".join(map(str, answer))
+            summary = self._normalized(answer) if isinstance(answer, str) else None
+            if summary is not None:
+                summaries[i] = summary
+        return summaries
+    
+    async def summarize_async(self, movies: List[Dict]) -> List[str]:
+        """Summarize movies with up to self.concurrency requests in flight; results keep the input order"""
+        logger.info(f"Processing {len(movies)} movies with up to {self.concurrency} concurrent requests")
+        
+        semaphore = asyncio.Semaphore(self.concurrency)
+        summaries = [self._cached(movie) for movie in movies]
+        pending = [i for i, summary in enumerate(summaries) if summary is None]
+        completed = len(movies) - len(pending)
+        
+        def record(i: int, summary: str, model: Optional[str] = None):
+            nonlocal completed
+            summaries[i] = summary
+            self._remember(movies[i], summary, model)
+            completed += 1
+            if completed % 10 == 0 or completed == len(movies):
+                logger.info(f"Completed {completed}/{len(movies)} movies")
+        
+        failures = {}
+        
+        async def summarize(i: int):
+            async with semaphore:
+                try:
+                    summary, model = await self._answer_async(movies[i])
+                except Exception as e:
+                    failures[i] = e
+                    return
+            failures.pop(i, None)
+            record(i, summary, model)
+        
+        async def summarize_batch(batch: List[int]):
+            async with semaphore:
+                results = await self._summarize_batch_async([(i, movies[i]) for i in batch])
+            for i, summary in results.items():
+                record(i, summary)
+        
+        async with AsyncOpenAI(max_retries=0) as self.async_client:
+            try:
+                if self.batch_size > 1:
+                    for attempt in range(1, self.batch_attempts + 1):
+                        if not pending:
+                            break
+                        batches = [pending[j:j + self.batch_size] for j in range(0, len(pending), self.batch_size)]
+                        await gather_cancellable([summarize_batch(batch) for batch in batches])
+                        pending = [i for i in pending if summaries[i] is None]
+                        if pending:
+                            logger.info(f"{len(pending)} movies without a valid answer after batch round {attempt}")
+                await gather_cancellable([summarize(i) for i in pending])
+                for attempt in range(1, self.requeue_attempts + 1):
+                    if not failures:
+                        break
+                    logger.warning(f"Re-queueing {len(failures)} failed movies (pass {attempt}/{self.requeue_attempts})")
+                    await asyncio.sleep(self.limiter.backoff_seconds * 2 ** attempt)
+                    await gather_cancellable([summarize(i) for i in sorted(failures)])
+            except asyncio.CancelledError:
+                logger.warning(f"Cancelled after {completed}/{len(movies)} movies")
+                raise
+            finally:
+                self.async_client = None
+        self._raise_failures(movies, failures)
+        return summaries
+    
+    def summarize_concurrently(self, movies: List[Dict]) -> List[str]:
+        """Run summarize_async to completion; Ctrl-C cancels every outstanding request"""
+        return asyncio.run(self.summarize_async(movies))
     
     def summarize_in_parallel(self, movies: List[Dict]) -> List[str]:
         """Summarize movies using concurrent requests"""
         logger.info(f"Processing {len(movies)} movies with {self.max_workers} workers")
         
         summaries = [None] * len(movies)
+        failures = {}
+        pending = list(range(len(movies)))
+        completed = 0
         
         with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
-            future_to_index = {
-                executor.submit(self._summarize_single_movie, movie): i 
-                for i, movie in enumerate(movies)
-            }
-            
-            for completed, future in enumerate(as_completed(future_to_index), 1):
-                index = future_to_index[future]
-                summaries[index] = future.result()
-                if completed % 10 == 0 or completed == len(movies):
-                    logger.info(f"Completed {completed}/{len(movies)} movies")
+            for attempt in range(self.requeue_attempts + 1):
+                if attempt:
+                    logger.warning(f"Re-queueing {len(pending)} failed movies (pass {attempt}/{self.requeue_attempts})")
+                    time.sleep(self.limiter.backoff_seconds * 2 ** attempt)
+                future_to_index = {
+                    executor.submit(self._summarize_with_cache, movies[i]): i
+                    for i in pending
+                }
+                
+                for future in as_completed(future_to_index):
+                    index = future_to_index[future]
+                    try:
+                        summaries[index] = future.result()
+                    except Exception as e:
+                        failures[index] = e
+                        continue
+                    failures.pop(index, None)
+                    completed += 1
+                    if completed % 10 == 0 or completed == len(movies):
+                        logger.info(f"Completed {completed}/{len(movies)} movies")
+                
+                pending = sorted(failures)
+                if not pending:
+                    break
         
+        self._raise_failures(movies, failures)
         return summaries
     
-    def summarize_dataset(self, data_path: str, output_path: str = './data/processed/enhanced.json'):
-        """Process entire dataset"""
-        logger.info(f"Loading dataset from {data_path}")
+    @staticmethod
+    def _raise_failures(movies: List[Dict], failures: Dict[int, Exception], total: Optional[int] = None):
+        if not failures:
+            return
+        for i, error in sorted(failures.items()):
+            logger.error(f"Failed to summarize {movies[i]['primaryTitle']}: {error}")
+        first = min(failures)
+        raise SummarizationError(
+            f"{len(failures)}/{total or len(movies)} movies could not be summarized, "
+            f"e.g. {movies[first]['primaryTitle']}: {failures[first]}") from failures[first]
+    
+    async def summarize_stream_async(self, rows: Iterable[Dict], writer: JsonlWriter) -> int:
+        """
+        Summarize rows as they are read and write each one with its summary as soon as it is done.
+        
+        Rows are pulled from the iterator only when one of the self.concurrency request slots is
+        free, so memory stays flat however long the input is. Lines are written in completion
+        order, not input order. Movies whose calls failed are re-queued at the end like in
+        summarize_async and raise SummarizationError if they fail every pass; everything else is
+        already in the output by then. Returns the number of rows read.
+        """
+        failures = []
+        seen = 0
+        
+        def write(movie: Dict, summary: str, model: Optional[str] = None):
+            self._remember(movie, summary, model)
+            writer.write({**movie, 'summary': summary})
+            if writer.lines % 100 == 0:
+                logger.info(f"Wrote {writer.lines} movies to {writer.path}")
         
-        df = pd.read_csv(data_path)
+        async def summarize(group: List[Dict]):
+            pending = list(enumerate(group))
+            if len(group) > 1:
+                for _ in range(self.batch_attempts):
+                    results = await self._summarize_batch_async(pending)
+                    for i, summary in results.items():
+                        write(group[i], summary)
+                    pending = [(i, movie) for i, movie in pending if i not in results]
+                    if not pending:
+                        break
+            for _, movie in pending:
+                try:
+                    summary, model = await self._answer_async(movie)
+                except Exception as e:
+                    failures.append((movie, e))
+                    continue
+                write(movie, summary, model)
         
-        df['summary'] = self.summarize_in_parallel(df.to_dict('records'))
-        df.to_json(output_path, orient='records', lines=True)
+        def groups() -> Iterator[List[Dict]]:
+            nonlocal seen
+            group = []
+            for row in rows:
+                seen += 1
+                summary = self._cached(row)
+                if summary is not None:
+                    writer.write({**row, 'summary': summary})
+                    continue
+                group.append(row)
+                if len(group) == self.batch_size:
+                    yield group
+                    group = []
+            if group:
+                yield group
+        
+        async def run(groups: Iterable[List[Dict]]):
+            tasks = set()
+            try:
+                for group in groups:
+                    if len(tasks) >= self.concurrency:
+                        done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                        for task in done:
+                            task.result()
+                    tasks.add(asyncio.create_task(summarize(group)))
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
+        
+        async with AsyncOpenAI(max_retries=0) as self.async_client:
+            try:
+                await run(groups())
+                for attempt in range(1, self.requeue_attempts + 1):
+                    if not failures:
+                        break
+                    logger.warning(f"Re-queueing {len(failures)} failed movies (pass {attempt}/{self.requeue_attempts})")
+                    await asyncio.sleep(self.limiter.backoff_seconds * 2 ** attempt)
+                    retry = [[movie] for movie, _ in failures]
+                    failures.clear()
+                    await run(retry)
+            except asyncio.CancelledError:
+                logger.warning(f"Cancelled after writing {writer.lines}/{seen} movies")
+                raise
+            finally:
+                self.async_client = None
+        self._raise_failures([movie for movie, _ in failures], dict(enumerate(error for _, error in failures)),
+                             total=seen)
+        return seen
+    
+    def summarize_dataset(self, data_path: str, output_path: str = './data/processed/enhanced.json',
+                          metrics_path: Optional[str] = None):
+        """
+        Stream the dataset through summarize_stream_async into a JSON Lines file
+        
+        Args:
+            data_path: top_rated_weighted CSV to summarize
+            output_path: JSON Lines output, one movie per line
+            metrics_path: JSON run report of the API calls; the same counts are written as
+                Prometheus text metrics next to it with a .prom extension. Written even when
+                the run fails
+        """
+        logger.info(f"Summarizing {data_path} into {output_path}")
+        
+        try:
+            with JsonlWriter(output_path) as writer:
+                total = asyncio.run(self.summarize_stream_async(read_rows(data_path), writer))
+        finally:
+            if metrics_path is not None:
+                self.metrics.write_report(metrics_path)
+                self.metrics.write_prometheus(os.path.splitext(metrics_path)[0] + '.prom')
+                logger.info(f"Saved API call metrics to {metrics_path}")
+        report = self.metrics.report()['total']
+        logger.info(f"{report['calls']} API calls, {report['retries']} retries, "
+                    f"{report['prompt_tokens']} prompt and {report['completion_tokens']} completion tokens, "
+                    f"about ${report['cost_usd']:.4f}")
+        if self.cache is not None:
+            logger.info(f"{self.cache_hits}/{total} summaries came from the cache at {self.cache.path}")
+        logger.info(f"{self.refinement_calls} movies needed the refinement call")
+        logger.info(f"Rate limiter: {self.limiter.stats}")
+        if self.hedging is not None:
+            logger.info(f"Hedging: {self.hedging.stats}")
         logger.info(f"Saved results to {output_path}")
 
 
-def summarize_dataset(data_path: str, output_path: str = './data/processed/enhanced.json'):
+def summarize_dataset(data_path: str, output_path: str = './data/processed/enhanced.json',
+                      concurrency: int = 100, cache_path: Optional[str] = None, batch_size: int = 1,
+                      hedging: Optional[HedgePolicy] = None, metrics_path: Optional[str] = None):
     """Legacy function"""
-    summarizer = MovieSummarizer()
-    summarizer.summarize_dataset(data_path, output_path)
+    summarizer = MovieSummarizer(concurrency=concurrency, cache_path=cache_path, batch_size=batch_size,
+                                 hedging=hedging)
+    summarizer.summarize_dataset(data_path, output_path, metrics_path=metrics_path)
 
 
 if __name__ == '__main__':
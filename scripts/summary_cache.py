@@ -0,0 +1,79 @@
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+
+def prompt_version(*prompts: str) -> str:
+    """Short hash identifying a set of prompts; editing any of them invalidates cached summaries."""
+    digest = hashlib.sha256()
+    for prompt in prompts:
+        digest.update(prompt.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def movie_key(movie: Dict) -> str:
+    """tconst when the row has one, otherwise title and year."""
+    tconst = movie.get('tconst')
+    if isinstance(tconst, str) and tconst:
+        return tconst
+    return f"{movie['primaryTitle']}|{movie['startYear']}"
+
+
+class SummaryCache:
+    """SQLite store of finished summaries keyed by movie, model and prompt version."""
+
+    def __init__(self, path: str, model: str, version: str):
+        """
+        Args:
+            path: SQLite database file; created on first use
+            model: Model the summaries come from
+            version: prompt_version() of the prompts that produced them
+        """
+        self.path = path
+        self.model = model
+        self.version = version
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        # WAL keeps every committed summary on disk even if the process is killed mid-run
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS summaries (
+                movie TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_version TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (movie, model, prompt_version)
+            )
+        """)
+        self.connection.commit()
+
+    def get(self, movie: Dict) -> Optional[str]:
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT summary FROM summaries WHERE movie = ? AND model = ? AND prompt_version = ?",
+                (movie_key(movie), self.model, self.version),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, movie: Dict, summary: str, model: Optional[str] = None):
+        """Store a summary under model, the cache's own model when omitted"""
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO summaries (movie, model, prompt_version, summary) VALUES (?, ?, ?, ?)",
+                (movie_key(movie), model or self.model, self.version, summary),
+            )
+            self.connection.commit()
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute(
+                "SELECT COUNT(*) FROM summaries WHERE model = ? AND prompt_version = ?",
+                (self.model, self.version),
+            ).fetchone()[0]
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,103 @@
+import re
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional
+
+from scripts.dictionary import DICTIONARY
+from scripts.mapper import semantic_mapping
+
+MIN_TAGS = 5
+MAX_TAGS = 10
+
+
+def canonical(tag: str) -> str:
+    """Lower-case, unquoted, hyphen-joined form of a tag, e.g. ' "Slow burn".' -> 'slow-burn'."""
+    tag = tag.strip().lower()
+    tag = re.sub(r"^\d+[.)]\s*", "", tag)
+    tag = tag.strip(" \t\"'`*[]().;:")
+    return re.sub(r"[\s_]+", "-", tag)
+
+
+def edit_distance(a: str, b: str) -> int:
+    """Levenshtein distance between a and b."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+class TagNormalizer:
+    """
+    Maps the tags of an LLM answer onto the dictionary without another LLM call.
+
+    Each tag is tried as a dictionary word, then as a known synonym from mapper.semantic_mapping,
+    then fuzzily: candidates sharing the most character n-grams are ranked by edit distance and
+    the closest is accepted if it is within max_distance_ratio of its length.
+    """
+
+    def __init__(self, dictionary: Iterable[str] = DICTIONARY, synonyms: Dict[str, str] = semantic_mapping,
+                 ngram: int = 3, max_distance_ratio: float = 0.25, candidates: int = 5):
+        """
+        Args:
+            dictionary: Valid tags
+            synonyms: Known out-of-dictionary words and the dictionary word each stands for
+            ngram: Length of the character n-grams in the fuzzy index
+            max_distance_ratio: Largest accepted edit distance as a share of the matched word's length
+            candidates: Number of best n-gram matches compared by edit distance
+        """
+        self.words = list(dict.fromkeys(dictionary))
+        word_set = set(self.words)
+        self.synonyms = {canonical(word): target for word, target in synonyms.items() if target in word_set}
+        self.ngram = ngram
+        self.max_distance_ratio = max_distance_ratio
+        self.candidates = candidates
+
+        # Every spelling we know, dictionary words and synonyms alike, with the tag it resolves to
+        self.targets = {word: word for word in self.words}
+        self.targets.update({word: target for word, target in self.synonyms.items() if word not in self.targets})
+        self.index = defaultdict(set)
+        for spelling in self.targets:
+            for gram in self._ngrams(spelling):
+                self.index[gram].add(spelling)
+
+    def normalize_tag(self, tag: str) -> Optional[str]:
+        """Dictionary word for tag, or None if nothing is close enough."""
+        key = canonical(tag)
+        if not key:
+            return None
+        if key in self.targets:
+            return self.targets[key]
+        return self._fuzzy(key)
+
+    def normalize(self, answer: str) -> List[str]:
+        """Distinct dictionary words for the tags of a comma-separated answer, in answer order."""
+        tags = []
+        for part in re.split(r"[,;\n]", answer or ""):
+            tag = self.normalize_tag(part)
+            if tag is not None and tag not in tags:
+                tags.append(tag)
+        return tags[:MAX_TAGS]
+
+    @staticmethod
+    def is_valid(tags: List[str]) -> bool:
+        return MIN_TAGS <= len(tags) <= MAX_TAGS
+
+    def _ngrams(self, word: str) -> List[str]:
+        padded = f"#{word}#"
+        return [padded[i:i + self.ngram] for i in range(max(1, len(padded) - self.ngram + 1))]
+
+    def _fuzzy(self, key: str) -> Optional[str]:
+        shared = Counter()
+        for gram in self._ngrams(key):
+            shared.update(self.index.get(gram, ()))
+        best, best_distance = None, None
+        for spelling, _ in shared.most_common(self.candidates):
+            distance = edit_distance(key, spelling)
+            if distance <= max(1, int(len(spelling) * self.max_distance_ratio)) and \
+                    (best_distance is None or distance < best_distance):
+                best, best_distance = spelling, distance
+        return self.targets[best] if best is not None else None
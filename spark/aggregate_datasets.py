@@ -1,3 +1,4 @@
+import os
 from pyspark.sql import SparkSession
 from pyspark.sql.functions import col, avg, expr
 
@@ -5,14 +6,21 @@ VOTES_THRESHOLD = 10000
 RATING_THRESHOLD = 7.0
 
 
+def read_dataset(spark, name):
+    """Read the typed Parquet output of the loader when present, falling back to CSV."""
+    if os.path.exists(f"{name}.parquet"):
+        return spark.read.parquet(f"{name}.parquet")
+    return spark.read.csv(f"{name}.csv", header=True, inferSchema=True)
+
+
 def aggregate_datasets():
     spark = SparkSession.builder \
     .appName("CSV Aggregator") \
     .getOrCreate()
 
-    crew = spark.read.csv("crew.csv", header=True, inferSchema=True)
-    titles = spark.read.csv("basic_titles.csv", header=True, inferSchema=True)
-    ratings = spark.read.csv("ratings.csv", header=True, inferSchema=True)
+    crew = read_dataset(spark, "crew")
+    titles = read_dataset(spark, "basic_titles")
+    ratings = read_dataset(spark, "ratings")
 
 
     titles = titles.filter(col("titleType") == "movie")
@@ -0,0 +1,127 @@
+"""
+In-memory stand-in for the parts of google.cloud.storage the uploader and loader use.
+"""
+import io
+import base64
+import hashlib
+import threading
+
+import google_crc32c
+from google.cloud.exceptions import GoogleCloudError
+
+
+class FakeBlob:
+    """In-memory stand-in for google.cloud.storage.Blob."""
+    
+    def __init__(self, bucket, name, attributes=None):
+        self.bucket = bucket
+        self.name = name
+        # Like Bucket.blob(), a new handle knows nothing about the stored object; get_blob() loads it
+        attributes = attributes or {}
+        self.content_encoding = attributes.get('content_encoding')
+        self.metadata = attributes.get('metadata')
+    
+    @property
+    def md5_hash(self):
+        # Like GCS, composite objects have no MD5
+        if self.name in self.bucket.composed:
+            return None
+        return base64.b64encode(hashlib.md5(self.bucket.objects[self.name]).digest()).decode()
+    
+    @property
+    def crc32c(self):
+        return base64.b64encode(google_crc32c.Checksum(self.bucket.objects[self.name]).digest()).decode()
+    
+    def upload_from_filename(self, filename, **kwargs):
+        with open(filename, 'rb') as f:
+            self.upload_from_file(f)
+    
+    def upload_from_file(self, file_obj, size=None, **kwargs):
+        self.bucket.client.record_call(self.name)
+        data = file_obj.read() if size is None else file_obj.read(size)
+        self.store(data, kwargs.get('content_type'))
+    
+    def store(self, data, content_type=None):
+        with self.bucket.client.lock:
+            self.bucket.objects[self.name] = data
+            self.bucket.attributes[self.name] = {
+                'content_type': content_type,
+                'content_encoding': self.content_encoding,
+                'metadata': self.metadata,
+            }
+            self.bucket.composed.discard(self.name)
+    
+    def compose(self, sources, **kwargs):
+        assert len(sources) <= 32
+        with self.bucket.client.lock:
+            self.bucket.client.composes.append(len(sources))
+            self.bucket.objects[self.name] = b"".join(self.bucket.objects[s.name] for s in sources)
+            self.bucket.composed.add(self.name)
+    
+    def open(self, mode='r', **kwargs):
+        assert mode == 'wb'
+        return FakeBlobWriter(self, kwargs.get('content_type'))
+    
+    def delete(self):
+        with self.bucket.client.lock:
+            self.bucket.objects.pop(self.name)
+            self.bucket.attributes.pop(self.name, None)
+
+
+class FakeBucket:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.objects = {}
+        self.attributes = {}
+        self.composed = set()
+    
+    def blob(self, name):
+        return FakeBlob(self, name)
+    
+    def get_blob(self, name):
+        return FakeBlob(self, name, self.attributes.get(name)) if name in self.objects else None
+
+
+class FakeGCSClient:
+    """
+    In-memory stand-in for google.cloud.storage.Client.
+    
+    failures maps a blob name suffix to how many uploads of it fail before one succeeds.
+    """
+    
+    def __init__(self, failures=None):
+        self.lock = threading.Lock()
+        self.failures = dict(failures or {})
+        self.calls = []
+        self.composes = []
+        self.buckets = {}
+    
+    def bucket(self, name):
+        return self.buckets.setdefault(name, FakeBucket(self, name))
+    
+    def record_call(self, name):
+        with self.lock:
+            self.calls.append(name)
+            for suffix, remaining in self.failures.items():
+                if name.endswith(suffix) and remaining > 0:
+                    self.failures[suffix] -= 1
+                    raise GoogleCloudError(f"503 transient failure uploading {name}")
+
+
+class FakeBlobWriter(io.BytesIO):
+    """Collects written bytes and stores them as the object only when closed, like BlobWriter."""
+    
+    def __init__(self, blob, content_type):
+        super().__init__()
+        self.blob = blob
+        self.content_type = content_type
+    
+    def close(self):
+        if not self.closed:
+            self.blob.bucket.client.record_call(self.blob.name)
+            self.blob.store(self.getvalue(), self.content_type)
+        super().close()
+    
+    def terminate(self):
+        super().close()
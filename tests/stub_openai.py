@@ -0,0 +1,196 @@
+"""
+Local stand-in for the OpenAI chat completions, files and batches endpoints.
+
+Point the OpenAI clients at it with OPENAI_BASE_URL=server.url.
+"""
+import json
+import threading
+import time
+from email import policy
+from email.parser import BytesParser
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubHTTPError(Exception):
+    """Raise from respond() to answer with status and headers, e.g. a 429 with retry-after."""
+
+    def __init__(self, status: int, message: str = "", headers: dict = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class StubOpenAIServer(ThreadingHTTPServer):
+    """
+    Answers chat completions after a configurable delay.
+
+    respond(body) returns the assistant message for a request body and latency(body) its delay
+    in seconds. By default the stub echoes the last user message back after latency seconds.
+
+    Batch jobs move from validating to in_progress on the first poll and complete once they
+    have been polled batch_polls times; their requests are answered with respond() then.
+    """
+
+    # Accept as many simultaneous connections as the tests open
+    request_queue_size = 256
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__(("127.0.0.1", 0), StubOpenAIHandler)
+        self.daemon_threads = True
+        self.lock = threading.Lock()
+        self.requests = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.latency = lambda body: latency
+        self.respond = lambda body: body["messages"][-1]["content"]
+        self.files = {}
+        self.batches = {}
+        self.batch_polls = 2
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+    def complete(self, body: dict) -> tuple:
+        """Status code, payload and extra headers of a chat completion for body"""
+        try:
+            content = self.respond(body)
+        except StubHTTPError as e:
+            return e.status, {"error": {"message": str(e), "type": "stub_error"}}, e.headers
+        except Exception as e:
+            return 500, {"error": {"message": str(e), "type": "server_error"}}, {}
+        prompt_tokens = sum(len(message["content"]) for message in body["messages"]) // 4
+        completion_tokens = len(content) // 4
+        return 200, {
+            "id": f"chatcmpl-{len(self.requests)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }, {}
+
+    def add_file(self, content: bytes, purpose: str) -> dict:
+        with self.lock:
+            file_id = f"file-{len(self.files) + 1}"
+            self.files[file_id] = content
+        return {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": f"{file_id}.jsonl", "purpose": purpose, "status": "processed"}
+
+    def add_batch(self, body: dict) -> dict:
+        with self.lock:
+            batch_id = f"batch_{len(self.batches) + 1}"
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": body["endpoint"],
+                "completion_window": body["completion_window"], "input_file_id": body["input_file_id"],
+                "created_at": int(time.time()), "status": "validating", "polls": 0,
+            }
+        return self.batch(batch_id, poll=False)
+
+    def batch(self, batch_id: str, poll: bool = True) -> dict:
+        """The batch as a client sees it; polling advances it towards completed"""
+        with self.lock:
+            batch = self.batches[batch_id]
+            if poll and batch["status"] in ("validating", "in_progress"):
+                batch["polls"] += 1
+                batch["status"] = "in_progress"
+                if batch["polls"] >= self.batch_polls:
+                    self._run_batch(batch)
+            return {key: value for key, value in batch.items() if key != "polls"}
+
+    def _run_batch(self, batch: dict):
+        output, errors = [], []
+        for line in self.files[batch["input_file_id"]].decode("utf-8").splitlines():
+            request = json.loads(line)
+            status, payload, _ = self.complete(request["body"])
+            result = {"id": f"batch_req_{len(output) + len(errors)}", "custom_id": request["custom_id"],
+                      "response": {"status_code": status, "body": payload}, "error": None}
+            (output if status == 200 else errors).append(json.dumps(result))
+        for key, lines in (("output_file_id", output), ("error_file_id", errors)):
+            if lines:
+                file_id = f"file-{len(self.files) + 1}"
+                self.files[file_id] = ("\n".join(lines) + "\n").encode("utf-8")
+                batch[key] = file_id
+        batch["status"] = "completed"
+        batch["request_counts"] = {"total": len(output) + len(errors), "completed": len(output),
+                                   "failed": len(errors)}
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        data = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path.endswith("/files"):
+            fields = self._form_fields(data)
+            self._send_json(200, server.add_file(fields["file"], fields["purpose"].decode("utf-8")))
+            return
+        body = json.loads(data)
+        if self.path.endswith("/batches"):
+            self._send_json(200, server.add_batch(body))
+            return
+
+        with server.lock:
+            server.requests.append(body)
+            server.in_flight += 1
+            server.peak_in_flight = max(server.peak_in_flight, server.in_flight)
+        try:
+            time.sleep(server.latency(body))
+            status, payload, headers = server.complete(body)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+        self._send_json(status, payload, headers)
+
+    def do_GET(self):
+        server = self.server
+        parts = self.path.split("?")[0].rstrip("/").split("/")
+        if parts[-3:-1] == ["v1", "batches"] and parts[-1] in server.batches:
+            self._send_json(200, server.batch(parts[-1]))
+        elif parts[-1] == "content" and parts[-2] in server.files:
+            self._send_bytes(200, server.files[parts[-2]], "application/octet-stream")
+        else:
+            self._send_json(404, {"error": {"message": f"No such resource: {self.path}", "type": "not_found"}})
+
+    def _form_fields(self, data: bytes) -> dict:
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8")
+        message = BytesParser(policy=policy.default).parsebytes(header + data)
+        return {part.get_param("name", header="content-disposition"): part.get_payload(decode=True)
+                for part in message.iter_parts()}
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        self._send_bytes(status, json.dumps(payload).encode("utf-8"), "application/json", headers)
+
+    def _send_bytes(self, status: int, data: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except ConnectionError:
+            # The client gave up on the request, e.g. because it was cancelled
+            pass
+
+    def log_message(self, *args):
+        pass
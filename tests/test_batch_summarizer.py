@@ -0,0 +1,139 @@
+"""
+Tests for scripts.batch_summarizer module
+
+Batch jobs run against the local stand-in from tests.stub_openai.
+"""
+import pytest
+import json
+import os
+
+from scripts.batch_summarizer import BatchJobSummarizer
+from scripts.summary_cache import SummaryCache
+from scripts.summarizer import PROMPT_VERSION
+from tests.stub_openai import StubOpenAIServer
+
+
+TAGS = "redemption, tense, intimate, bleak, slow-burn"
+
+
+@pytest.fixture
+def stub_openai(monkeypatch):
+    """Run a local OpenAI stand-in and point the OpenAI clients at it"""
+    with StubOpenAIServer() as server:
+        monkeypatch.setenv("OPENAI_BASE_URL", server.url)
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        server.respond = lambda body: TAGS
+        yield server
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    """Write a small top_rated_weighted-shaped CSV"""
+    path = tmp_path / "top_rated_weighted.csv"
+    rows = ["tconst,titleType,primaryTitle,startYear,genres,averageRating,numVotes,weightedRating"]
+    rows += [f'tt000000{i},movie,"Movie {i}",{1990 + i},Drama,8.{i},{1000 + i},7.{i}' for i in range(4)]
+    path.write_text("\n".join(rows) + "\n")
+    return str(path)
+
+
+def read_output(path):
+    with open(path) as f:
+        return {row['tconst']: row for row in map(json.loads, f)}
+
+
+class TestBatchJobSummarizer:
+    """Test cases for the Batch API summarizer"""
+
+    def summarizer(self, tmp_path, **kwargs):
+        return BatchJobSummarizer(state_path=str(tmp_path / "batch_job.json"), poll_interval=0.01, **kwargs)
+
+    def test_job_results_are_written_to_the_output(self, stub_openai, data_path, tmp_path):
+        """Test every movie is answered by one job and the saved job id is removed afterwards"""
+        output_path = str(tmp_path / "enhanced.json")
+
+        self.summarizer(tmp_path).summarize_dataset(data_path, output_path)
+
+        rows = read_output(output_path)
+        assert sorted(rows) == ['tt0000000', 'tt0000001', 'tt0000002', 'tt0000003']
+        assert all(row['summary'] == TAGS for row in rows.values())
+        assert rows['tt0000002']['primaryTitle'] == 'Movie 2'
+        assert len(stub_openai.batches) == 1
+        assert stub_openai.requests == []
+        assert not os.path.exists(tmp_path / "batch_job.json")
+
+    def test_movies_without_a_valid_answer_go_live(self, stub_openai, data_path, tmp_path):
+        """Test failed and invalid job answers are summarized with live requests"""
+        def respond(body):
+            content = body["messages"][-1]["content"]
+            # Job requests are answered before any live request is recorded
+            in_job = not stub_openai.requests
+            if '"Movie 1"' in content and in_job:
+                raise RuntimeError("boom")
+            if '"Movie 2"' in content and in_job:
+                return "hopeful, prison drama"
+            return TAGS
+        stub_openai.respond = respond
+        output_path = str(tmp_path / "enhanced.json")
+
+        self.summarizer(tmp_path).summarize_dataset(data_path, output_path)
+
+        rows = read_output(output_path)
+        assert len(rows) == 4
+        assert all(row['summary'] == TAGS for row in rows.values())
+        live_titles = {request["messages"][-1]["content"].split('"')[1] for request in stub_openai.requests}
+        assert live_titles == {'Movie 1', 'Movie 2'}
+
+    def test_null_responses_in_the_output_are_skipped(self, stub_openai, data_path, tmp_path):
+        """Test an output line without a response sends its movie to the live path"""
+        summarizer = self.summarizer(tmp_path)
+        movies = [{'primaryTitle': f'Movie {i}', 'startYear': 1990 + i} for i in range(2)]
+        summarizer.submit(movies, data_path)
+        batch = summarizer.wait("batch_1")
+        output_id = batch.output_file_id
+        lines = stub_openai.files[output_id].decode("utf-8").splitlines()
+        first = json.loads(lines[0])
+        first["response"] = None
+        first["error"] = {"code": "batch_expired", "message": "expired"}
+        stub_openai.files[output_id] = (json.dumps(first) + "\n" + lines[1] + "\n").encode("utf-8")
+
+        assert summarizer.results(batch) == {1: TAGS}
+
+    def test_restart_resumes_the_saved_job(self, stub_openai, data_path, tmp_path):
+        """Test a run that finds a saved job id polls that job instead of submitting another"""
+        movies = [{'primaryTitle': f'Movie {i}', 'startYear': 1990 + i} for i in range(4)]
+        self.summarizer(tmp_path).submit(movies, data_path)
+        assert os.path.exists(tmp_path / "batch_job.json")
+
+        # The pod restarts: a new process picks the job up from the state file
+        self.summarizer(tmp_path).summarize_dataset(data_path, str(tmp_path / "enhanced.json"))
+
+        assert len(stub_openai.batches) == 1
+        assert len(read_output(tmp_path / "enhanced.json")) == 4
+
+    def test_cached_movies_are_left_out_of_the_job(self, stub_openai, data_path, tmp_path):
+        """Test the request file only holds movies the summary cache does not know"""
+        cache_path = str(tmp_path / "summaries.sqlite")
+        cache = SummaryCache(cache_path, 'gpt-4.1-nano', PROMPT_VERSION)
+        cache.put({'tconst': 'tt0000000'}, "cached, tags")
+        output_path = str(tmp_path / "enhanced.json")
+
+        self.summarizer(tmp_path, cache_path=cache_path).summarize_dataset(data_path, output_path)
+
+        input_file = stub_openai.files[stub_openai.batches["batch_1"]["input_file_id"]]
+        assert len(input_file.splitlines()) == 3
+        assert read_output(output_path)['tt0000000']['summary'] == "cached, tags"
+        assert len(cache) == 4
+
+    def test_failed_job_raises(self, stub_openai, data_path, tmp_path):
+        """Test a job the API rejects is reported and its id forgotten"""
+        summarizer = self.summarizer(tmp_path)
+        summarizer.submit([{'primaryTitle': 'Movie 0', 'startYear': 1990}], data_path)
+        stub_openai.batches["batch_1"]["status"] = "failed"
+
+        with pytest.raises(RuntimeError, match="batch_1 failed"):
+            summarizer.summarize_dataset(data_path, str(tmp_path / "enhanced.json"))
+        assert not os.path.exists(tmp_path / "batch_job.json")
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
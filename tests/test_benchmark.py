@@ -0,0 +1,64 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+import pytest
+
+from scripts.benchmark import generate_title_basics, generate_title_ratings, run_benchmarks
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory for testing"""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def test_generate_title_basics_shape(temp_dir):
+    path = os.path.join(temp_dir, "title.basics.tsv.gz")
+    generate_title_basics(path, 2000)
+
+    with gzip.open(path, 'rt') as f:
+        df = pd.read_csv(f, sep='\t', quoting=3, dtype=str, keep_default_na=False)
+    assert list(df.columns) == ['tconst', 'titleType', 'primaryTitle', 'originalTitle', 'isAdult',
+                                'startYear', 'endYear', 'runtimeMinutes', 'genres']
+    assert len(df) == 2000
+    assert df['tconst'].is_unique
+    assert (df['titleType'] == 'tvEpisode').mean() > 0.5
+    assert 0 < (df['startYear'] == '\\N').mean() < 0.3
+
+
+def test_generate_title_ratings_shape(temp_dir):
+    path = os.path.join(temp_dir, "title.ratings.tsv.gz")
+    generate_title_ratings(path, 1000)
+
+    with gzip.open(path, 'rt') as f:
+        df = pd.read_csv(f, sep='\t')
+    assert len(df) == 1000
+    assert df['averageRating'].between(1, 10).all()
+    assert df['numVotes'].min() >= 5
+
+
+def test_run_benchmarks_writes_json(temp_dir):
+    output_path = os.path.join(temp_dir, "results.json")
+
+    run_benchmarks([300], output_path, work_dir=temp_dir, isolated=False)
+
+    with open(output_path) as f:
+        results = json.load(f)
+    assert {'created', 'commit', 'python', 'pandas', 'runs'} <= set(results)
+    assert {(run['dataset'], run['mode']) for run in results['runs']} == {
+        ('title.basics', 'extract'), ('title.basics', 'stream'),
+        ('title.ratings', 'extract'), ('title.ratings', 'stream'),
+    }
+    extract_run = next(run for run in results['runs'] if run['mode'] == 'extract')
+    assert set(extract_run['stages']) == {'download', 'extract', 'process'}
+    process = extract_run['stages']['process']
+    assert process['rows'] == 300
+    assert process['rows_per_second'] > 0
+    assert process['peak_rss_bytes'] > 0
+    assert extract_run['stages']['extract']['bytes_written'] >= extract_run['uncompressed_bytes']
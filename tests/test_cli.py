@@ -0,0 +1,70 @@
+"""
+Tests for scripts.cli module
+
+Commands run through typer's CliRunner; API calls go to the stand-in in tests.stub_openai.
+"""
+import pytest
+import json
+
+from typer.testing import CliRunner
+
+from scripts.cli import app
+from tests.stub_openai import StubOpenAIServer
+
+
+TAGS = "redemption, tense, intimate, bleak, slow-burn"
+
+
+@pytest.fixture
+def stub_openai(monkeypatch):
+    """Run a local OpenAI stand-in and point the OpenAI clients at it"""
+    with StubOpenAIServer() as server:
+        monkeypatch.setenv("OPENAI_BASE_URL", server.url)
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        server.respond = lambda body: TAGS
+        yield server
+
+
+@pytest.fixture
+def data_path(tmp_path):
+    """Write a small top_rated_weighted-shaped CSV"""
+    path = tmp_path / "top_rated_weighted.csv"
+    rows = ["tconst,titleType,primaryTitle,startYear,genres,averageRating,numVotes,weightedRating"]
+    rows += [f'tt000000{i},movie,"Movie {i}",{1990 + i},Drama,8.{i},{1000 + i},7.{i}' for i in range(3)]
+    path.write_text("\n".join(rows) + "\n")
+    return str(path)
+
+
+class TestSummarizeCommand:
+    """Test cases for the summarize command"""
+
+    def test_async_mode_writes_output_and_metrics(self, stub_openai, data_path, tmp_path):
+        """Test the default mode summarizes every movie and writes the JSON and Prometheus reports"""
+        output_path = tmp_path / "enhanced.json"
+
+        result = CliRunner().invoke(app, ["summarize", "--data-path", data_path,
+                                          "--output-path", str(output_path)])
+
+        assert result.exit_code == 0, result.output
+        with open(output_path) as f:
+            assert sorted(json.loads(line)['tconst'] for line in f) == ['tt0000000', 'tt0000001', 'tt0000002']
+        report = json.loads((tmp_path / "summarize_metrics.json").read_text())
+        assert report["call_types"]["summary"]["calls"] == 3
+        assert 'llm_calls_total{call_type="summary"} 3' in (tmp_path / "summarize_metrics.prom").read_text()
+
+    def test_metrics_path_option(self, stub_openai, data_path, tmp_path):
+        """Test --metrics-path moves both reports"""
+        metrics_path = tmp_path / "reports" / "run.json"
+        metrics_path.parent.mkdir()
+
+        result = CliRunner().invoke(app, ["summarize", "--data-path", data_path,
+                                          "--output-path", str(tmp_path / "enhanced.json"),
+                                          "--metrics-path", str(metrics_path), "--no-cache"])
+
+        assert result.exit_code == 0, result.output
+        assert json.loads(metrics_path.read_text())["total"]["calls"] == 3
+        assert (tmp_path / "reports" / "run.prom").exists()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,146 @@
+"""
+Tests for scripts.db and scripts.db_uploader modules
+
+These run against a real Postgres. Point PG_TEST_DB (plus PG_USER, PG_PASS, PG_HOST and
+PG_PORT if the defaults do not fit) at a scratch database; its movies table is dropped.
+"""
+import pytest
+import json
+import os
+import sys
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+# db.py and db_uploader.py import their siblings by bare module name
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+from db import CsvStream, MovieDB  # noqa: E402
+from dictionary import DICTIONARY, to_bitmask  # noqa: E402
+
+
+def connection_settings():
+    return {
+        'dbname': os.getenv("PG_TEST_DB"),
+        'user': os.getenv("PG_USER", "postgres"),
+        'password': os.getenv("PG_PASS", "secret"),
+        'host': os.getenv("PG_HOST", "localhost"),
+        'port': int(os.getenv("PG_PORT", "5432")),
+    }
+
+
+@pytest.fixture
+def db():
+    """MovieDB on an empty movies table in the scratch database"""
+    settings = connection_settings()
+    if not settings['dbname']:
+        pytest.skip("PG_TEST_DB is not set")
+    try:
+        conn = psycopg2.connect(**settings)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"Postgres is not reachable: {e}")
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("DROP TABLE IF EXISTS movies")
+    conn.close()
+
+    movie_db = MovieDB(**settings)
+    yield movie_db
+    movie_db.close()
+
+
+def fetch_movies(db):
+    with db.conn.cursor() as cur:
+        cur.execute("SELECT title, year, rating::float, tag_mask::text FROM movies ORDER BY title")
+        return cur.fetchall()
+
+
+def tags(*indices):
+    return [DICTIONARY[i] for i in indices]
+
+
+class TestCsvStream:
+    """Test cases for the COPY input stream"""
+
+    def test_rows_are_rendered_in_small_reads(self):
+        """Test quoting survives reads that split lines at arbitrary points"""
+        stream = CsvStream([('Crouching Tiger, "Hidden" Dragon', 2000, 7.9, '01')] * 3)
+
+        chunks = iter(lambda: stream.read(7), "")
+
+        assert "".join(chunks) == '"Crouching Tiger, ""Hidden"" Dragon",2000,7.9,01\n' * 3
+
+
+class TestUpsertMovies:
+    """Test cases for the COPY-based bulk load"""
+
+    def test_new_movies_are_inserted(self, db):
+        """Test every row lands in movies with its tag mask"""
+        changed = db.upsert_movies([
+            ("Heat", 1995, 8.3, tags(5, 37)),
+            ("Alien", 1979, 8.5, tags(42)),
+        ])
+
+        assert changed == 2
+        assert fetch_movies(db) == [
+            ("Alien", 1979, 8.5, to_bitmask(tags(42))),
+            ("Heat", 1995, 8.3, to_bitmask(tags(5, 37))),
+        ]
+
+    def test_only_changed_movies_are_updated(self, db):
+        """Test a reload rewrites rows whose rating or tags changed and leaves the rest alone"""
+        db.upsert_movies([("Heat", 1995, 8.3, tags(5)), ("Alien", 1979, 8.5, tags(42))])
+        with db.conn.cursor() as cur:
+            cur.execute("SELECT title, xmin::text FROM movies")
+            before = dict(cur.fetchall())
+
+        changed = db.upsert_movies([("Heat", 1995, 8.3, tags(5)), ("Alien", 1979, 8.4, tags(42))])
+
+        with db.conn.cursor() as cur:
+            cur.execute("SELECT title, xmin::text FROM movies")
+            after = dict(cur.fetchall())
+        assert changed == 1
+        assert after["Heat"] == before["Heat"]
+        assert after["Alien"] != before["Alien"]
+        assert ("Alien", 1979, 8.4, to_bitmask(tags(42))) in fetch_movies(db)
+
+    def test_duplicate_rows_keep_the_last(self, db):
+        """Test a title and year listed twice in one load does not abort the upsert"""
+        changed = db.upsert_movies([("Heat", 1995, 8.0, tags(5)), ("Heat", 1995, 8.3, tags(37))])
+
+        assert changed == 1
+        assert fetch_movies(db) == [("Heat", 1995, 8.3, to_bitmask(tags(37)))]
+
+    def test_failed_load_changes_nothing(self, db):
+        """Test a bad row rolls back the whole load and the connection stays usable"""
+        db.upsert_movies([("Heat", 1995, 8.3, tags(5))])
+
+        with pytest.raises(psycopg2.Error):
+            db.upsert_movies([("Alien", 1979, 8.5, tags(42)), ("Broken", 2000, 12345.0, tags(1))])
+
+        assert fetch_movies(db) == [("Heat", 1995, 8.3, to_bitmask(tags(5)))]
+        assert db.conn.autocommit
+
+
+class TestUploadToDb:
+    """Test cases for db_uploader.upload_to_db"""
+
+    def test_summarizer_output_is_loaded(self, db, tmp_path, monkeypatch):
+        """Test rows without a year are skipped and the rest are loaded in one pass"""
+        from db_uploader import upload_to_db
+        settings = connection_settings()
+        monkeypatch.setenv("PG_DB", settings['dbname'])
+        path = tmp_path / "enhanced.json"
+        summary = ", ".join(tags(5, 37))
+        rows = [
+            {'tconst': 'tt1', 'primaryTitle': 'Heat', 'startYear': 1995, 'weightedRating': 8.3, 'summary': summary},
+            {'tconst': 'tt2', 'primaryTitle': 'Lost', 'startYear': None, 'weightedRating': 7.0, 'summary': summary},
+        ]
+        path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+
+        upload_to_db(str(path))
+
+        assert fetch_movies(db) == [("Heat", 1995, 8.3, to_bitmask(tags(5, 37)))]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,239 @@
+"""
+Tests for scripts.download_cache module
+
+The cache is exercised against a local http.server stand-in for
+datasets.imdbws.com that supports ETag, Last-Modified and Range requests.
+"""
+import pytest
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import pandas as pd
+
+from scripts.download_cache import DownloadCache
+from scripts.loader import BatchProcessor, DatasetLoader
+from scripts.predicates import col
+
+
+TSV_CONTENT = (
+    "tconst\ttitleType\tprimaryTitle\tstartYear\tgenres\n"
+    "tt0000001\tshort\tCarmencita\t1894\tDocumentary,Short\n"
+    "tt0000002\tshort\tLe clown et ses chiens\t1892\tAnimation,Short\n"
+)
+
+
+class FakeDatasetServer(ThreadingHTTPServer):
+    """Serves a single in-memory file and records the headers of every request."""
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeDatasetHandler)
+        self.requests = []
+        self.publish(gzip.compress(TSV_CONTENT.encode("utf-8")), '"v1"')
+
+    def publish(self, body: bytes, etag: str):
+        self.body = body
+        self.etag = etag
+        self.last_modified = "Mon, 01 Jan 2024 00:00:00 GMT"
+
+    def url(self, name: str = "title.basics.tsv.gz") -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/{name}"
+
+
+class FakeDatasetHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        server.requests.append(dict(self.headers))
+
+        if self.headers.get("If-None-Match") == server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        body = server.body
+        range_header = self.headers.get("Range")
+        if range_header and self.headers.get("If-Range") == server.etag:
+            start = int(range_header.split("=")[1].rstrip("-"))
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+            body = body[start:]
+        else:
+            self.send_response(200)
+
+        self.send_header("ETag", server.etag)
+        self.send_header("Last-Modified", server.last_modified)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory for testing"""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def server():
+    """Run the fake dataset server for the duration of a test"""
+    server = FakeDatasetServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class TestDownloadCache:
+    """Test cases for DownloadCache class"""
+
+    def test_first_fetch_downloads_and_records_validators(self, server, temp_dir):
+        """Test a cold cache downloads the file and writes the manifest"""
+        cache = DownloadCache(os.path.join(temp_dir, "cache"))
+
+        path, changed = cache.fetch(server.url())
+
+        assert changed is True
+        with open(path, "rb") as f:
+            assert f.read() == server.body
+        with open(cache.manifest_path) as f:
+            entry = json.load(f)[server.url()]
+        assert entry == {"etag": '"v1"', "last_modified": server.last_modified,
+                         "size": len(server.body), "complete": True}
+
+    def test_unchanged_file_is_not_downloaded_again(self, server, temp_dir):
+        """Test a warm cache sends validators and accepts 304 Not Modified"""
+        cache_dir = os.path.join(temp_dir, "cache")
+        DownloadCache(cache_dir).fetch(server.url())
+
+        path, changed = DownloadCache(cache_dir).fetch(server.url())
+
+        assert changed is False
+        assert os.path.exists(path)
+        assert server.requests[-1]["If-None-Match"] == '"v1"'
+        assert server.requests[-1]["If-Modified-Since"] == server.last_modified
+
+    def test_changed_file_is_downloaded_again(self, server, temp_dir):
+        """Test a new upstream version replaces the cached copy"""
+        cache = DownloadCache(os.path.join(temp_dir, "cache"))
+        cache.fetch(server.url())
+        server.publish(gzip.compress(b"tconst\ntt0000009\n"), '"v2"')
+
+        path, changed = cache.fetch(server.url())
+
+        assert changed is True
+        with open(path, "rb") as f:
+            assert f.read() == server.body
+        assert cache.manifest[server.url()]["etag"] == '"v2"'
+
+    def test_interrupted_transfer_is_resumed(self, server, temp_dir):
+        """Test a partial download continues with a Range request"""
+        cache = DownloadCache(os.path.join(temp_dir, "cache"))
+        url = server.url()
+        half = len(server.body) // 2
+        with open(cache.path_for(url) + DownloadCache.PARTIAL_SUFFIX, "wb") as f:
+            f.write(server.body[:half])
+        cache.manifest[url] = {"etag": '"v1"', "last_modified": None, "size": None, "complete": False}
+
+        path, changed = cache.fetch(url)
+
+        assert changed is True
+        assert server.requests[-1]["Range"] == f"bytes={half}-"
+        with open(path, "rb") as f:
+            assert f.read() == server.body
+        assert not os.path.exists(path + DownloadCache.PARTIAL_SUFFIX)
+
+    def test_stale_partial_is_discarded(self, server, temp_dir):
+        """Test a partial download of an older version is restarted from zero"""
+        cache = DownloadCache(os.path.join(temp_dir, "cache"))
+        url = server.url()
+        with open(cache.path_for(url) + DownloadCache.PARTIAL_SUFFIX, "wb") as f:
+            f.write(b"stale bytes")
+        cache.manifest[url] = {"etag": '"v0"', "last_modified": None, "size": None, "complete": False}
+
+        path, _ = cache.fetch(url)
+
+        with open(path, "rb") as f:
+            assert f.read() == server.body
+
+    def test_corrupt_manifest_is_ignored(self, temp_dir):
+        """Test an unreadable manifest results in an empty cache"""
+        cache_dir = os.path.join(temp_dir, "cache")
+        os.makedirs(cache_dir)
+        with open(os.path.join(cache_dir, DownloadCache.MANIFEST_NAME), "w") as f:
+            f.write("{not json")
+
+        assert DownloadCache(cache_dir).manifest == {}
+
+
+class TestDatasetLoaderWithCache:
+    """Test cases for DatasetLoader backed by a DownloadCache"""
+
+    @pytest.mark.parametrize("streaming", [False, True])
+    def test_unchanged_dataset_is_skipped(self, server, temp_dir, streaming):
+        """Test the second run skips processing when upstream did not change"""
+        cache_dir = os.path.join(temp_dir, "cache")
+        output_file = os.path.join(temp_dir, "output.csv")
+        columns = ['tconst', 'primaryTitle']
+
+        original_cwd = os.getcwd()
+        try:
+            os.chdir(temp_dir)
+            DatasetLoader(server.url(), columns, output_file, streaming=streaming, cache_dir=cache_dir).process()
+            assert pd.read_csv(output_file)['tconst'].tolist() == ['tt0000001', 'tt0000002']
+
+            with patch.object(BatchProcessor, 'process') as mock_process:
+                DatasetLoader(server.url(), columns, output_file, streaming=streaming, cache_dir=cache_dir).process()
+            mock_process.assert_not_called()
+        finally:
+            os.chdir(original_cwd)
+
+        assert os.path.exists(os.path.join(cache_dir, "title.basics.tsv.gz"))
+
+    def test_changed_filter_reprocesses_unchanged_dataset(self, server, temp_dir):
+        """Test an output produced with other filters is rebuilt even when upstream did not change"""
+        cache_dir = os.path.join(temp_dir, "cache")
+        output_file = os.path.join(temp_dir, "output.csv")
+        columns = ['tconst', 'titleType']
+
+        original_cwd = os.getcwd()
+        try:
+            os.chdir(temp_dir)
+            DatasetLoader(server.url(), columns, output_file, cache_dir=cache_dir,
+                          row_filter=col('tconst') == 'tt0000001').process()
+            assert pd.read_csv(output_file)['tconst'].tolist() == ['tt0000001']
+
+            # Like switching to --raw: same download, no filter
+            DatasetLoader(server.url(), columns, output_file, cache_dir=cache_dir).process()
+        finally:
+            os.chdir(original_cwd)
+
+        assert pd.read_csv(output_file)['tconst'].tolist() == ['tt0000001', 'tt0000002']
+
+    def test_failed_processing_discards_output(self, server, temp_dir):
+        """Test a failed run does not leave output that a rerun would trust"""
+        cache_dir = os.path.join(temp_dir, "cache")
+        output_file = os.path.join(temp_dir, "output.csv")
+        with open(output_file, "w") as f:
+            f.write("partial")
+
+        loader = DatasetLoader(server.url(), ['tconst'], output_file, streaming=True, cache_dir=cache_dir)
+        with patch.object(BatchProcessor, 'process', side_effect=RuntimeError("boom")):
+            with pytest.raises(RuntimeError):
+                loader.process()
+
+        assert not os.path.exists(output_file)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,138 @@
+"""
+Tests for scripts.hedging module
+
+Slow answers come from the latency-injecting stub in tests.stub_openai.
+"""
+import pytest
+import asyncio
+import time
+
+import openai
+
+from scripts.hedging import HedgePolicy
+from tests.stub_openai import StubOpenAIServer
+
+
+MESSAGES = [{"role": "user", "content": "tags please"}]
+
+
+@pytest.fixture
+def stub_openai():
+    """Run a local chat completions stub"""
+    with StubOpenAIServer() as server:
+        yield server
+
+
+def slow_first_attempt(stub_openai, slow=1.0, fast=0.01):
+    """Answer every request quickly except the first one after warm-up"""
+    def latency(body):
+        if body["messages"][-1]["content"] == "slow" and not any(
+                request["messages"][-1]["content"] == "slow" for request in stub_openai.requests[:-1]):
+            return slow
+        return fast
+    stub_openai.latency = latency
+    stub_openai.respond = lambda body: body["model"]
+
+
+def request_for(client, content="slow"):
+    messages = [{"role": "user", "content": content}]
+    return lambda model: client.chat.completions.create(model=model, messages=messages)
+
+
+def warm_up(policy, client, count=5):
+    for _ in range(count):
+        policy.call(request_for(client, "fast"), "gpt-4.1-nano")
+
+
+class TestHedgePolicy:
+    """Test cases for HedgePolicy against the stub server"""
+
+    @pytest.fixture
+    def client(self, stub_openai):
+        return openai.OpenAI(base_url=stub_openai.url, api_key="test-key", max_retries=0)
+
+    def test_quantile_needs_enough_samples(self):
+        """Test no hedge delay is known before min_samples latencies and p95 after"""
+        policy = HedgePolicy(min_samples=20)
+        for i in range(19):
+            policy.record(i / 100)
+        assert policy.delay() is None
+
+        policy.record(0.19)
+        assert policy.delay() == pytest.approx(0.18)
+
+    def test_slow_request_is_hedged(self, stub_openai, client):
+        """Test a request slower than p95 is duplicated and the faster answer is used"""
+        slow_first_attempt(stub_openai)
+        policy = HedgePolicy(min_samples=5, max_hedge_rate=1.0)
+        warm_up(policy, client)
+
+        started = time.monotonic()
+        response = policy.call(request_for(client), "gpt-4.1-nano")
+
+        assert time.monotonic() - started < 0.5
+        assert response.choices[0].message.content == "gpt-4.1-nano"
+        assert policy.stats == {'requests': 6, 'hedges_fired': 1, 'hedges_won': 1}
+
+    def test_hedge_goes_to_the_hedge_model(self, stub_openai, client):
+        """Test the duplicate is sent to the cheaper model when one is set"""
+        slow_first_attempt(stub_openai)
+        policy = HedgePolicy(min_samples=5, max_hedge_rate=1.0, hedge_model="gpt-4.1-mini")
+        warm_up(policy, client)
+
+        response = policy.call(request_for(client), "gpt-4.1-nano")
+
+        assert response.choices[0].message.content == "gpt-4.1-mini"
+
+    def test_hedge_rate_is_capped(self, stub_openai, client):
+        """Test no duplicate is sent once the share of hedged requests would exceed the cap"""
+        slow_first_attempt(stub_openai, slow=0.5)
+        policy = HedgePolicy(min_samples=5, max_hedge_rate=0.1)
+        warm_up(policy, client)
+
+        started = time.monotonic()
+        policy.call(request_for(client), "gpt-4.1-nano")
+
+        assert time.monotonic() - started >= 0.5
+        assert policy.stats['hedges_fired'] == 0
+        assert len(stub_openai.requests) == 6
+
+    def test_invalid_first_answer_waits_for_the_other(self, stub_openai, client):
+        """Test an answer rejected by valid() does not win over a slower valid one"""
+        def respond(body):
+            return "valid" if body["model"] == "gpt-4.1-nano" else "junk"
+        slow_first_attempt(stub_openai, slow=0.3)
+        stub_openai.respond = respond
+        policy = HedgePolicy(min_samples=5, max_hedge_rate=1.0, hedge_model="gpt-4.1-mini")
+        warm_up(policy, client)
+
+        response = policy.call(request_for(client), "gpt-4.1-nano",
+                               valid=lambda response: response.choices[0].message.content == "valid")
+
+        assert response.choices[0].message.content == "valid"
+        assert policy.stats['hedges_won'] == 0
+
+    def test_async_loser_is_cancelled(self, stub_openai):
+        """Test call_async keeps the hedge's answer and cancels the slow original"""
+        slow_first_attempt(stub_openai, slow=2.0)
+        policy = HedgePolicy(min_samples=5, max_hedge_rate=1.0, hedge_model="gpt-4.1-mini")
+
+        async def run():
+            client = openai.AsyncOpenAI(base_url=stub_openai.url, api_key="test-key", max_retries=0)
+            async with client:
+                for _ in range(5):
+                    await policy.call_async(request_for(client, "fast"), "gpt-4.1-nano")
+                return await policy.call_async(request_for(client), "gpt-4.1-nano")
+
+        started = time.monotonic()
+        response = asyncio.run(run())
+
+        assert time.monotonic() - started < 1.5
+        assert response.choices[0].message.content == "gpt-4.1-mini"
+        assert policy.stats['hedges_won'] == 1
+        # The cancelled original counts as a sample of at least the hedge delay
+        assert len(policy.latencies) == 6
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,51 @@
+"""
+Tests for scripts.jsonl_writer module
+"""
+import pytest
+import json
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+
+from scripts.jsonl_writer import JsonlWriter, json_value
+
+
+class TestJsonlWriter:
+    """Test cases for JsonlWriter"""
+
+    def test_every_line_is_flushed(self, tmp_path):
+        """Test a written line can be read from the file before the writer is closed"""
+        path = tmp_path / "out.jsonl"
+
+        with JsonlWriter(str(path)) as writer:
+            writer.write({'title': 'Heat', 'year': 1995})
+            assert path.read_text() == '{"title": "Heat", "year": 1995}\n'
+
+    def test_fsync_is_batched(self, tmp_path):
+        """Test the file is synced every fsync_every lines and once more on close"""
+        with patch('scripts.jsonl_writer.os.fsync') as fsync:
+            with JsonlWriter(str(tmp_path / "out.jsonl"), fsync_every=10, fsync_interval=3600) as writer:
+                for i in range(25):
+                    writer.write({'i': i})
+                assert fsync.call_count == 2
+
+        assert fsync.call_count == 3
+
+    def test_missing_values_become_null(self, tmp_path):
+        """Test pandas NA, NaN and numpy scalars are written as plain JSON"""
+        path = tmp_path / "out.jsonl"
+
+        with JsonlWriter(str(path)) as writer:
+            writer.write({'year': pd.NA, 'rating': float('nan'), 'votes': np.int32(7), 'score': np.float64(7.5)})
+
+        assert json.loads(path.read_text()) == {'year': None, 'rating': None, 'votes': 7, 'score': 7.5}
+
+    def test_json_value_passes_plain_values_through(self):
+        """Test strings and numbers are left alone"""
+        assert json_value("tense") == "tense"
+        assert json_value(3) == 3
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
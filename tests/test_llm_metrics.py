@@ -0,0 +1,129 @@
+"""
+Tests for scripts.llm_metrics module
+
+API calls go to the local stand-in in tests.stub_openai.
+"""
+import pytest
+import json
+
+import openai
+
+from scripts.llm_metrics import LLMMetrics, LatencyHistogram, call_cost
+from scripts.rate_limiter import RateLimiter
+from tests.stub_openai import StubHTTPError, StubOpenAIServer
+
+
+MESSAGES = [{"role": "user", "content": "x" * 400}]
+
+
+@pytest.fixture
+def stub_openai():
+    """Run a local chat completions stub"""
+    with StubOpenAIServer() as server:
+        server.respond = lambda body: "y" * 40
+        yield server
+
+
+@pytest.fixture
+def client(stub_openai):
+    return openai.OpenAI(base_url=stub_openai.url, api_key="test-key", max_retries=0)
+
+
+def complete(client, model="gpt-4.1-nano"):
+    return lambda: client.chat.completions.create(model=model, messages=MESSAGES)
+
+
+class TestLatencyHistogram:
+    """Test cases for LatencyHistogram"""
+
+    def test_buckets_are_cumulative(self):
+        """Test each bucket counts every observation at or below its bound"""
+        histogram = LatencyHistogram((0.1, 1.0, float('inf')))
+        for seconds in (0.05, 0.5, 0.7, 3.0):
+            histogram.observe(seconds)
+
+        assert list(histogram.cumulative()) == [(0.1, 1), (1.0, 3), (float('inf'), 4)]
+        assert histogram.sum == pytest.approx(4.25)
+
+    def test_quantile_interpolates_within_a_bucket(self):
+        """Test quantiles are estimated inside the bucket and never above the largest latency"""
+        histogram = LatencyHistogram((1.0, 2.0, float('inf')))
+        for seconds in (0.5, 1.2, 1.4, 1.6, 1.8):
+            histogram.observe(seconds)
+
+        assert histogram.quantile(0.6) == pytest.approx(1.4)
+        assert histogram.quantile(1.0) == pytest.approx(1.8)
+        assert LatencyHistogram().quantile(0.5) is None
+
+
+class TestLLMMetrics:
+    """Test cases for LLMMetrics against the stub server"""
+
+    def test_tokens_and_cost_are_recorded(self, client):
+        """Test the usage of a call is added to its call type and priced by model"""
+        metrics = LLMMetrics()
+
+        metrics.track("summary", "gpt-4.1-nano", complete(client))()
+
+        report = metrics.report()["call_types"]["summary"]
+        assert report["calls"] == 1
+        assert report["prompt_tokens"] == 100
+        assert report["completion_tokens"] == 10
+        assert report["cost_usd"] == pytest.approx(call_cost("gpt-4.1-nano", 100, 10))
+        assert report["latency_seconds"]["count"] == 1
+
+    def test_retries_and_failures_are_counted(self, stub_openai, client):
+        """Test attempts after the first count as retries and a call that gives up as a failure"""
+        def respond(body):
+            if len(stub_openai.requests) == 1:
+                raise StubHTTPError(429, "slow down", {"retry-after": "0"})
+            if body["model"] == "broken":
+                raise StubHTTPError(400, "bad request")
+            return "ok"
+        stub_openai.respond = respond
+        limiter = RateLimiter(backoff_seconds=0)
+        metrics = LLMMetrics()
+
+        limiter.call(metrics.track("summary", "gpt-4.1-nano", complete(client)), MESSAGES)
+        with pytest.raises(openai.BadRequestError):
+            try:
+                limiter.call(metrics.track("refinement", "broken", complete(client, "broken")), MESSAGES)
+            except openai.BadRequestError:
+                metrics.failed("refinement")
+                raise
+
+        report = metrics.report()
+        assert report["call_types"]["summary"]["calls"] == 1
+        assert report["call_types"]["summary"]["retries"] == 1
+        assert report["call_types"]["summary"]["errors"] == 1
+        assert report["call_types"]["refinement"]["failures"] == 1
+        assert report["total"]["calls"] == 2
+
+    def test_prometheus_text(self, client, tmp_path):
+        """Test the counters and histogram are exposed per call type"""
+        metrics = LLMMetrics()
+        metrics.track("query_tagging", "gpt-4o", complete(client, "gpt-4o"))()
+        path = tmp_path / "metrics.prom"
+
+        metrics.write_prometheus(str(path))
+
+        text = path.read_text()
+        assert '# TYPE llm_request_duration_seconds histogram' in text
+        assert 'llm_request_duration_seconds_bucket{call_type="query_tagging",le="+Inf"} 1' in text
+        assert 'llm_request_duration_seconds_count{call_type="query_tagging"} 1' in text
+        assert 'llm_tokens_total{call_type="query_tagging",kind="prompt"} 100' in text
+        assert 'llm_calls_total{call_type="query_tagging"} 1' in text
+
+    def test_report_is_json(self, client, tmp_path):
+        """Test the run report round-trips through a JSON file"""
+        metrics = LLMMetrics()
+        metrics.track("summary", "gpt-4.1-nano", complete(client))()
+        path = tmp_path / "metrics.json"
+
+        metrics.write_report(str(path))
+
+        assert json.loads(path.read_text())["total"]["prompt_tokens"] == 100
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
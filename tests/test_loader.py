@@ -10,11 +10,16 @@ import os
 import tempfile
 import shutil
 import gzip
+import json
 from unittest.mock import Mock, patch, mock_open
 from io import StringIO
 import requests
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-from scripts.loader import DatasetLoader, BatchProcessor, load_all_datasets
+from scripts.predicates import col
+from scripts.loader import (DatasetLoader, BatchProcessor, ParallelBatchProcessor, ParquetChunkWriter,
+                            GzipStream, load_all_datasets, _load_dataset)
 
 
 # Test fixtures and constants
@@ -76,6 +81,31 @@ class TestDatasetLoader:
         assert loader.extract_path == "extracted_temp"
         assert loader.extracted_file is None
     
+    def test_scratch_dir_isolates_temp_files(self, temp_dir):
+        """Test a private scratch dir holds the download and extraction paths"""
+        loader = DatasetLoader(
+            url="https://example.com/test.tsv.gz",
+            columns=['tconst'],
+            output_file=os.path.join(temp_dir, "output.csv"),
+            scratch_dir=temp_dir
+        )
+
+        assert loader.download_path == os.path.join(temp_dir, "test.tsv.gz")
+        assert loader.extract_path == os.path.join(temp_dir, "extracted_temp")
+        assert loader.separator == '\t'
+
+    def test_parse_workers_select_parallel_processor(self, temp_dir):
+        """Test extracted files are parsed in parallel while streams stay sequential"""
+        loader = DatasetLoader(
+            url="https://example.com/test.tsv.gz",
+            columns=['tconst'],
+            output_file=os.path.join(temp_dir, "output.csv"),
+            parse_workers=4
+        )
+
+        assert isinstance(loader.batch_processor("extracted_temp/test.tsv"), ParallelBatchProcessor)
+        assert isinstance(loader.batch_processor(Mock()), BatchProcessor)
+
     @patch('requests.get')
     def test_download_success(self, mock_get, loader):
         """Test successful file download"""
@@ -253,6 +283,83 @@ class TestBatchProcessor:
         assert list(result_df.columns) == columns
         assert len(result_df) == 3
     
+    def test_process_with_schema(self, temp_dir):
+        """Test a table schema gives consistent dtypes and treats only \\N as null"""
+        input_file = os.path.join(temp_dir, "title.basics.tsv")
+        with open(input_file, 'w') as f:
+            f.write("tconst\ttitleType\tprimaryTitle\tstartYear\tgenres\n"
+                    "tt0000001\tshort\tNA\t1894\tDocumentary,Short\n"
+                    "tt0000002\tmovie\tCarmencita\t\\N\tDrama\n")
+        output_file = os.path.join(temp_dir, "basic_titles.csv")
+
+        loader = DatasetLoader("https://datasets.imdbws.com/title.basics.tsv.gz",
+                               ['tconst', 'primaryTitle', 'startYear'], output_file)
+        loader.batch_processor(input_file).process()
+
+        with open(output_file) as f:
+            assert f.read().splitlines() == [
+                "tconst,primaryTitle,startYear",
+                "tt0000001,NA,1894",
+                "tt0000002,Carmencita,",
+            ]
+
+    def test_adaptive_chunking_from_memory_budget(self, temp_dir):
+        """Test chunk sizes follow the memory budget instead of the fixed batch size"""
+        input_file = os.path.join(temp_dir, "titles.tsv")
+        pd.DataFrame({
+            'tconst': [f"tt{i:07d}" for i in range(5000)],
+            'primaryTitle': [f"Title number {i}" for i in range(5000)],
+        }).to_csv(input_file, sep='\t', index=False)
+        output_file = os.path.join(temp_dir, "output.csv")
+
+        processor = BatchProcessor(input_file, output_file, 10, ['tconst', 'primaryTitle'],
+                                   memory_budget=200 * 1024)
+        processor.process()
+
+        # First chunk uses batch_size, later ones are sized to ~200 KB of decoded rows
+        assert 2 < processor.stats['chunks'] < 10
+        assert processor.stats['rows'] == 5000
+        assert processor.stats['bytes_written'] == os.path.getsize(output_file)
+        assert processor.stats['peak_rss_bytes'] > 0
+        assert pd.read_csv(output_file)['tconst'].tolist()[-1] == "tt0004999"
+
+    def test_progress_is_throttled(self, sample_csv_file, temp_dir, capsys):
+        """Test progress lines are printed on a timer rather than per chunk"""
+        output_file = os.path.join(temp_dir, "output.csv")
+
+        BatchProcessor(sample_csv_file, output_file, 1, ['tconst'], progress_interval=3600).process()
+        assert "Processed" not in capsys.readouterr().out
+
+        BatchProcessor(sample_csv_file, output_file, 1, ['tconst'], progress_interval=0).process()
+        assert capsys.readouterr().out.count("Processed") == 3
+
+    def test_process_parquet_output(self, temp_dir):
+        """Test Parquet output uses the explicit schema and maps \\N to null"""
+        input_file = os.path.join(temp_dir, "ratings.tsv")
+        with open(input_file, 'w') as f:
+            f.write("tconst\ttitleType\tstartYear\taverageRating\tnumVotes\n"
+                    "tt0000001\tshort\t1894\t5.7\t2100\n"
+                    "tt0000002\tmovie\t\\N\t6.1\t280\n"
+                    "tt0000003\tshort\t1892\t6.5\t2000\n")
+        output_file = os.path.join(temp_dir, "ratings.parquet")
+        columns = ['tconst', 'titleType', 'startYear', 'averageRating', 'numVotes']
+
+        BatchProcessor(input_file, output_file, 2, columns).process()
+
+        parquet_file = pq.ParquetFile(output_file)
+        # Both 2-row parse chunks are buffered into one row group
+        assert parquet_file.metadata.num_row_groups == 1
+        schema = parquet_file.schema_arrow
+        assert schema.field('tconst').type == pa.string()
+        assert schema.field('titleType').type == pa.dictionary(pa.int32(), pa.string())
+        assert schema.field('startYear').type == pa.int16()
+        assert schema.field('averageRating').type == pa.float32()
+        assert schema.field('numVotes').type == pa.int32()
+
+        table = parquet_file.read()
+        assert table.column('startYear').to_pylist() == [1894, None, 1892]
+        assert table.column('titleType').to_pylist() == ['short', 'movie', 'short']
+
     def test_custom_filter_functionality(self, sample_csv_file, temp_dir):
         """Test custom row filtering"""
         output_file = os.path.join(temp_dir, "filtered_output.csv")
@@ -280,6 +387,172 @@ class TestBatchProcessor:
         assert result_df['tconst'].iloc[0] == 'tt0000001'
 
 
+    def test_predicate_filter_functionality(self, sample_tsv_file, temp_dir):
+        """Test vectorized predicate filtering reads the predicate columns only for masking"""
+        output_file = os.path.join(temp_dir, "filtered_output.csv")
+        columns = ['tconst', 'primaryTitle']
+
+        processor = BatchProcessor(
+            file_path=sample_tsv_file,
+            output_file=output_file,
+            batch_size=2,
+            columns=columns
+        )
+
+        with patch('scripts.loader.pd.read_csv', wraps=pd.read_csv) as mock_read_csv:
+            processor.filter((col('startYear') < 1894) & col('genres').isin(['Animation,Short', 'Drama']))
+
+        assert mock_read_csv.call_args[1]['usecols'] == ['genres', 'primaryTitle', 'startYear', 'tconst']
+        result_df = pd.read_csv(output_file)
+        assert list(result_df.columns) == columns
+        assert result_df['tconst'].tolist() == ['tt0000002']
+
+class TestParquetChunkWriter:
+    """Test cases for row group sizing in ParquetChunkWriter"""
+
+    @staticmethod
+    def chunk(start, rows):
+        return pd.DataFrame({'tconst': [f"tt{i:07d}" for i in range(start, start + rows)],
+                             'numVotes': range(start, start + rows)})
+
+    def test_chunks_are_buffered_into_full_row_groups(self, temp_dir):
+        """Test small and empty chunks are combined into row groups of row_group_rows"""
+        output_file = os.path.join(temp_dir, "ratings.parquet")
+        writer = ParquetChunkWriter(output_file, ['tconst', 'numVotes'], row_group_rows=4)
+        for start in range(0, 15, 3):
+            writer.write(self.chunk(start, 3))
+            writer.write(self.chunk(start, 0))
+        writer.close()
+
+        metadata = pq.ParquetFile(output_file).metadata
+        assert [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)] == [4, 4, 4, 3]
+        assert pq.read_table(output_file).column('numVotes').to_pylist() == list(range(15))
+
+    def test_byte_target_ends_a_row_group_early(self, temp_dir):
+        """Test buffered chunks are written once they reach row_group_bytes"""
+        output_file = os.path.join(temp_dir, "ratings.parquet")
+        writer = ParquetChunkWriter(output_file, ['tconst', 'numVotes'], row_group_rows=1000, row_group_bytes=1)
+        writer.write(self.chunk(0, 3))
+        writer.write(self.chunk(3, 3))
+        writer.close()
+
+        assert pq.ParquetFile(output_file).metadata.num_row_groups == 2
+
+    def test_empty_output_has_no_row_groups(self, temp_dir):
+        """Test a writer that only saw empty chunks leaves a valid file without row groups"""
+        output_file = os.path.join(temp_dir, "ratings.parquet")
+        writer = ParquetChunkWriter(output_file, ['tconst', 'numVotes'])
+        writer.write(self.chunk(0, 0))
+        writer.close()
+
+        parquet_file = pq.ParquetFile(output_file)
+        assert parquet_file.metadata.num_row_groups == 0
+        assert parquet_file.schema_arrow.names == ['tconst', 'numVotes']
+
+class TestParallelBatchProcessor:
+    """Test cases for ParallelBatchProcessor range-split parsing"""
+
+    @pytest.fixture
+    def large_tsv_file(self, temp_dir):
+        """Unquoted IMDB-style TSV with \\N nulls and a stray double quote"""
+        file_path = os.path.join(temp_dir, "title.basics.tsv")
+        with open(file_path, 'w') as f:
+            f.write("tconst\ttitleType\tprimaryTitle\tstartYear\tgenres\n")
+            for i in range(1000):
+                year = "\\N" if i % 7 == 0 else str(1900 + i % 120)
+                f.write(f"tt{i:07d}\tmovie\t\"Title {i}\t{year}\tDrama\n")
+        return file_path
+
+    def test_ranges_are_newline_aligned(self, large_tsv_file):
+        """Test every range starts at a row start and the ranges cover the data exactly"""
+        processor = ParallelBatchProcessor(large_tsv_file, "unused.csv", ['tconst'], workers=4, range_size=1000)
+        header, ranges = processor.split_ranges()
+
+        with open(large_tsv_file, 'rb') as f:
+            content = f.read()
+        assert header == content[:len(header)]
+        assert ranges[0][0] == len(header)
+        assert ranges[-1][1] == len(content)
+        assert len(ranges) > 4
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            assert end == start
+            assert content[start - 1:start] == b"\n"
+
+    def test_merged_output_preserves_order(self, large_tsv_file, temp_dir):
+        """Test merged output equals sequential parsing of the whole file"""
+        output_file = os.path.join(temp_dir, "basic_titles.csv")
+        columns = ['tconst', 'primaryTitle', 'startYear']
+
+        processor = ParallelBatchProcessor(large_tsv_file, output_file, columns, workers=3, range_size=4096)
+        processor.process()
+
+        result_df = pd.read_csv(output_file)
+        assert list(result_df.columns) == columns
+        assert result_df['tconst'].tolist() == [f"tt{i:07d}" for i in range(1000)]
+        assert result_df['primaryTitle'].iloc[5] == '"Title 5'
+        assert processor.stats['rows'] == 1000
+        assert not os.path.exists(output_file + '.parts')
+
+    def test_parquet_merge(self, large_tsv_file, temp_dir):
+        """Test merged Parquet output keeps rows in input order"""
+        output_file = os.path.join(temp_dir, "basic_titles.parquet")
+
+        ParallelBatchProcessor(large_tsv_file, output_file, ['tconst', 'startYear'], workers=2, range_size=4096).process()
+
+        table = pq.read_table(output_file)
+        assert table.column('tconst').to_pylist()[:2] == ["tt0000000", "tt0000001"]
+        assert table.column('startYear').to_pylist()[:2] == [None, 1901]
+        assert table.num_rows == 1000
+
+    def test_row_filter(self, large_tsv_file, temp_dir):
+        """Test predicates are applied inside each range before projection"""
+        output_file = os.path.join(temp_dir, "basic_titles.csv")
+
+        ParallelBatchProcessor(large_tsv_file, output_file, ['tconst'], workers=2, range_size=4096,
+                               row_filter=col('startYear') >= 2010).process()
+
+        result_df = pd.read_csv(output_file)
+        assert list(result_df.columns) == ['tconst']
+        assert len(result_df) == len([i for i in range(1000) if i % 7 and 1900 + i % 120 >= 2010])
+
+    def test_parts_with_manifest(self, large_tsv_file, temp_dir):
+        """Test unmerged mode leaves part files and a manifest describing them"""
+        output_dir = os.path.join(temp_dir, "basic_titles.csv")
+
+        ParallelBatchProcessor(large_tsv_file, output_dir, ['tconst'], workers=2, range_size=8192, merge=False).process()
+
+        with open(os.path.join(output_dir, '_manifest.json')) as f:
+            manifest = json.load(f)
+        assert sum(part['rows'] for part in manifest['parts']) == 1000
+        frames = [pd.read_csv(os.path.join(output_dir, part['file'])) for part in manifest['parts']]
+        assert pd.concat(frames)['tconst'].tolist() == [f"tt{i:07d}" for i in range(1000)]
+
+
+class TestGzipStream:
+    """Test cases for GzipStream incremental decompression"""
+
+    def test_reads_across_small_chunks(self):
+        """Test decompression when compressed data arrives in tiny pieces"""
+        payload = b"tconst\ttitleType\n" + b"tt0000001\tshort\n" * 1000
+        compressed = gzip.compress(payload)
+        chunks = [compressed[i:i + 7] for i in range(0, len(compressed), 7)]
+
+        assert GzipStream(chunks).read() == payload
+
+    def test_concatenated_members(self):
+        """Test multi-member gzip streams are fully decompressed"""
+        compressed = gzip.compress(b"first\n") + gzip.compress(b"second\n")
+
+        assert GzipStream([compressed]).read() == b"first\nsecond\n"
+
+    def test_truncated_stream_raises(self):
+        """Test a truncated download is reported instead of silently accepted"""
+        compressed = gzip.compress(b"tconst\n" * 100)
+
+        with pytest.raises(EOFError):
+            GzipStream([compressed[:-10]]).read()
+
+
 class TestLoadAllDatasets:
     """Test cases for load_all_datasets function"""
     
@@ -295,6 +568,61 @@ class TestLoadAllDatasets:
         load_all_datasets("custom_data")
         assert mock_process.call_count == 2
     
+    @patch.object(DatasetLoader, 'download')
+    @patch.object(DatasetLoader, 'stream')
+    def test_streaming_mode(self, mock_stream, mock_download):
+        """Test load_all_datasets forwards streaming mode to every loader"""
+        load_all_datasets("data", streaming=True)
+        assert mock_stream.call_count == 2
+        mock_download.assert_not_called()
+
+    @patch('scripts.loader.load_in_parallel')
+    @patch.object(DatasetLoader, 'process')
+    def test_parallel_mode(self, mock_process, mock_parallel):
+        """Test load_all_datasets hands every dataset to the worker pool"""
+        load_all_datasets("data", workers=4)
+
+        mock_process.assert_not_called()
+        datasets, data_path, workers = mock_parallel.call_args[0]
+        assert len(datasets) == 2
+        assert (data_path, workers) == ("data", 4)
+
+    def test_worker_uses_private_scratch_dir(self, temp_dir):
+        """Test each worker loads into its own scratch dir and removes it afterwards"""
+        seen = []
+
+        def record_paths(loader):
+            seen.append((loader.download_path, loader.extract_path))
+
+        with patch.object(DatasetLoader, 'process', autospec=True, side_effect=record_paths):
+            _load_dataset("https://example.com/a.tsv.gz", ['tconst'], "a.csv", temp_dir, {})
+            _load_dataset("https://example.com/b.tsv.gz", ['tconst'], "b.csv", temp_dir, {})
+
+        (a_download, a_extract), (b_download, b_extract) = seen
+        assert os.path.dirname(a_download) != os.path.dirname(b_download)
+        assert os.path.dirname(a_extract).startswith(temp_dir)
+        assert os.listdir(temp_dir) == []
+
+    @patch.object(DatasetLoader, '__init__', return_value=None)
+    @patch.object(DatasetLoader, 'process')
+    def test_pipeline_filters_pushed_down(self, mock_process, mock_init):
+        """Test the downstream movie and vote filters are applied while loading by default"""
+        load_all_datasets("test_data", votes_threshold=500)
+
+        basics_filter = mock_init.call_args_list[0][1]['row_filter']
+        ratings_filter = mock_init.call_args_list[1][1]['row_filter']
+        assert basics_filter.columns() == {'titleType'}
+        assert basics_filter.values == ['movie']
+        assert (ratings_filter.column, ratings_filter.op, ratings_filter.value) == ('numVotes', '>', 500)
+
+    @patch.object(DatasetLoader, '__init__', return_value=None)
+    @patch.object(DatasetLoader, 'process')
+    def test_raw_mode_keeps_every_row(self, mock_process, mock_init):
+        """Test raw snapshots are loaded without row filters"""
+        load_all_datasets("test_data", raw=True)
+
+        assert [call[1]['row_filter'] for call in mock_init.call_args_list] == [None, None]
+
     @patch.object(DatasetLoader, '__init__', return_value=None)
     @patch.object(DatasetLoader, 'process')
     def test_correct_dataset_parameters(self, mock_process, mock_init):
@@ -364,6 +692,67 @@ class TestIntegrationWorkflow:
         finally:
             os.chdir(original_cwd)
 
+    @patch('requests.get')
+    def test_streaming_workflow_writes_no_temp_files(self, mock_get, temp_dir):
+        """Test streaming download → gunzip → projection leaves only the output file"""
+        mock_tsv_content = (
+            "tconst\ttitleType\tprimaryTitle\tstartYear\tgenres\n"
+            "tt0000001\tshort\tCarmencita\t1894\tDocumentary,Short\n"
+            "tt0000002\tshort\tLe clown et ses chiens\t1892\tAnimation,Short\n"
+        )
+        gzip_content = self.create_gzip_content(mock_tsv_content)
+        mock_response = Mock()
+        mock_response.iter_content.return_value = [gzip_content[i:i + 16] for i in range(0, len(gzip_content), 16)]
+        mock_response.raise_for_status.return_value = None
+        mock_get.return_value.__enter__.return_value = mock_response
+
+        output_file = os.path.join(temp_dir, "output.csv")
+        loader = DatasetLoader(
+            url="https://example.com/test.tsv.gz",
+            columns=['tconst', 'primaryTitle'],
+            output_file=output_file,
+            streaming=True
+        )
+
+        original_cwd = os.getcwd()
+        try:
+            os.chdir(temp_dir)
+            loader.process()
+
+            assert os.listdir(temp_dir) == ["output.csv"]
+            result_df = pd.read_csv(output_file)
+            assert list(result_df.columns) == ['tconst', 'primaryTitle']
+            assert result_df['primaryTitle'].tolist() == ['Carmencita', 'Le clown et ses chiens']
+        finally:
+            os.chdir(original_cwd)
+
+
+    @patch('requests.get')
+    def test_streaming_workflow_with_pushdown(self, mock_get, temp_dir):
+        """Test rows the pipeline discards are never written"""
+        mock_tsv_content = (
+            "tconst\taverageRating\tnumVotes\n"
+            "tt0000001\t5.7\t2100\n"
+            "tt0000002\t8.1\t250000\n"
+            "tt0000003\t6.5\t\\N\n"
+        )
+        mock_response = Mock()
+        mock_response.iter_content.return_value = [self.create_gzip_content(mock_tsv_content)]
+        mock_response.raise_for_status.return_value = None
+        mock_get.return_value.__enter__.return_value = mock_response
+
+        output_file = os.path.join(temp_dir, "ratings.csv")
+        DatasetLoader(
+            url="https://datasets.imdbws.com/title.ratings.tsv.gz",
+            columns=['tconst', 'averageRating'],
+            output_file=output_file,
+            streaming=True,
+            row_filter=col('numVotes') > 10000
+        ).process()
+
+        result_df = pd.read_csv(output_file)
+        assert list(result_df.columns) == ['tconst', 'averageRating']
+        assert result_df['tconst'].tolist() == ['tt0000002']
 
 if __name__ == "__main__":
     pytest.main([__file__, "-v"]) 
\ No newline at end of file
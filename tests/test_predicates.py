@@ -0,0 +1,60 @@
+import pytest
+import numpy as np
+import pandas as pd
+from scripts.predicates import Compare, IsIn, Between, And, Or, Not, col
+
+
+@pytest.fixture
+def titles():
+    """Chunk shaped like title.basics joined with ratings, including \\N nulls"""
+    return pd.DataFrame({
+        'tconst': ['tt01', 'tt02', 'tt03', 'tt04'],
+        'titleType': ['movie', 'short', 'movie', 'tvSeries'],
+        'startYear': ['1994', '\\N', '1972', '2008'],
+        'numVotes': [2500000, 12, 1800000, 9000],
+    })
+
+
+def test_equality(titles):
+    assert (col('titleType') == 'movie').mask(titles).tolist() == [True, False, True, False]
+
+
+def test_numeric_comparison(titles):
+    assert (col('numVotes') > 10000).mask(titles).tolist() == [True, False, True, False]
+
+
+def test_text_column_compared_as_number(titles):
+    """\\N cannot be parsed as a year and never matches"""
+    assert (col('startYear') >= 1990).mask(titles).tolist() == [True, False, False, True]
+    assert (col('startYear') < 1990).mask(titles).tolist() == [False, False, True, False]
+
+
+def test_isin(titles):
+    assert col('titleType').isin(['movie', 'short']).mask(titles).tolist() == [True, True, True, False]
+
+
+def test_between(titles):
+    assert col('startYear').between(1970, 2000).mask(titles).tolist() == [True, False, True, False]
+
+
+def test_composition(titles):
+    predicate = (col('titleType') == 'movie') & (col('numVotes') > 2000000) | (col('titleType') == 'short')
+    assert isinstance(predicate, Or)
+    assert predicate.mask(titles).tolist() == [True, True, False, False]
+    assert (~predicate).mask(titles).tolist() == [False, False, True, True]
+
+
+def test_columns_are_collected():
+    predicate = And(Compare('titleType', '==', 'movie'), Not(IsIn('genres', ['Short'])), Between('startYear', 1, 2))
+    assert predicate.columns() == {'titleType', 'genres', 'startYear'}
+
+
+def test_mask_is_numpy_bool(titles):
+    mask = (col('numVotes') != 12).mask(titles)
+    assert isinstance(mask, np.ndarray)
+    assert mask.dtype == bool
+
+
+def test_unknown_operator():
+    with pytest.raises(ValueError, match="Unsupported comparison operator"):
+        Compare('numVotes', '=~', 1)
@@ -0,0 +1,188 @@
+"""
+Tests for scripts.rate_limiter module
+
+Rate-limit responses come from the local stand-in in tests.stub_openai.
+"""
+import pytest
+import asyncio
+import time
+
+import openai
+
+from scripts.rate_limiter import RateLimiter, TokenBucket, estimate_tokens
+from tests.stub_openai import StubHTTPError, StubOpenAIServer
+
+
+MESSAGES = [{"role": "user", "content": "x" * 400}]
+
+
+@pytest.fixture
+def stub_openai():
+    """Run a local chat completions stub"""
+    with StubOpenAIServer() as server:
+        yield server
+
+
+@pytest.fixture
+def client(stub_openai):
+    """OpenAI client without its own retries, pointed at the stub"""
+    return openai.OpenAI(base_url=stub_openai.url, api_key="test-key", max_retries=0)
+
+
+def complete(client):
+    return lambda: client.chat.completions.create(model="gpt-4.1-nano", messages=MESSAGES)
+
+
+def rate_limited_first(stub_openai, times=1, retry_after="0.3"):
+    """Answer the first requests with 429 and a retry-after header, then normally"""
+    def respond(body):
+        if len(stub_openai.requests) <= times:
+            raise StubHTTPError(429, "slow down", {"retry-after": retry_after})
+        return "ok"
+    stub_openai.respond = respond
+
+
+class TestTokenBucket:
+    """Test cases for TokenBucket"""
+
+    def test_waits_for_refill_when_empty(self):
+        """Test a drained bucket reports how long the refill takes"""
+        bucket = TokenBucket(60)
+        now = bucket.updated
+
+        assert bucket.wait_time(60, now) == 0
+        assert bucket.wait_time(1, now) == pytest.approx(1.0)
+        assert bucket.wait_time(1, now + 1.0) == 0
+
+    def test_oversized_request_waits_for_a_full_bucket(self):
+        """Test a request larger than the capacity is not blocked forever"""
+        bucket = TokenBucket(60)
+
+        assert bucket.wait_time(1000, bucket.updated) == 0
+
+    def test_charge_puts_the_bucket_in_debt(self):
+        """Test usage above the estimate delays the next request"""
+        bucket = TokenBucket(60)
+        now = bucket.updated
+        bucket.wait_time(60, now)
+        bucket.charge(30)
+
+        assert bucket.wait_time(1, now) == pytest.approx(31.0)
+
+
+class TestRateLimiter:
+    """Test cases for RateLimiter against the stub server"""
+
+    def test_estimate_uses_prompt_length(self):
+        """Test the estimate is a quarter of the prompt characters plus the expected answer"""
+        assert estimate_tokens(MESSAGES, completion_tokens=64) == 164
+
+    def test_honors_retry_after(self, stub_openai, client):
+        """Test a 429 is retried no sooner than its retry-after and counted"""
+        rate_limited_first(stub_openai)
+        limiter = RateLimiter(backoff_seconds=0.01)
+
+        started = time.monotonic()
+        response = limiter.call(complete(client), MESSAGES)
+
+        assert response.choices[0].message.content == "ok"
+        assert time.monotonic() - started >= 0.3
+        assert limiter.stats['rate_limited'] == 1
+        assert limiter.stats['retries'] == 1
+        assert limiter.in_flight == 0
+
+    def test_retry_after_pauses_every_caller(self, stub_openai, client):
+        """Test a call started during another call's retry-after waits for it to end"""
+        rate_limited_first(stub_openai)
+        limiter = RateLimiter(max_retries=1, backoff_seconds=0)
+
+        with pytest.raises(openai.RateLimitError):
+            limiter.call(complete(client), MESSAGES)
+        started = time.monotonic()
+        limiter.call(complete(client), MESSAGES)
+
+        assert time.monotonic() - started >= 0.25
+
+    def test_concurrency_halves_on_429_and_grows_back(self, stub_openai, client):
+        """Test AIMD: a rate limit halves the concurrency limit and successes raise it again"""
+        rate_limited_first(stub_openai, retry_after="0")
+        limiter = RateLimiter(max_concurrency=8, backoff_seconds=0)
+
+        limiter.call(complete(client), MESSAGES)
+        assert limiter.concurrency == pytest.approx(4 + 1 / 4)
+
+        for _ in range(40):
+            limiter.call(complete(client), MESSAGES)
+        assert limiter.concurrency == 8
+
+    def test_burst_of_429s_halves_once(self, stub_openai, client):
+        """Test simultaneous rate limits within the cooldown only cut the limit once"""
+        rate_limited_first(stub_openai, times=10, retry_after="0")
+        limiter = RateLimiter(max_concurrency=16, backoff_seconds=0)
+
+        async def burst():
+            async_client = openai.AsyncOpenAI(base_url=stub_openai.url, api_key="test-key", max_retries=0)
+            async with async_client:
+                await asyncio.gather(*[
+                    limiter.call_async(lambda: async_client.chat.completions.create(
+                        model="gpt-4.1-nano", messages=MESSAGES), MESSAGES)
+                    for _ in range(10)
+                ])
+
+        asyncio.run(burst())
+
+        assert limiter.stats['rate_limited'] == 10
+        # Halved once to 8, then raised by 1/8 per success
+        assert 8 <= limiter.concurrency <= 8 + 10 / 8
+        assert limiter.in_flight == 0
+
+    def test_non_retryable_error_is_raised_at_once(self, stub_openai, client):
+        """Test a 400 is not retried"""
+        def respond(body):
+            raise StubHTTPError(400, "bad request")
+        stub_openai.respond = respond
+        limiter = RateLimiter(backoff_seconds=0)
+
+        with pytest.raises(openai.BadRequestError):
+            limiter.call(complete(client), MESSAGES)
+        assert len(stub_openai.requests) == 1
+        assert limiter.stats['failed'] == 1
+
+    def test_gives_up_after_max_retries(self, stub_openai, client):
+        """Test a rate limit that never clears is raised once the attempts are used"""
+        rate_limited_first(stub_openai, times=100, retry_after="0")
+        limiter = RateLimiter(max_retries=3, backoff_seconds=0)
+
+        with pytest.raises(openai.RateLimitError):
+            limiter.call(complete(client), MESSAGES)
+        assert len(stub_openai.requests) == 3
+
+    def test_usage_settles_the_token_estimate(self, stub_openai, client):
+        """Test the TPM bucket is charged what the call used, not what was estimated"""
+        stub_openai.respond = lambda body: "y" * 4000
+        limiter = RateLimiter(tpm=100_000)
+
+        response = limiter.call(complete(client), MESSAGES)
+
+        used = 100_000 - limiter.tokens.tokens
+        assert used == pytest.approx(response.usage.total_tokens, abs=5)
+
+    def test_interrupt_releases_the_slot(self):
+        """Test KeyboardInterrupt inside the request does not leak the in-flight slot"""
+        limiter = RateLimiter()
+
+        def interrupted():
+            raise KeyboardInterrupt
+
+        with pytest.raises(KeyboardInterrupt):
+            limiter.call(interrupted, MESSAGES)
+        assert limiter.in_flight == 0
+
+    def test_requires_an_attempt(self):
+        """Test max_retries below one is rejected instead of returning None"""
+        with pytest.raises(ValueError):
+            RateLimiter(max_retries=0)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,63 @@
+import csv
+import io
+import pandas as pd
+import pyarrow as pa
+import pytest
+from scripts.schemas import NULL_SENTINEL, arrow_type, get_schema, schema_for_url
+
+
+BASICS_TSV = (
+    "tconst\ttitleType\tprimaryTitle\tstartYear\tgenres\n"
+    "tt0000001\tshort\tCarmencita\t1894\tDocumentary,Short\n"
+    "tt0000002\tmovie\tNA\t\\N\t\\N\n"
+    "tt0000003\tmovie\t\"Quoted title\t1999\tDrama\n"
+)
+
+
+def test_schema_for_url():
+    assert schema_for_url('https://datasets.imdbws.com/title.basics.tsv.gz').name == 'title.basics'
+    assert schema_for_url('https://datasets.imdbws.com/title.ratings.tsv.gz').name == 'title.ratings'
+    assert schema_for_url('https://example.com/test.tsv.gz') is None
+
+
+def test_get_schema_unknown():
+    with pytest.raises(KeyError, match="No schema registered"):
+        get_schema('title.unknown')
+
+
+def test_read_csv_options_apply_dtypes_and_nulls():
+    schema = get_schema('title.basics')
+    df = pd.read_csv(io.StringIO(BASICS_TSV), sep='\t', **schema.read_csv_options())
+
+    assert str(df['startYear'].dtype) == 'Int16'
+    assert isinstance(df['titleType'].dtype, pd.CategoricalDtype)
+    assert str(df['tconst'].dtype) == 'string'
+    assert df['startYear'].isna().tolist() == [False, True, False]
+    assert df['genres'].isna().tolist() == [False, True, False]
+    # Only \N is null: a film titled "NA" stays text and quotes are literal characters
+    assert df['primaryTitle'].tolist() == ['Carmencita', 'NA', '"Quoted title']
+
+
+def test_read_csv_options_restricted_to_columns():
+    options = get_schema('title.basics').read_csv_options(['tconst', 'startYear'])
+
+    assert options['dtype'] == {'tconst': 'string[pyarrow]', 'startYear': 'Int16'}
+    assert options['na_values'] == [NULL_SENTINEL, '']
+    assert options['quoting'] == csv.QUOTE_NONE
+
+
+def test_arrow_types():
+    assert arrow_type('startYear') == pa.int16()
+    assert arrow_type('numVotes', get_schema('title.ratings')) == pa.int32()
+    assert arrow_type('genres') == pa.dictionary(pa.int32(), pa.string())
+    assert arrow_type('somethingElse') == pa.string()
+
+
+def test_typed_read_uses_less_memory():
+    rows = "".join(f"tt{i:07d}\tmovie\tTitle {i}\t{1900 + i % 120}\tDrama\n" for i in range(5000))
+    data = "tconst\ttitleType\tprimaryTitle\tstartYear\tgenres\n" + rows
+
+    inferred = pd.read_csv(io.StringIO(data.replace("\t1900\t", "\t\\N\t")), sep='\t')
+    typed = pd.read_csv(io.StringIO(data), sep='\t', **get_schema('title.basics').read_csv_options())
+
+    assert typed.memory_usage(deep=True).sum() * 2 < inferred.memory_usage(deep=True).sum()
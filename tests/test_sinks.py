@@ -0,0 +1,187 @@
+"""
+Tests for scripts.sinks module
+
+Uploads go to the in-memory GCS stand-in from tests.fake_gcs.
+"""
+import pytest
+import io
+import os
+import shutil
+import tempfile
+from unittest.mock import Mock, patch
+
+import pandas as pd
+import pyarrow.parquet as pq
+
+from scripts.loader import BatchProcessor, DatasetLoader, ParallelBatchProcessor
+from scripts.sinks import GCSBlobSink, LocalFileSink, SinkStream
+from tests.fake_gcs import FakeGCSClient
+
+
+TSV_CONTENT = (
+    "tconst\ttitleType\tprimaryTitle\tstartYear\tgenres\n"
+    "tt0000001\tshort\tCarmencita\t1894\tDocumentary,Short\n"
+    "tt0000002\tmovie\tLe clown et ses chiens\t1892\tAnimation,Short\n"
+    "tt0000003\tmovie\tPauvre Pierrot\t1892\tAnimation,Comedy\n"
+)
+
+
+@pytest.fixture
+def temp_dir():
+    """Create a temporary directory for testing"""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def fake_gcs():
+    """Route storage.Client() to an in-memory fake"""
+    fake_client = FakeGCSClient()
+    with patch('scripts.sinks.storage.Client', return_value=fake_client):
+        yield fake_client
+
+
+@pytest.fixture
+def input_file(temp_dir):
+    """Write a small title.basics-shaped TSV"""
+    path = os.path.join(temp_dir, "title.basics.tsv")
+    with open(path, 'w') as f:
+        f.write(TSV_CONTENT)
+    return path
+
+
+class TestSinkStream:
+    """Test cases for SinkStream"""
+
+    def test_writes_to_every_sink(self, fake_gcs, temp_dir):
+        """Test the same bytes reach the local file and the bucket"""
+        local_path = os.path.join(temp_dir, "out.csv")
+        stream = SinkStream([LocalFileSink(local_path), GCSBlobSink("test-bucket", "out.csv")])
+
+        stream.write(b"a,b\n")
+        stream.write(b"1,2\n")
+        stream.close()
+
+        with open(local_path, 'rb') as f:
+            assert f.read() == b"a,b\n1,2\n"
+        assert fake_gcs.bucket("test-bucket").objects == {"out.csv": b"a,b\n1,2\n"}
+        assert fake_gcs.bucket("test-bucket").attributes["out.csv"]["content_type"] == "text/csv"
+        assert stream.bytes_written == 8
+
+    def test_abort_does_not_create_the_object(self, fake_gcs):
+        """Test an aborted upload leaves the bucket untouched"""
+        stream = SinkStream([GCSBlobSink("test-bucket", "out.csv")])
+        stream.write(b"partial")
+
+        stream.abort()
+        stream.close()
+
+        assert fake_gcs.bucket("test-bucket").objects == {}
+
+    def test_failed_commit_aborts_the_other_sinks(self):
+        """Test a sink whose commit raises does not leave the remaining handles open"""
+        committed, failing, remaining = Mock(), Mock(), Mock()
+        failing.commit.side_effect = OSError("disk full")
+        stream = SinkStream([committed, failing, remaining])
+
+        with pytest.raises(OSError, match="disk full"):
+            stream.close()
+
+        committed.commit.assert_called_once()
+        committed.abort.assert_not_called()
+        failing.abort.assert_called_once_with(failing.open.return_value)
+        remaining.commit.assert_not_called()
+        remaining.abort.assert_called_once_with(remaining.open.return_value)
+        assert stream.closed
+
+    def test_failed_abort_still_aborts_the_other_sinks(self):
+        """Test abort reaches every sink even when one of them raises"""
+        failing, remaining = Mock(), Mock()
+        failing.abort.side_effect = OSError("gone")
+        stream = SinkStream([failing, remaining])
+
+        stream.abort()
+        stream.close()
+
+        remaining.abort.assert_called_once_with(remaining.open.return_value)
+        failing.commit.assert_not_called()
+
+    def test_requires_a_sink(self):
+        """Test an output without any destination is rejected"""
+        with pytest.raises(ValueError):
+            SinkStream([])
+
+
+class TestProcessorSinks:
+    """Test cases for writing processor output to sinks"""
+
+    def test_batch_processor_uploads_while_writing(self, fake_gcs, input_file, temp_dir):
+        """Test the uploaded CSV is byte-identical to the local one"""
+        output_file = os.path.join(temp_dir, "basic_titles.csv")
+        sinks = [LocalFileSink(output_file), GCSBlobSink("test-bucket", "basic_titles.csv")]
+
+        processor = BatchProcessor(input_file, output_file, 1, ['tconst', 'primaryTitle'], sinks=sinks)
+        processor.process()
+
+        with open(output_file, 'rb') as f:
+            local = f.read()
+        assert fake_gcs.bucket("test-bucket").objects["basic_titles.csv"] == local
+        assert processor.stats['bytes_written'] == len(local)
+
+    def test_batch_processor_parquet_to_bucket_only(self, fake_gcs, input_file, temp_dir):
+        """Test Parquet output can go to the bucket without a local copy"""
+        output_file = os.path.join(temp_dir, "basic_titles.parquet")
+
+        BatchProcessor(input_file, output_file, 2, ['tconst', 'startYear'],
+                       sinks=[GCSBlobSink("test-bucket", "basic_titles.parquet")]).process()
+
+        assert not os.path.exists(output_file)
+        data = fake_gcs.bucket("test-bucket").objects["basic_titles.parquet"]
+        table = pq.read_table(io.BytesIO(data))
+        assert table.column('tconst').to_pylist() == ['tt0000001', 'tt0000002', 'tt0000003']
+
+    def test_failed_processing_uploads_nothing(self, fake_gcs, input_file, temp_dir):
+        """Test an error while parsing does not publish a truncated object"""
+        output_file = os.path.join(temp_dir, "basic_titles.csv")
+        processor = BatchProcessor(input_file, output_file, 1, ['tconst'],
+                                   sinks=[GCSBlobSink("test-bucket", "basic_titles.csv")])
+
+        def failing_chunks(usecols=None):
+            yield pd.DataFrame({'tconst': ['tt0000001']})
+            raise RuntimeError("boom")
+
+        with patch.object(processor, '_read_chunks', side_effect=failing_chunks):
+            with pytest.raises(RuntimeError):
+                processor.process()
+
+        assert fake_gcs.bucket("test-bucket").objects == {}
+
+    def test_parallel_processor_uploads_merged_output(self, fake_gcs, input_file, temp_dir):
+        """Test the merged parts are uploaded as one object"""
+        output_file = os.path.join(temp_dir, "basic_titles.csv")
+        sinks = [LocalFileSink(output_file), GCSBlobSink("test-bucket", "basic_titles.csv")]
+
+        ParallelBatchProcessor(input_file, output_file, ['tconst', 'titleType'], workers=2, range_size=40,
+                               sinks=sinks).process()
+
+        with open(output_file, 'rb') as f:
+            assert fake_gcs.bucket("test-bucket").objects["basic_titles.csv"] == f.read()
+
+    def test_dataset_loader_without_local_copy(self, fake_gcs, temp_dir):
+        """Test DatasetLoader builds a bucket-only sink list"""
+        loader = DatasetLoader('https://datasets.imdbws.com/title.basics.tsv.gz', ['tconst'],
+                               os.path.join(temp_dir, "basic_titles.csv"), upload_bucket="test-bucket",
+                               keep_local=False)
+
+        assert [repr(sink) for sink in loader.sinks()] == ["gs://test-bucket/basic_titles.csv"]
+
+    def test_dataset_loader_needs_a_destination(self, temp_dir):
+        """Test keep_local=False without a bucket is rejected"""
+        with pytest.raises(ValueError):
+            DatasetLoader('https://datasets.imdbws.com/title.basics.tsv.gz', ['tconst'],
+                          os.path.join(temp_dir, "basic_titles.csv"), keep_local=False)
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
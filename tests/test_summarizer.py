@@ -1,6 +1,15 @@
 import pytest
+import asyncio
+import json
+import re
+import time
 from unittest.mock import Mock, patch
-from scripts.summarizer import MovieSummarizer
+from scripts.hedging import HedgePolicy
+from scripts.jsonl_writer import JsonlWriter
+from scripts.rate_limiter import RateLimiter
+from scripts.summarizer import MovieSummarizer, PROMPT_VERSION, SummarizationError
+from scripts.summary_cache import SummaryCache, movie_key
+from tests.stub_openai import StubOpenAIServer
 
 
 class TestMovieSummarizer:
@@ -45,4 +54,457 @@ class TestMovieSummarizer:
         
         assert len(results) == 2
         assert all(result == "Movie summary" for result in results)
-        assert mock_client.chat.completions.create.call_count == 4 
\ No newline at end of file
+        assert mock_client.chat.completions.create.call_count == 4 
+    @patch('scripts.summarizer.OpenAI')
+    def test_valid_answer_skips_refinement(self, mock_openai_class, sample_movies):
+        """Test an answer that normalizes to 5-10 dictionary tags needs only one call"""
+        mock_client = Mock()
+        mock_response = Mock()
+        mock_response.choices = [Mock()]
+        mock_response.choices[0].message.content = "Redemption, hopefull, slow burn, intimate, neo-noir, bleak"
+        mock_client.chat.completions.create.return_value = mock_response
+        mock_openai_class.return_value = mock_client
+        
+        summarizer = MovieSummarizer()
+        result = summarizer._summarize_single_movie(sample_movies[0])
+        
+        assert result == "redemption, slow-burn, intimate, gritty, bleak"
+        assert mock_client.chat.completions.create.call_count == 1
+        assert summarizer.refinement_calls == 0
+    
+    @patch('scripts.summarizer.OpenAI')
+    def test_invalid_answer_is_refined_and_normalized(self, mock_openai_class, sample_movies):
+        """Test too few valid tags triggers the refinement call, whose answer is normalized"""
+        first, refined = Mock(), Mock()
+        first.choices = [Mock()]
+        first.choices[0].message.content = "hopeful, prison drama"
+        refined.choices = [Mock()]
+        refined.choices[0].message.content = "Redemption, uplifting, tense, intimate, Character study"
+        mock_client = Mock()
+        mock_client.chat.completions.create.side_effect = [first, refined]
+        mock_openai_class.return_value = mock_client
+        
+        summarizer = MovieSummarizer()
+        result = summarizer._summarize_single_movie(sample_movies[0])
+        
+        assert result == "redemption, uplifting, tense, intimate, character-study"
+        assert mock_client.chat.completions.create.call_count == 2
+        assert summarizer.refinement_calls == 1
+
+
+@pytest.fixture
+def stub_openai(monkeypatch):
+    """Run a local chat completions stub and point the OpenAI clients at it"""
+    with StubOpenAIServer(latency=0.2) as server:
+        monkeypatch.setenv("OPENAI_BASE_URL", server.url)
+        monkeypatch.setenv("OPENAI_API_KEY", "test-key")
+        yield server
+
+
+@pytest.fixture
+def limiter():
+    """A limiter that gives up on the first error instead of backing off for minutes"""
+    return RateLimiter(max_retries=1, backoff_seconds=0)
+
+
+class TestAsyncSummarizer:
+    """Test cases for the asyncio engine against a local stub server"""
+    
+    @pytest.fixture
+    def many_movies(self):
+        return [{'primaryTitle': f'Movie {i}', 'startYear': 1950 + i} for i in range(40)]
+    
+    def test_results_keep_input_order(self, stub_openai, many_movies):
+        """Test results line up with the input even though requests finish out of order"""
+        stub_openai.latency = lambda body: 0.05 * (hash(body["messages"][-1]["content"]) % 5)
+        
+        results = MovieSummarizer(concurrency=40).summarize_concurrently(many_movies)
+        
+        assert len(results) == 40
+        for movie, result in zip(many_movies, results):
+            assert f'"{movie["primaryTitle"]}" ({movie["startYear"]})' in result
+        assert len(stub_openai.requests) == 80
+    
+    def test_requests_overlap_up_to_concurrency(self, stub_openai, many_movies):
+        """Test requests overlap without ever exceeding the concurrency limit"""
+        started = time.monotonic()
+        
+        MovieSummarizer(concurrency=20).summarize_concurrently(many_movies)
+        
+        assert 5 < stub_openai.peak_in_flight <= 20
+        # 80 requests of 0.2 s each, 20 at a time: about 0.8 s instead of 16 s one by one
+        assert time.monotonic() - started < 8
+    
+    def test_failed_movie_is_requeued(self, stub_openai, many_movies, limiter):
+        """Test a movie whose call failed is sent again after the others instead of being dropped"""
+        failed = []
+        def respond(body):
+            if '"Movie 3"' in body["messages"][-1]["content"] and not failed:
+                failed.append(body)
+                raise RuntimeError("boom")
+            return body["messages"][-1]["content"]
+        stub_openai.respond = respond
+        
+        results = MovieSummarizer(concurrency=10, limiter=limiter).summarize_concurrently(many_movies[:5])
+        
+        assert '"Movie 3"' in results[3]
+        assert len(failed) == 1
+    
+    def test_persistent_failure_fails_the_run(self, stub_openai, many_movies, limiter, tmp_path):
+        """Test a movie failing every pass raises instead of leaving a placeholder row"""
+        def respond(body):
+            if '"Movie 3"' in body["messages"][-1]["content"]:
+                raise RuntimeError("boom")
+            return TestHedgedRequests.TAGS
+        stub_openai.respond = respond
+        cache_path = str(tmp_path / "summaries.sqlite")
+        
+        with pytest.raises(SummarizationError, match="1/5 movies"):
+            MovieSummarizer(concurrency=10, limiter=limiter, cache_path=cache_path).summarize_concurrently(
+                many_movies[:5])
+        
+        # Everything else is kept, so the rerun only pays for the failed movie
+        assert len(SummaryCache(cache_path, 'gpt-4.1-nano', PROMPT_VERSION)) == 4
+    
+    def test_cancellation_stops_outstanding_requests(self, stub_openai, many_movies):
+        """Test cancelling the run cancels every movie still waiting or in flight"""
+        stub_openai.latency = lambda body: 1.0
+        summarizer = MovieSummarizer(concurrency=5)
+        
+        async def run_and_cancel():
+            task = asyncio.create_task(summarizer.summarize_async(many_movies))
+            await asyncio.sleep(0.3)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        
+        started = time.monotonic()
+        asyncio.run(run_and_cancel())
+        
+        assert time.monotonic() - started < 2
+        assert len(stub_openai.requests) == 5
+
+
+class TestHedgedRequests:
+    """Test cases for hedging slow calls in the summarizer"""
+    
+    TAGS = "redemption, tense, intimate, bleak, slow-burn"
+    
+    @pytest.fixture
+    def slow_movie(self, stub_openai):
+        """The first request for Movie 9 takes 2 s, every other one 10 ms"""
+        def latency(body):
+            content = body["messages"][-1]["content"]
+            first = sum('"Movie 9"' in request["messages"][-1]["content"] for request in stub_openai.requests) == 1
+            return 2.0 if '"Movie 9"' in content and first else 0.01
+        stub_openai.latency = latency
+        stub_openai.respond = lambda body: self.TAGS
+    
+    def test_thread_engine_hedges_the_straggler(self, stub_openai, slow_movie, limiter):
+        """Test one slow completion no longer sets the wall time of summarize_in_parallel"""
+        hedging = HedgePolicy(min_samples=5, max_hedge_rate=0.5)
+        movies = [{'primaryTitle': f'Movie {i}', 'startYear': 1950 + i} for i in range(10)]
+        summarizer = MovieSummarizer(max_workers=1, limiter=limiter, hedging=hedging)
+        
+        started = time.monotonic()
+        results = summarizer.summarize_in_parallel(movies)
+        
+        assert results == [self.TAGS] * 10
+        assert time.monotonic() - started < 1.5
+        # Timing jitter may hedge a fast call too, but the straggler must have been duplicated
+        assert sum('"Movie 9"' in request["messages"][-1]["content"] for request in stub_openai.requests) == 2
+        assert hedging.stats['hedges_won'] >= 1
+    
+    def test_async_engine_hedges_the_straggler(self, stub_openai, slow_movie):
+        """Test the async engine sends the hedge to the cheaper model and cancels the original"""
+        hedging = HedgePolicy(min_samples=5, max_hedge_rate=0.5, hedge_model='gpt-4.1-mini')
+        movies = [{'primaryTitle': f'Movie {i}', 'startYear': 1950 + i} for i in range(10)]
+        
+        started = time.monotonic()
+        results = MovieSummarizer(concurrency=1, hedging=hedging).summarize_concurrently(movies)
+        
+        assert results == [self.TAGS] * 10
+        assert time.monotonic() - started < 1.5
+        assert stub_openai.requests[-1]["model"] == 'gpt-4.1-mini'
+        assert hedging.stats['hedges_won'] >= 1
+
+
+class TestStreamingOutput:
+    """Test cases for writing summaries as they complete"""
+    
+    TAGS = "redemption, tense, intimate, bleak, slow-burn"
+    
+    @staticmethod
+    def read_lines(path):
+        with open(path) as f:
+            return [json.loads(line) for line in f]
+    
+    def test_rows_are_pulled_as_slots_free_up(self, stub_openai, tmp_path):
+        """Test the input iterator is never read far ahead of what has been written"""
+        stub_openai.respond = lambda body: self.TAGS
+        stub_openai.latency = lambda body: 0.01
+        output_path = str(tmp_path / "enhanced.json")
+        ahead = []
+        
+        with JsonlWriter(output_path) as writer:
+            def rows():
+                for i in range(60):
+                    ahead.append(i - writer.lines)
+                    yield {'tconst': f'tt{i:07d}', 'primaryTitle': f'Movie {i}', 'startYear': 1950 + i}
+            
+            total = asyncio.run(MovieSummarizer(concurrency=5).summarize_stream_async(rows(), writer))
+        
+        lines = self.read_lines(output_path)
+        assert total == 60
+        assert sorted(line['tconst'] for line in lines) == [f'tt{i:07d}' for i in range(60)]
+        assert all(line['summary'] == self.TAGS for line in lines)
+        assert max(ahead) <= 5
+    
+    def test_lines_are_readable_before_the_run_ends(self, stub_openai, tmp_path):
+        """Test a reader tailing the output sees finished movies while others are still in flight"""
+        stub_openai.respond = lambda body: self.TAGS
+        stub_openai.latency = lambda body: 1.0 if '"Movie 0"' in body["messages"][-1]["content"] else 0.0
+        output_path = str(tmp_path / "enhanced.json")
+        movies = [{'primaryTitle': f'Movie {i}', 'startYear': 1950 + i} for i in range(4)]
+        seen_early = []
+        
+        async def run_and_tail():
+            with JsonlWriter(output_path) as writer:
+                task = asyncio.create_task(MovieSummarizer(concurrency=4).summarize_stream_async(movies, writer))
+                await asyncio.sleep(0.5)
+                seen_early.extend(self.read_lines(output_path))
+                await task
+        
+        asyncio.run(run_and_tail())
+        
+        assert {line['primaryTitle'] for line in seen_early} == {'Movie 1', 'Movie 2', 'Movie 3'}
+        assert len(self.read_lines(output_path)) == 4
+    
+    def test_persistent_failure_keeps_the_other_rows(self, stub_openai, tmp_path, limiter):
+        """Test a movie failing every pass raises after the rest have been written"""
+        def respond(body):
+            if '"Movie 1"' in body["messages"][-1]["content"]:
+                raise RuntimeError("boom")
+            return self.TAGS
+        stub_openai.respond = respond
+        stub_openai.latency = lambda body: 0.0
+        output_path = str(tmp_path / "enhanced.json")
+        movies = [{'primaryTitle': f'Movie {i}', 'startYear': 1950 + i} for i in range(3)]
+        
+        with pytest.raises(SummarizationError, match="1/3 movies"):
+            with JsonlWriter(output_path) as writer:
+                asyncio.run(MovieSummarizer(limiter=limiter).summarize_stream_async(iter(movies), writer))
+        
+        assert {line['primaryTitle'] for line in self.read_lines(output_path)} == {'Movie 0', 'Movie 2'}
+    
+    def test_batched_prompts_are_streamed(self, stub_openai, tmp_path):
+        """Test batch_size groups streamed rows into shared requests"""
+        stub_openai.respond = lambda body: json.dumps({i: self.TAGS for i in TestBatchedPrompts.ids(body)})
+        output_path = str(tmp_path / "enhanced.json")
+        movies = [{'primaryTitle': f'Movie {i}', 'startYear': 1950 + i} for i in range(10)]
+        
+        with JsonlWriter(output_path) as writer:
+            asyncio.run(MovieSummarizer(batch_size=4).summarize_stream_async(iter(movies), writer))
+        
+        assert len(self.read_lines(output_path)) == 10
+        assert len(stub_openai.requests) == 3
+    
+    def test_summarize_dataset_streams_the_csv(self, stub_openai, tmp_path):
+        """Test every CSV column is written with the summary and missing values become null"""
+        stub_openai.respond = lambda body: self.TAGS
+        stub_openai.latency = lambda body: 0.0
+        data_path = tmp_path / "top_rated_weighted.csv"
+        rows = ["tconst,titleType,primaryTitle,startYear,genres,averageRating,numVotes,weightedRating"]
+        rows += [f'tt000000{i},movie,"Movie {i}",{1990 + i},Drama,8.5,{1000 + i},7.{i}' for i in range(5)]
+        rows += ['tt0000009,movie,"No Year",,Drama,8.5,1000,7.0']
+        data_path.write_text("\n".join(rows) + "\n")
+        output_path = str(tmp_path / "enhanced.json")
+        
+        MovieSummarizer().summarize_dataset(str(data_path), output_path)
+        
+        lines = {line['tconst']: line for line in self.read_lines(output_path)}
+        assert len(lines) == 6
+        assert lines['tt0000003'] == {
+            'tconst': 'tt0000003', 'titleType': 'movie', 'primaryTitle': 'Movie 3', 'startYear': 1993,
+            'genres': 'Drama', 'averageRating': 8.5, 'numVotes': 1003, 'weightedRating': 7.3,
+            'summary': self.TAGS,
+        }
+        assert lines['tt0000009']['startYear'] is None
+
+
+class TestCallMetrics:
+    """Test cases for the API call accounting of the summarizer"""
+    
+    def test_calls_are_split_by_type(self, stub_openai):
+        """Test summary and refinement calls are counted separately with their tokens"""
+        def respond(body):
+            if "Original input" in body["messages"][-1]["content"]:
+                return "redemption, tense, intimate, bleak, slow-burn"
+            return "hopeful, prison drama"
+        stub_openai.respond = respond
+        stub_openai.latency = lambda body: 0.0
+        movies = [{'primaryTitle': f'Movie {i}', 'startYear': 1950 + i} for i in range(3)]
+        summarizer = MovieSummarizer()
+        
+        summarizer.summarize_concurrently(movies)
+        
+        report = summarizer.metrics.report()
+        assert report["call_types"]["summary"]["calls"] == 3
+        assert report["call_types"]["refinement"]["calls"] == 3
+        assert report["call_types"]["summary"]["completion_tokens"] == 3 * (len("hopeful, prison drama") // 4)
+        assert report["total"]["cost_usd"] > 0
+    
+    def test_summarize_dataset_writes_the_report(self, stub_openai, tmp_path):
+        """Test the JSON report and Prometheus file are written next to each other"""
+        stub_openai.respond = lambda body: "redemption, tense, intimate, bleak, slow-burn"
+        stub_openai.latency = lambda body: 0.0
+        data_path = tmp_path / "top_rated_weighted.csv"
+        data_path.write_text("tconst,titleType,primaryTitle,startYear,genres,averageRating,numVotes,weightedRating\n"
+                             'tt0000001,movie,"Movie 1",1991,Drama,8.5,1000,7.1\n')
+        metrics_path = tmp_path / "summarize_metrics.json"
+        
+        MovieSummarizer().summarize_dataset(str(data_path), str(tmp_path / "enhanced.json"),
+                                            metrics_path=str(metrics_path))
+        
+        assert json.loads(metrics_path.read_text())["call_types"]["summary"]["calls"] == 1
+        assert 'llm_calls_total{call_type="summary"} 1' in (tmp_path / "summarize_metrics.prom").read_text()
+
+
+class TestBatchedPrompts:
+    """Test cases for multi-movie prompts on the asyncio engine"""
+    
+    TAGS = "redemption, tense, intimate, bleak, slow-burn"
+    
+    @pytest.fixture
+    def movies(self):
+        return [{'primaryTitle': f'Movie {i}', 'startYear': 1950 + i} for i in range(10)]
+    
+    @staticmethod
+    def ids(body):
+        return re.findall(r'^(\d+): "', body["messages"][-1]["content"], re.MULTILINE)
+    
+    def test_movies_share_requests(self, stub_openai, movies):
+        """Test a batch of movies is answered by one JSON request"""
+        stub_openai.respond = lambda body: json.dumps({i: self.TAGS for i in self.ids(body)})
+        
+        results = MovieSummarizer(batch_size=4).summarize_concurrently(movies)
+        
+        assert results == [self.TAGS] * 10
+        assert len(stub_openai.requests) == 3
+        assert stub_openai.requests[0]["response_format"] == {"type": "json_object"}
+        assert self.ids(stub_openai.requests[0]) == ['0', '1', '2', '3']
+    
+    def test_only_failed_entries_are_requeued(self, stub_openai, movies):
+        """Test a missing or invalid entry is re-sent alone while the rest of its batch is kept"""
+        def respond(body):
+            answers = {i: self.TAGS.split(", ") for i in self.ids(body)}
+            if len(stub_openai.requests) == 1:
+                answers['2'] = "gibberish"
+                del answers['3']
+            return json.dumps(answers)
+        stub_openai.respond = respond
+        stub_openai.latency = lambda body: 0.0
+        
+        results = MovieSummarizer(batch_size=5, concurrency=1).summarize_concurrently(movies)
+        
+        assert results == [self.TAGS] * 10
+        assert len(stub_openai.requests) == 3
+        assert self.ids(stub_openai.requests[2]) == ['2', '3']
+    
+    def test_unparseable_batch_falls_back_to_single_movies(self, stub_openai, movies):
+        """Test movies whose batches keep failing are summarized one by one"""
+        def respond(body):
+            if "response_format" in body:
+                return "not json"
+            return self.TAGS
+        stub_openai.respond = respond
+        stub_openai.latency = lambda body: 0.0
+        
+        results = MovieSummarizer(batch_size=5, batch_attempts=1).summarize_concurrently(movies[:3])
+        
+        assert results == [self.TAGS] * 3
+        assert len(stub_openai.requests) == 1 + 3
+
+
+class TestSummaryCache:
+    """Test cases for the persistent summary cache"""
+    
+    @pytest.fixture
+    def cache_path(self, tmp_path):
+        return str(tmp_path / "summaries.sqlite")
+    
+    @pytest.fixture
+    def movies(self):
+        return [
+            {'tconst': 'tt0111161', 'primaryTitle': 'The Shawshank Redemption', 'startYear': 1994},
+            {'tconst': 'tt0068646', 'primaryTitle': 'The Godfather', 'startYear': 1972},
+        ]
+    
+    @pytest.fixture(autouse=True)
+    def valid_tags(self, stub_openai):
+        """Answer with tags that normalize, since only those are cached"""
+        stub_openai.respond = lambda body: TestHedgedRequests.TAGS
+    
+    def test_rerun_only_calls_api_for_misses(self, stub_openai, movies, cache_path):
+        """Test a second run answers cached movies without any request"""
+        first = MovieSummarizer(cache_path=cache_path).summarize_concurrently(movies[:1])
+        assert len(stub_openai.requests) == 1
+        
+        summarizer = MovieSummarizer(cache_path=cache_path)
+        second = summarizer.summarize_concurrently(movies)
+        
+        assert second[0] == first[0]
+        assert summarizer.cache_hits == 1
+        assert len(stub_openai.requests) == 2
+    
+    def test_thread_engine_uses_cache(self, stub_openai, movies, cache_path):
+        """Test summarize_in_parallel reads and fills the same cache"""
+        MovieSummarizer(cache_path=cache_path).summarize_in_parallel(movies)
+        
+        summarizer = MovieSummarizer(cache_path=cache_path)
+        summarizer.summarize_concurrently(movies)
+        
+        assert summarizer.cache_hits == 2
+        assert len(stub_openai.requests) == 2
+    
+    def test_failures_are_not_cached(self, stub_openai, movies, cache_path, limiter):
+        """Test a movie that failed is retried on the next run"""
+        stub_openai.respond = Mock(side_effect=RuntimeError("boom"))
+        with pytest.raises(SummarizationError):
+            MovieSummarizer(cache_path=cache_path, limiter=limiter).summarize_concurrently(movies[:1])
+        
+        assert len(SummaryCache(cache_path, 'gpt-4.1-nano', PROMPT_VERSION)) == 0
+    
+    def test_invalid_answers_are_not_cached(self, stub_openai, movies, cache_path):
+        """Test a refined answer that still does not normalize is returned but asked again next run"""
+        stub_openai.respond = lambda body: "Great movie about hope."
+        
+        results = MovieSummarizer(cache_path=cache_path).summarize_concurrently(movies[:1])
+        
+        assert results == ["Great movie about hope."]
+        assert len(SummaryCache(cache_path, 'gpt-4.1-nano', PROMPT_VERSION)) == 0
+    
+    def test_hedge_answers_are_cached_under_the_hedge_model(self, stub_openai, movies, cache_path):
+        """Test a summary from the hedge model is not reused as if the primary model had written it"""
+        stub_openai.latency = lambda body: 2.0 if body["model"] == 'gpt-4.1-nano' else 0.01
+        stub_openai.respond = lambda body: TestHedgedRequests.TAGS
+        hedging = HedgePolicy(min_samples=1, max_hedge_rate=1.0, hedge_model='gpt-4.1-mini')
+        hedging.record(0.01)
+        
+        MovieSummarizer(cache_path=cache_path, hedging=hedging).summarize_concurrently(movies[:1])
+        
+        assert SummaryCache(cache_path, 'gpt-4.1-mini', PROMPT_VERSION).get(movies[0]) == TestHedgedRequests.TAGS
+        assert SummaryCache(cache_path, 'gpt-4.1-nano', PROMPT_VERSION).get(movies[0]) is None
+        
+    def test_key_includes_model_and_prompt_version(self, movies, cache_path):
+        """Test summaries from another model or prompt are not reused"""
+        SummaryCache(cache_path, 'gpt-4.1-nano', PROMPT_VERSION).put(movies[0], "tense, gritty")
+        
+        assert SummaryCache(cache_path, 'gpt-4.1-nano', PROMPT_VERSION).get(movies[0]) == "tense, gritty"
+        assert SummaryCache(cache_path, 'gpt-4o', PROMPT_VERSION).get(movies[0]) is None
+        assert SummaryCache(cache_path, 'gpt-4.1-nano', 'older-prompts').get(movies[0]) is None
+    
+    def test_movie_key_falls_back_to_title_and_year(self):
+        """Test rows without a tconst are keyed by title and year"""
+        assert movie_key({'tconst': 'tt0111161', 'primaryTitle': 'X', 'startYear': 1994}) == 'tt0111161'
+        assert movie_key({'primaryTitle': 'The Godfather', 'startYear': 1972}) == 'The Godfather|1972'
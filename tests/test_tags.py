@@ -0,0 +1,60 @@
+import pytest
+from scripts.dictionary import DICTIONARY
+from scripts.tags import TagNormalizer, canonical, edit_distance
+
+
+class TestTagNormalizer:
+    """Test cases for TagNormalizer"""
+    
+    @pytest.fixture
+    def normalizer(self):
+        return TagNormalizer()
+    
+    def test_dictionary_words_pass_through(self, normalizer):
+        """Test every dictionary word maps to itself"""
+        assert all(normalizer.normalize_tag(word) == word for word in DICTIONARY)
+    
+    def test_formatting_is_ignored(self, normalizer):
+        """Test case, quotes, numbering and spaces do not matter"""
+        assert normalizer.normalize_tag(' "Slow burn".') == 'slow-burn'
+        assert normalizer.normalize_tag('1. Tense') == 'tense'
+    
+    def test_synonyms_are_mapped(self, normalizer):
+        """Test words from the semantic mapping resolve to their dictionary word"""
+        assert normalizer.normalize_tag('neo-noir') == 'gritty'
+        assert normalizer.normalize_tag('emotionally evocative') == 'thought-provoking'
+        assert normalizer.normalize_tag('None') is None
+    
+    def test_misspellings_are_matched_fuzzily(self, normalizer):
+        """Test near misses resolve through the n-gram index"""
+        assert normalizer.normalize_tag('lightheartd') == 'lighthearted'
+        assert normalizer.normalize_tag('heart-warming') == 'heartwarming'
+        assert normalizer.normalize_tag('dark comic') == 'darkly-comic'
+        assert normalizer.normalize_tag('sci fi') == 'mind-bending'
+    
+    def test_unrelated_words_are_rejected(self, normalizer):
+        """Test words far from every dictionary entry are dropped"""
+        assert normalizer.normalize_tag('romance') is None
+        assert normalizer.normalize_tag('great movie about hope') is None
+    
+    def test_normalize_deduplicates_and_caps(self, normalizer):
+        """Test an answer becomes distinct tags in order, at most ten"""
+        answer = "tense, Tense, neo-noir, gritty, " + ", ".join(DICTIONARY[:12])
+        
+        tags = normalizer.normalize(answer)
+        
+        assert tags[:2] == ['tense', 'gritty']
+        assert len(tags) == 10
+        assert len(set(tags)) == 10
+    
+    def test_is_valid_requires_five_to_ten(self, normalizer):
+        """Test the tag count bounds of the summary prompt"""
+        assert not normalizer.is_valid(DICTIONARY[:4])
+        assert normalizer.is_valid(DICTIONARY[:5])
+        assert normalizer.is_valid(DICTIONARY[:10])
+    
+    def test_helpers(self):
+        """Test canonical form and edit distance"""
+        assert canonical("  Forbidden Love ") == "forbidden-love"
+        assert edit_distance("kitten", "sitting") == 3
+        assert edit_distance("", "abc") == 3
@@ -8,9 +8,26 @@ import pytest
 import os
 import tempfile
 import shutil
+import io
+import gzip
+import base64
+import hashlib
+import pyarrow as pa
 from unittest.mock import Mock, patch, MagicMock
+from google.auth.credentials import AnonymousCredentials
+from google.auth.transport.requests import AuthorizedSession
 from google.cloud.exceptions import GoogleCloudError
+from scripts.file_hashes import FileHashCache
 from scripts.gc_uploader import GCSUploader, upload_all_datasets
+from tests.fake_gcs import FakeGCSClient
+
+
+@pytest.fixture(autouse=True)
+def default_credentials():
+    """Answer google.auth.default() without looking for real credentials"""
+    with patch('scripts.gc_uploader.google.auth.default',
+               return_value=(AnonymousCredentials(), "test-project")) as default:
+        yield default
 
 
 @pytest.fixture
@@ -57,6 +74,15 @@ def mock_gcs_client():
         }
 
 
+@pytest.fixture
+def fake_gcs():
+    """Route storage.Client() to an in-memory fake"""
+    fake_client = FakeGCSClient()
+    with patch('scripts.gc_uploader.storage.Client', return_value=fake_client) as client_class:
+        fake_client.client_class = client_class
+        yield fake_client
+
+
 class TestGCSUploader:
     """Test cases for GCSUploader class"""
     
@@ -203,6 +229,298 @@ class TestGCSUploader:
         assert GCSUploader._format_size(1024 * 1024 * 1024) == "1.0 GB"
 
 
+class TestConcurrentUploads:
+    """Test cases for concurrent uploads against the in-memory GCS stand-in"""
+    
+    def test_concurrent_upload_uploads_all_files(self, fake_gcs, sample_files):
+        """Test every file lands in the bucket through one shared client"""
+        uploader = GCSUploader("test-bucket", max_workers=4)
+        file_mappings = [(path, name) for name, path in sample_files.items()]
+        
+        uploaded = uploader.upload_multiple_files(file_mappings, concurrent=True)
+        
+        assert uploaded == [f"gs://test-bucket/{name}" for _, name in file_mappings]
+        assert set(fake_gcs.bucket("test-bucket").objects) == set(sample_files)
+        fake_gcs.client_class.assert_called_once()
+        assert uploader.last_report['files'] == 4
+        assert uploader.last_report['bytes'] == sum(os.path.getsize(p) for p in sample_files.values())
+    
+    @patch('scripts.gc_uploader.time.sleep')
+    def test_transient_failure_is_retried(self, mock_sleep, fake_gcs, sample_files):
+        """Test a file that fails twice is retried with growing backoff"""
+        fake_gcs.failures = {"crew.csv": 2}
+        uploader = GCSUploader("test-bucket", max_workers=2, max_retries=3, backoff_seconds=1.0)
+        
+        uploaded = uploader.upload_multiple_files([(sample_files["crew.csv"], "crew.csv")], concurrent=True)
+        
+        assert uploaded == ["gs://test-bucket/crew.csv"]
+        assert fake_gcs.calls.count("crew.csv") == 3
+        delays = [call.args[0] for call in mock_sleep.call_args_list]
+        assert len(delays) == 2
+        assert 0.5 <= delays[0] <= 1.5
+        assert 1.0 <= delays[1] <= 3.0
+    
+    @patch('scripts.gc_uploader.time.sleep')
+    def test_persistent_failure_is_skipped(self, mock_sleep, fake_gcs, sample_files):
+        """Test a file that keeps failing is reported and the rest still upload"""
+        fake_gcs.failures = {"crew.csv": 10}
+        uploader = GCSUploader("test-bucket", max_workers=2, max_retries=2)
+        file_mappings = [(sample_files["crew.csv"], "crew.csv"), (sample_files["ratings.csv"], "ratings.csv")]
+        
+        uploaded = uploader.upload_multiple_files(file_mappings, concurrent=True)
+        
+        assert uploaded == ["gs://test-bucket/ratings.csv"]
+        assert fake_gcs.calls.count("crew.csv") == 2
+        assert uploader.last_report['failed'] == 1
+    
+    def test_connection_pool_is_sized_for_workers(self, mock_gcs_client):
+        """Test the client is given an HTTP session with a connection per upload thread"""
+        uploader = GCSUploader("test-bucket", max_workers=32)
+        uploader._init_client()
+        
+        session = mock_gcs_client['client_class'].call_args.kwargs['_http']
+        assert isinstance(session, AuthorizedSession)
+        assert session.get_adapter("https://storage.googleapis.com")._pool_maxsize == 32
+    
+    def test_upload_all_datasets_with_workers(self, fake_gcs, sample_files, temp_dir):
+        """Test upload_all_datasets uploads through the pool when workers > 1"""
+        upload_all_datasets("test-bucket", temp_dir, workers=2)
+        
+        assert set(fake_gcs.bucket("test-bucket").objects) == {"basic_titles.csv", "ratings.csv"}
+    
+    @patch('scripts.gc_uploader.time.sleep')
+    def test_upload_all_datasets_raises_on_failure(self, mock_sleep, fake_gcs, sample_files, temp_dir):
+        """Test a failed concurrent upload still fails the command"""
+        fake_gcs.failures = {"ratings.csv": 10}
+        
+        with pytest.raises(GoogleCloudError):
+            upload_all_datasets("test-bucket", temp_dir, workers=2)
+
+
+class TestCompositeUploads:
+    """Test cases for parallel composite uploads against the in-memory GCS stand-in"""
+    
+    @pytest.fixture
+    def large_file(self, temp_dir):
+        path = os.path.join(temp_dir, "principals.csv")
+        with open(path, 'wb') as f:
+            f.write(os.urandom(1000))
+        with open(path, 'rb') as f:
+            return path, f.read()
+    
+    def test_large_file_is_composed_from_parts(self, fake_gcs, large_file):
+        """Test a file above the threshold arrives intact and its parts are removed"""
+        path, data = large_file
+        uploader = GCSUploader("test-bucket", composite_threshold=500, part_size=300)
+        
+        uploader.upload_file(path, "principals.csv")
+        
+        objects = fake_gcs.bucket("test-bucket").objects
+        assert objects == {"principals.csv": data}
+        assert len([name for name in fake_gcs.calls if ".parts-" in name]) == 4
+        assert fake_gcs.composes == [4]
+    
+    def test_many_parts_are_composed_in_rounds(self, fake_gcs, large_file):
+        """Test more than 32 parts are composed through intermediate objects"""
+        path, data = large_file
+        uploader = GCSUploader("test-bucket", composite_threshold=0, part_size=10)
+        
+        uploader.upload_file(path, "principals.csv")
+        
+        assert fake_gcs.bucket("test-bucket").objects == {"principals.csv": data}
+        assert fake_gcs.composes == [32, 32, 32, 4, 4]
+    
+    @patch('scripts.gc_uploader.time.sleep')
+    def test_failed_part_is_retried_alone(self, mock_sleep, fake_gcs, large_file):
+        """Test a transient failure re-sends only the affected part"""
+        path, data = large_file
+        fake_gcs.failures = {"00001": 1}
+        uploader = GCSUploader("test-bucket", composite_threshold=500, part_size=300)
+        
+        uploader.upload_file(path, "principals.csv")
+        
+        assert fake_gcs.bucket("test-bucket").objects == {"principals.csv": data}
+        part_calls = [name for name in fake_gcs.calls if ".parts-" in name]
+        assert len(part_calls) == 5
+        assert sum(name.endswith("00001") for name in part_calls) == 2
+        mock_sleep.assert_called_once()
+    
+    @patch('scripts.gc_uploader.time.sleep')
+    def test_concurrent_upload_does_not_retry_the_whole_composite(self, mock_sleep, fake_gcs, large_file):
+        """Test a part that keeps failing is tried max_retries times, not once per retry of the file"""
+        path, _ = large_file
+        fake_gcs.failures = {"00002": 10}
+        uploader = GCSUploader("test-bucket", composite_threshold=500, part_size=300, max_retries=2)
+        
+        uploaded = uploader.upload_multiple_files([(path, "principals.csv")], concurrent=True)
+        
+        assert uploaded == []
+        assert sum(name.endswith("00002") for name in fake_gcs.calls) == 2
+        assert sum(name.endswith("00000") for name in fake_gcs.calls) == 1
+    
+    @patch('scripts.gc_uploader.time.sleep')
+    def test_failed_upload_cleans_up_parts(self, mock_sleep, fake_gcs, large_file):
+        """Test parts that did upload are deleted when another part keeps failing"""
+        path, _ = large_file
+        fake_gcs.failures = {"00002": 10}
+        uploader = GCSUploader("test-bucket", composite_threshold=500, part_size=300, max_retries=2)
+        
+        with pytest.raises(GoogleCloudError):
+            uploader.upload_file(path, "principals.csv")
+        
+        assert fake_gcs.bucket("test-bucket").objects == {}
+    
+    def test_small_file_uses_single_stream(self, fake_gcs, large_file):
+        """Test a file below the threshold is uploaded in one request"""
+        path, data = large_file
+        uploader = GCSUploader("test-bucket", composite_threshold=2000)
+        
+        uploader.upload_file(path, "principals.csv")
+        
+        assert fake_gcs.calls == ["principals.csv"]
+        assert fake_gcs.composes == []
+
+
+class TestSkipUnchanged:
+    """Test cases for checksum-based skipping of unchanged files"""
+    
+    def test_identical_file_is_not_uploaded_again(self, fake_gcs, sample_files, temp_dir):
+        """Test a second upload of the same bytes only reads metadata"""
+        hash_cache = os.path.join(temp_dir, ".hashes.json")
+        path = sample_files["ratings.csv"]
+        GCSUploader("test-bucket", hash_cache_path=hash_cache).upload_file(path)
+        
+        uploader = GCSUploader("test-bucket", hash_cache_path=hash_cache)
+        gcs_path = uploader.upload_file(path)
+        
+        assert gcs_path == "gs://test-bucket/ratings.csv"
+        assert fake_gcs.calls == ["ratings.csv"]
+        assert uploader.skipped == {'files': 1, 'bytes': os.path.getsize(path)}
+    
+    def test_changed_file_is_uploaded(self, fake_gcs, sample_files, temp_dir):
+        """Test new content is uploaded even when the size stays the same"""
+        uploader = GCSUploader("test-bucket", hash_cache_path=os.path.join(temp_dir, ".hashes.json"))
+        path = sample_files["ratings.csv"]
+        uploader.upload_file(path)
+        with open(path) as f:
+            content = f.read()
+        with open(path, 'w') as f:
+            f.write(content.upper())
+        
+        uploader.upload_file(path)
+        
+        assert fake_gcs.calls == ["ratings.csv", "ratings.csv"]
+        assert uploader.skipped['files'] == 0
+    
+    def test_composite_object_is_compared_by_crc32c(self, fake_gcs, sample_files, temp_dir):
+        """Test an object without an MD5 is matched on its CRC32C"""
+        hash_cache = os.path.join(temp_dir, ".hashes.json")
+        path = sample_files["ratings.csv"]
+        GCSUploader("test-bucket", composite_threshold=0, part_size=8).upload_file(path)
+        assert fake_gcs.bucket("test-bucket").get_blob("ratings.csv").md5_hash is None
+        
+        uploader = GCSUploader("test-bucket", hash_cache_path=hash_cache)
+        uploader.upload_file(path)
+        
+        assert uploader.skipped['files'] == 1
+    
+    def test_hashes_are_cached_by_size_and_mtime(self, sample_files, temp_dir):
+        """Test an unmodified file is hashed only once across runs"""
+        hash_cache = os.path.join(temp_dir, ".hashes.json")
+        path = sample_files["ratings.csv"]
+        first = FileHashCache(hash_cache).hashes(path)
+        
+        with patch('scripts.file_hashes.hashlib.md5') as mock_md5:
+            second = FileHashCache(hash_cache).hashes(path)
+        
+        mock_md5.assert_not_called()
+        assert first == second
+        with open(path, 'rb') as f:
+            assert first['md5'] == base64.b64encode(hashlib.md5(f.read()).digest()).decode()
+    
+    def test_upload_all_datasets_reports_skipped_bytes(self, fake_gcs, sample_files, temp_dir, capsys):
+        """Test a repeated run of upload_all_datasets sends nothing"""
+        upload_all_datasets("test-bucket", temp_dir)
+        upload_all_datasets("test-bucket", temp_dir)
+        
+        assert fake_gcs.calls == ["basic_titles.csv", "ratings.csv"]
+        assert "Skipped 2 unchanged files" in capsys.readouterr().out
+
+
+class TestCompressedUploads:
+    """Test cases for compressing files while uploading"""
+    
+    @pytest.fixture
+    def csv_file(self, temp_dir):
+        path = os.path.join(temp_dir, "ratings.csv")
+        with open(path, 'w') as f:
+            f.write("tconst,averageRating,numVotes\n")
+            f.writelines(f"tt{i:07d},{i % 10}.{i % 7},{i * 13}\n" for i in range(2000))
+        with open(path, 'rb') as f:
+            return path, f.read()
+    
+    def test_gzip_upload_sets_encoding_and_type(self, fake_gcs, csv_file):
+        """Test a gzip upload decompresses to the source and keeps the CSV content type"""
+        path, data = csv_file
+        uploader = GCSUploader("test-bucket", compression="gzip")
+        
+        uploader.upload_file(path)
+        
+        bucket = fake_gcs.bucket("test-bucket")
+        assert gzip.decompress(bucket.objects["ratings.csv"]) == data
+        assert bucket.attributes["ratings.csv"]["content_encoding"] == "gzip"
+        assert bucket.attributes["ratings.csv"]["content_type"] == "text/csv"
+        assert uploader.compression_stats['source_bytes'] == len(data)
+        assert uploader.compression_stats['sent_bytes'] == len(bucket.objects["ratings.csv"])
+        assert uploader.compression_ratio() > 3
+    
+    @patch('scripts.gc_uploader.COMPRESS_BLOCK_SIZE', 4096)
+    def test_zstd_upload_decodes_as_one_stream(self, fake_gcs, csv_file):
+        """Test the per-block zstd frames read back as the original file"""
+        path, data = csv_file
+        GCSUploader("test-bucket", compression="zstd", compression_level=9).upload_file(path)
+        
+        stored = fake_gcs.bucket("test-bucket").objects["ratings.csv"]
+        assert pa.input_stream(io.BytesIO(stored), compression="zstd").read() == data
+        assert fake_gcs.bucket("test-bucket").attributes["ratings.csv"]["content_encoding"] == "zstd"
+    
+    def test_compressed_object_is_skipped_when_unchanged(self, fake_gcs, csv_file, temp_dir):
+        """Test skip-if-unchanged compares against the recorded source hashes"""
+        path, _ = csv_file
+        hash_cache = os.path.join(temp_dir, ".hashes.json")
+        GCSUploader("test-bucket", compression="gzip", hash_cache_path=hash_cache).upload_file(path)
+        
+        uploader = GCSUploader("test-bucket", compression="gzip", hash_cache_path=hash_cache)
+        uploader.upload_file(path)
+        
+        assert fake_gcs.calls == ["ratings.csv"]
+        assert uploader.skipped['files'] == 1
+    
+    @pytest.mark.parametrize("first, second", [
+        ({}, {'compression': 'gzip'}),
+        ({'compression': 'gzip'}, {}),
+        ({'compression': 'gzip'}, {'compression': 'zstd'}),
+        ({'compression': 'gzip'}, {'compression': 'gzip', 'compression_level': 9}),
+    ])
+    def test_other_encoding_is_uploaded_again(self, fake_gcs, csv_file, temp_dir, first, second):
+        """Test an unchanged file is re-sent when the requested encoding or level differs"""
+        path, _ = csv_file
+        hash_cache = os.path.join(temp_dir, ".hashes.json")
+        GCSUploader("test-bucket", hash_cache_path=hash_cache, **first).upload_file(path)
+        
+        uploader = GCSUploader("test-bucket", hash_cache_path=hash_cache, **second)
+        uploader.upload_file(path)
+        
+        assert uploader.skipped['files'] == 0
+        assert fake_gcs.bucket("test-bucket").attributes["ratings.csv"]["content_encoding"] == \
+            second.get('compression')
+    
+    def test_unknown_codec_is_rejected(self):
+        """Test an unsupported compression name fails early"""
+        with pytest.raises(ValueError):
+            GCSUploader("test-bucket", compression="brotli")
+
+
 class TestUploadAllDatasets:
     """Test cases for upload_all_datasets function"""
     
@@ -219,6 +537,18 @@ class TestUploadAllDatasets:
         expected_files = ["basic_titles.csv", "ratings.csv"]
         assert set(uploaded_files) == set(expected_files)
     
+    @patch.object(GCSUploader, 'upload_file')
+    def test_upload_parquet_datasets(self, mock_upload, temp_dir):
+        """Test Parquet outputs of the loader are uploaded too"""
+        for filename in ["basic_titles.parquet", "ratings.csv"]:
+            with open(os.path.join(temp_dir, filename), 'w') as f:
+                f.write("test data\n")
+        
+        upload_all_datasets("test-bucket", temp_dir)
+        
+        uploaded_files = [call[0][1] for call in mock_upload.call_args_list]
+        assert set(uploaded_files) == {"basic_titles.parquet", "ratings.csv"}
+    
     @patch.object(GCSUploader, 'upload_file')
     def test_upload_missing_files(self, mock_upload, temp_dir):
         """Test uploading when some files are missing"""